@@ -9,10 +9,18 @@ from src.exception_handlers import (
     validation_exception_handler,
     general_exception_handler,
     api_key_exception_handler,
-    jwt_exception_handler
+    jwt_exception_handler,
+    too_many_requests_exception_handler
 )
-from src.auth.exceptions import APIKeyException, JWTException
+from src.auth.exceptions import APIKeyException, JWTException, TooManyRequestsException
+from src.metrics import metrics
 from src.helpers import init_http_client, close_http_client
+from src.auth.revocation import revocation_feed
+from src.auth.utils import init_password_pool, close_password_pool
+from src.ai_agent.core import title_generator, context_cache
+from src.ai_agent.tools import close_search_executor
+from src.ai_agent.persistence import turn_writer
+from src.ai_agent.jobs import job_runner
 
 from src.auth import routes as auth_routes
 from src.ai_agent.routes import chat as chat_routes
@@ -26,7 +34,17 @@ DEBUG = bool(int(os.getenv("DEBUG", 1)))
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_http_client()       # Startup
+    await revocation_feed.start()
+    init_password_pool()
     yield
+    await job_runner.stop()          # Finish answers still generating, then write them
+    await turn_writer.stop()         # Write out streamed turns still queued
+    await title_generator.stop()
+    if context_cache:
+        await context_cache.close()  # Stop paying for provider-side prompt caches
+    close_password_pool()
+    close_search_executor()
+    await revocation_feed.stop()
     await close_http_client()      # Shutdown
 
 app = FastAPI(
@@ -63,6 +81,8 @@ app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 app.add_exception_handler(APIKeyException, api_key_exception_handler)
 app.add_exception_handler(JWTException, jwt_exception_handler)
+app.add_exception_handler(TooManyRequestsException,
+                          too_many_requests_exception_handler)
 
 
 # Include routes
@@ -79,3 +99,9 @@ async def root():
 @app.get("/health", include_in_schema=False)
 def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Per-worker counters & latency summaries
+    return metrics.snapshot()
@@ -0,0 +1,118 @@
+"""
+Benchmark explicit context caching of a long static system prompt.
+
+Runs the same chat turns against a local fake Gemini API (see
+`fake_gemini_provider`), once with the plain GeminiModel and once with
+CachedGeminiModel, then prints latency and cached vs uncached input tokens
+for each. The fake answers after a delay proportional to the input tokens,
+cached ones being cheaper, like the provider's billing & prefill.
+
+A last run expires the provider's caches early, to exercise refreshing &
+recreating them.
+
+Usage:
+    python benchmarks/context_cache.py --prompt-tokens 8000 --turns 50 --concurrency 10
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from pydantic_ai import Agent  # noqa: E402
+from pydantic_ai.messages import ModelRequest  # noqa: E402
+from pydantic_ai.models.gemini import GeminiModel  # noqa: E402
+
+from src.metrics import metrics  # noqa: E402
+from src.ai_agent.prompts import PromptTemplate, record_usage  # noqa: E402
+from src.ai_agent.context_cache import (  # noqa: E402
+    CachedGeminiModel,
+    ContextCache,
+    GeminiCacheClient,
+    fake_gemini_provider
+)
+
+
+def long_prompt(tokens: int) -> PromptTemplate:
+    rule = "- Answer questions about our products using the knowledge base, and cite the document you used.\n"
+    return PromptTemplate(
+        name="benchmark", version="1",
+        static="You are a helpful AI Assistant.\n\n## Important Instructions:\n" + rule * (tokens * 4 // len(rule)),
+        dynamic="User's name is {user_name}. Today's date is: {date} & today is {weekday}.",
+    )
+
+
+def knowledge_lookup(query: str) -> str:
+    """Search the knowledge base."""
+    return "nothing found"
+
+
+async def run(name: str, model, template: PromptTemplate, turns: int, concurrency: int):
+    agent = Agent(model=model, tools=[knowledge_lookup])
+    before = metrics.snapshot()["counters"]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def turn(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            history = [ModelRequest(parts=template.render(f"User {index % 7}"))]
+            result = await agent.run(f"Question {index}", message_history=history)
+            latencies.append((time.perf_counter() - start) * 1000)
+            record_usage(result.usage())
+
+    wall0 = time.perf_counter()
+    await asyncio.gather(*(turn(index) for index in range(turns)))
+    wall = time.perf_counter() - wall0
+    after = metrics.snapshot()["counters"]
+
+    def delta(counter: str) -> float:
+        return after.get(counter, 0) - before.get(counter, 0)
+
+    latencies.sort()
+    print(f"{name}: wall={wall:.2f}s p50={latencies[len(latencies) // 2]:.0f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95)]:.0f}ms "
+          f"input tokens cached={delta('agent.prompt.cached_tokens'):.0f} "
+          f"uncached={delta('agent.prompt.uncached_tokens'):.0f} "
+          f"caches created={delta('agent.context_cache.created'):.0f} "
+          f"refreshed={delta('agent.context_cache.refreshed'):.0f} "
+          f"invalidated={delta('agent.context_cache.invalidated'):.0f}")
+
+
+async def main_async(args):
+    template = long_prompt(args.prompt_tokens)
+
+    provider = fake_gemini_provider()
+    await run("uncached", GeminiModel("gemini-fake", provider=provider), template, args.turns, args.concurrency)
+
+    cache = ContextCache(GeminiCacheClient(provider.client), ttl=3600)
+    cache.register_prefix(template.static)
+    await run("context cache", CachedGeminiModel("gemini-fake", provider=provider, context_cache=cache),
+              template, args.turns, args.concurrency)
+    await cache.close()
+
+    # Caches live 1s at the provider, refreshed once less than 0.8s is left
+    provider = fake_gemini_provider(cache_ttl_seconds=1)
+    cache = ContextCache(GeminiCacheClient(provider.client), ttl=1, refresh_before=0.8, expiry_margin=0.1)
+    cache.register_prefix(template.static)
+    model = CachedGeminiModel("gemini-fake", provider=provider, context_cache=cache)
+    for _ in range(3):
+        await run("context cache, 1s TTL", model, template, args.turns // 5, args.concurrency)
+        await asyncio.sleep(0.5)
+    await cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--prompt-tokens", type=int, default=8000)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark the conversation-history and session-listing queries before and after
+the composite indexes added in migration c41e9a7d2b53.
+
+Builds a synthetic SQLite database, prints the query plans and per-query latency
+without the composite indexes, then creates them and repeats the measurements.
+
+Usage:
+    python benchmarks/history_queries.py --messages 10000000
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE chat_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id VARCHAR(100) NOT NULL,
+    title VARCHAR(255),
+    user_id INTEGER NOT NULL,
+    date_time DATETIME NOT NULL,
+    shared_to_public BOOLEAN,
+    is_active BOOLEAN,
+    is_deleted BOOLEAN,
+    created_at DATETIME,
+    updated_at DATETIME
+);
+CREATE INDEX ix_chat_sessions_id ON chat_sessions (id);
+CREATE UNIQUE INDEX ix_chat_sessions_session_id ON chat_sessions (session_id);
+
+CREATE TABLE chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id VARCHAR(100) NOT NULL REFERENCES chat_sessions (session_id),
+    human_message TEXT NOT NULL,
+    ai_message TEXT,
+    date_time DATETIME NOT NULL,
+    duration FLOAT,
+    positive_feedback BOOLEAN,
+    negative_feedback BOOLEAN,
+    is_active BOOLEAN,
+    is_deleted BOOLEAN,
+    created_at DATETIME,
+    updated_at DATETIME
+);
+CREATE INDEX ix_chat_messages_id ON chat_messages (id);
+CREATE INDEX ix_chat_messages_session_id ON chat_messages (session_id);
+"""
+
+COMPOSITE_INDEXES = """
+CREATE INDEX ix_chat_messages_session_history ON chat_messages (session_id, is_deleted, is_active, id);
+CREATE INDEX ix_chat_sessions_user_listing ON chat_sessions (user_id, is_deleted, is_active, date_time);
+ANALYZE;
+"""
+
+# The queries issued by fetch_conversation_history and GET /chat
+QUERIES = {
+    "history (last 10 messages)": (
+        "SELECT * FROM chat_messages "
+        "WHERE is_active = 1 AND is_deleted = 0 AND session_id = :session_id "
+        "ORDER BY id DESC LIMIT 10"
+    ),
+    "session list (page 1)": (
+        "SELECT * FROM chat_sessions "
+        "WHERE is_active = 1 AND is_deleted = 0 AND user_id = :user_id "
+        "ORDER BY date_time DESC LIMIT 20 OFFSET 0"
+    ),
+    "session count": (
+        "SELECT count(*) FROM chat_sessions "
+        "WHERE is_active = 1 AND is_deleted = 0 AND user_id = :user_id"
+    ),
+}
+
+
+def populate(conn: sqlite3.Connection, messages: int, sessions: int, users: int, batch: int = 100_000):
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+
+    conn.executemany(
+        "INSERT INTO chat_sessions (session_id, title, user_id, date_time, shared_to_public, "
+        "is_active, is_deleted, created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)",
+        (
+            (f"s-{i}", f"Session {i}", rng.randrange(users),
+             start + timedelta(seconds=rng.randrange(3600 * 24 * 365)),
+             *((0, 1) if rng.random() < 0.05 else (1, 0)), start, start)
+            for i in range(sessions)
+        )
+    )
+
+    inserted = 0
+    while inserted < messages:
+        size = min(batch, messages - inserted)
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, human_message, ai_message, date_time, duration, "
+            "positive_feedback, negative_feedback, is_active, is_deleted, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 1.0, 0, 0, ?, ?, ?, ?)",
+            (
+                (f"s-{rng.randrange(sessions)}", "question", "answer",
+                 start + timedelta(seconds=inserted + i),
+                 *((0, 1) if rng.random() < 0.05 else (1, 0)),
+                 start + timedelta(seconds=inserted + i), start + timedelta(seconds=inserted + i))
+                for i in range(size)
+            )
+        )
+        inserted += size
+        print(f"  inserted {inserted:,}/{messages:,} messages", end="\r", flush=True)
+    conn.commit()
+    print()
+
+
+def measure(conn: sqlite3.Connection, sessions: int, users: int, runs: int) -> dict:
+    rng = random.Random(7)
+    results = {}
+    for name, sql in QUERIES.items():
+        params = {"session_id": "s-0", "user_id": 0}
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        timings = []
+        for _ in range(runs):
+            params = {"session_id": f"s-{rng.randrange(sessions)}",
+                      "user_id": rng.randrange(users)}
+            t0 = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        results[name] = {
+            "plan": [row[-1] for row in plan],
+            "p50": statistics.median(timings),
+            "p95": timings[int(0.95 * (len(timings) - 1))],
+        }
+    return results
+
+
+def report(title: str, results: dict):
+    print(f"\n== {title} ==")
+    for name, result in results.items():
+        print(f"{name}: p50={result['p50']:.3f}ms p95={result['p95']:.3f}ms")
+        for step in result["plan"]:
+            print(f"    {step}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10_000_000)
+    parser.add_argument("--sessions", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--db", type=str, default="benchmark_history.db")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the generated database file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    conn = sqlite3.connect(args.db)
+    conn.executescript(SCHEMA)
+    print(f"Populating {args.messages:,} messages in {args.sessions:,} sessions...")
+    populate(conn, args.messages, args.sessions, args.users)
+    conn.execute("ANALYZE")
+
+    before = measure(conn, args.sessions, args.users, args.runs)
+    report("Before (single-column indexes only)", before)
+
+    conn.executescript(COMPOSITE_INDEXES)
+    after = measure(conn, args.sessions, args.users, args.runs)
+    report("After (composite indexes)", after)
+
+    print("\n== Speed-up (p50) ==")
+    for name in QUERIES:
+        print(f"{name}: {before[name]['p50'] / after[name]['p50']:.1f}x")
+
+    conn.close()
+    if not args.keep:
+        os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
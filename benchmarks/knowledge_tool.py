@@ -0,0 +1,99 @@
+"""
+Benchmark custom_knowledge_tool against the local QuadSearch stub.
+
+Starts benchmarks/quadsearch_stub.py in-process, then fires concurrent tool
+calls drawn from a small set of repeated queries and reports latency, upstream
+requests and cache effectiveness. A last phase makes the stub fail to show the
+circuit breaker shedding calls.
+
+Usage:
+    python benchmarks/knowledge_tool.py --calls 2000 --concurrency 100 --queries 50
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import threading
+from types import SimpleNamespace
+
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from quadsearch_stub import create_app  # noqa: E402
+from src.helpers import HTTP2_ENABLED, init_http_client, close_http_client  # noqa: E402
+from src.ai_agent.utils import AgentDeps  # noqa: E402
+from src.ai_agent import tools  # noqa: E402
+
+
+def start_stub(port: int, latency_ms: float, error_rate: float):
+    app = create_app(latency_ms, error_rate)
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return app, server
+
+
+async def run_phase(name: str, ctx, calls: int, concurrency: int, queries: int, stub_app):
+    rng = random.Random(7)
+    semaphore = asyncio.Semaphore(concurrency)
+    before = stub_app.state.requests
+    timings = []
+
+    async def one(query: str):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await tools.custom_knowledge_tool(ctx, query)
+            timings.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(f"question {rng.randrange(queries)}") for _ in range(calls)))
+    elapsed = time.perf_counter() - t0
+    timings.sort()
+    print(f"{name}: {calls / elapsed:,.0f} calls/s, p50={statistics.median(timings):.2f}ms "
+          f"p95={timings[int(0.95 * (len(timings) - 1))]:.2f}ms, "
+          f"upstream requests={stub_app.state.requests - before}")
+
+
+async def main_async(args):
+    stub_app, server = start_stub(args.port, args.latency_ms, 0)
+    await init_http_client()
+    ctx = SimpleNamespace(deps=AgentDeps(
+        quadsearch_base_url=f"http://127.0.0.1:{args.port}",
+        quadsearch_api_key="benchmark",
+        collection_name="docs",
+    ))
+    print(f"HTTP/2 enabled: {HTTP2_ENABLED} (used for https upstreams)")
+
+    await run_phase("cold cache", ctx, args.calls, args.concurrency, args.queries, stub_app)
+    await run_phase("warm cache", ctx, args.calls, args.concurrency, args.queries, stub_app)
+
+    tools.knowledge_cache.clear()
+    ctx.deps.quadsearch_base_url = "http://127.0.0.1:9"  # Nothing listens here
+    await run_phase("upstream down", ctx, args.calls, args.concurrency, args.queries, stub_app)
+    print(f"breaker state: {tools.quadsearch_breaker.state}")
+
+    await close_http_client()
+    server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Local stand-in for the QuadSearch retrieval API used by custom_knowledge_tool.
+
+Serves POST /api/v1/qdrant/search with canned document chunks, an optional
+artificial latency and failure rate, and GET /stats with the request count.
+
+Usage:
+    python benchmarks/quadsearch_stub.py --port 8765 --latency-ms 40 --error-rate 0.0
+    QUADSEARCH_BASE_URL=http://127.0.0.1:8765 uvicorn app:app
+"""
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms: float = 0, error_rate: float = 0, seed: int = 42) -> FastAPI:
+    app = FastAPI(title="QuadSearch stub")
+    rng = random.Random(seed)
+    app.state.requests = 0
+
+    @app.post("/api/v1/qdrant/search")
+    async def search(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if rng.random() < error_rate:
+            return JSONResponse(status_code=503, content={"detail": "stub failure"})
+        return {
+            "data": [
+                {
+                    "id": index,
+                    "score": round(1 - index * 0.1, 2),
+                    "payload": {"content": f"[{body.get('collection_name')}] chunk {index} for '{body.get('query')}'"},
+                }
+                for index in range(int(body.get("limit", 5)))
+            ]
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.error_rate),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark the SSE streaming path on long answers.
+
+Streams a ~50KB answer from a local fake model, in small token-sized deltas,
+through the old path (cumulative `stream_text()`, slice & `+=`, one
+`json.dumps` per chunk) at its default 100ms debounce, and through the
+current one (`stream_text(delta=True)`, `coalesce_chunks` at
+STREAM_COALESCE_MS, list accumulation), then prints CPU time, wall time,
+SSE frames & bytes for each.
+
+It first times the string handling alone, without the model, for the case
+where every delta becomes its own frame (a provider slower than the debounce).
+
+Usage:
+    python benchmarks/stream_path.py --answer-kb 50 --streams 20
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from pydantic_ai import Agent  # noqa: E402
+from pydantic_ai.models.function import FunctionModel  # noqa: E402
+
+from src.ai_agent.utils import STREAM_COALESCE_MS, coalesce_chunks  # noqa: E402
+
+
+def answer_tokens(answer_kb: int, token_chars: int) -> list:
+    text = ("lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (answer_kb * 1024 // 57 + 1))[
+        :answer_kb * 1024]
+    return [text[i:i + token_chars] for i in range(0, len(text), token_chars)]
+
+
+def answer_model(answer_kb: int, token_chars: int, tokens_per_tick: int, tick_ms: float) -> FunctionModel:
+    tokens = answer_tokens(answer_kb, token_chars)
+
+    async def stream(messages, info):
+        for index, token in enumerate(tokens):
+            if index % tokens_per_tick == 0:
+                await asyncio.sleep(tick_ms / 1000)  # Provider pacing
+            yield token
+
+    return FunctionModel(stream_function=stream, model_name="long-answer")
+
+
+def framing_only(tokens: list):
+    """CPU of the per-frame string work alone, one frame per delta."""
+    cpu0 = time.process_time()
+    deltas, full_output, prev_len = [], "", 0
+    for token in tokens:
+        # What stream_text() does per group, then the old slice & concatenation
+        deltas.append(token)
+        partial_text = "".join(deltas)
+        new_chunk = partial_text[prev_len:]
+        prev_len = len(partial_text)
+        full_output += new_chunk
+        f"event: chunk\ndata: {json.dumps({'text': new_chunk})}\n\n"
+    before = time.process_time() - cpu0
+
+    cpu0 = time.process_time()
+    output_parts = []
+    for token in tokens:
+        output_parts.append(token)
+        f"event: chunk\ndata: {{\"text\": {json.dumps(token)}}}\n\n"
+    "".join(output_parts)
+    after = time.process_time() - cpu0
+    print(f"framing only, {len(tokens)} frames: cumulative={before * 1000:.1f}ms delta={after * 1000:.1f}ms")
+
+
+async def cumulative_path(agent: Agent, debounce_by: float = 0.1) -> tuple:
+    """The streaming loop before the delta rewrite."""
+    frames, sent, full_output, prev_len = 0, 0, "", 0
+    async with agent.run_stream("hello") as result:
+        async for partial_text in result.stream_text(debounce_by=debounce_by):
+            new_chunk = partial_text[prev_len:]
+            prev_len = len(partial_text)
+            if new_chunk:
+                full_output += new_chunk
+                frame = f"event: chunk\ndata: {json.dumps({'text': new_chunk})}\n\n"
+                frames += 1
+                sent += len(frame)
+    return frames, sent, len(full_output)
+
+
+async def delta_path(agent: Agent) -> tuple:
+    """The streaming loop in execute_agent."""
+    frames, sent, output_parts = 0, 0, []
+    async with agent.run_stream("hello") as result:
+        async for new_chunk in coalesce_chunks(result.stream_text(delta=True, debounce_by=None)):
+            output_parts.append(new_chunk)
+            frame = f"event: chunk\ndata: {{\"text\": {json.dumps(new_chunk)}}}\n\n"
+            frames += 1
+            sent += len(frame)
+    return frames, sent, len("".join(output_parts))
+
+
+async def run(name: str, path, agent: Agent, streams: int):
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(path(agent) for _ in range(streams)))
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+    frames = sum(r[0] for r in results) / streams
+    sent = sum(r[1] for r in results) / streams
+    chars = results[0][2]
+    print(f"{name}: cpu={cpu * 1000 / streams:.1f}ms/stream wall={wall:.2f}s "
+          f"frames={frames:.0f}/stream bytes={sent / 1024:.1f}KB/stream answer={chars / 1024:.1f}KB")
+
+
+async def main_async(args):
+    framing_only(answer_tokens(args.answer_kb, args.token_chars))
+    agent = Agent(answer_model(args.answer_kb, args.token_chars, args.tokens_per_tick, args.tick_ms))
+    await run("cumulative, 100ms debounce (before)", cumulative_path, agent, args.streams)
+    await run(f"delta + coalescing, {STREAM_COALESCE_MS}ms window", delta_path, agent, args.streams)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--answer-kb", type=int, default=50)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--token-chars", type=int, default=4)
+    parser.add_argument("--tokens-per-tick", type=int, default=8)
+    parser.add_argument("--tick-ms", type=float, default=1)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
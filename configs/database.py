@@ -4,6 +4,7 @@ from urllib.parse import quote_plus
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 load_dotenv()
 
@@ -21,6 +22,9 @@ if DB_TYPE == "mysql":
     SQLALCHEMY_DATABASE_URL = (
         f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
     )
+    ASYNC_SQLALCHEMY_DATABASE_URL = (
+        f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+    )
 
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
@@ -29,16 +33,25 @@ if DB_TYPE == "mysql":
         max_overflow=int(os.environ.get("MAX_OVERFLOW", 20)),   # Number of connections to allow beyond the pool size
         pool_timeout=int(os.environ.get("POOL_TIMEOUT", 60)),   # Time(in sec) to wait before giving up on getting a connection
     )
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL,
+        pool_recycle=int(os.environ.get("POOL_RECYCLE", 300)),
+        pool_size=int(os.environ.get("POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("MAX_OVERFLOW", 20)),
+        pool_timeout=int(os.environ.get("POOL_TIMEOUT", 60)),
+    )
 
 elif DB_TYPE == "sqlite":
     # SQLite configuration
     SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "sqlite.db")
 
     SQLALCHEMY_DATABASE_URL = f"sqlite:///{SQLITE_DB_PATH}"
+    ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_DB_PATH}"
 
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
     )
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
 
 elif DB_TYPE == "postgresql":
     # PostgreSQL connection configuration
@@ -51,6 +64,9 @@ elif DB_TYPE == "postgresql":
     SQLALCHEMY_DATABASE_URL = (
         f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DATABASE}"
     )
+    ASYNC_SQLALCHEMY_DATABASE_URL = (
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DATABASE}"
+    )
 
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
@@ -59,11 +75,22 @@ elif DB_TYPE == "postgresql":
         max_overflow=int(os.environ.get("MAX_OVERFLOW", 20)),
         pool_timeout=int(os.environ.get("POOL_TIMEOUT", 60)),
     )
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL,
+        pool_recycle=int(os.environ.get("POOL_RECYCLE", 300)),
+        pool_size=int(os.environ.get("POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("MAX_OVERFLOW", 20)),
+        pool_timeout=int(os.environ.get("POOL_TIMEOUT", 60)),
+    )
 
 else:
     raise ValueError("Invalid DB_TYPE specified. Choose 'mysql', 'sqlite', or 'postgresql'.")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async sessions are used by the API routes so DB round trips don't block the event loop.
+# expire_on_commit=False keeps loaded attributes usable after commit without an implicit (sync) refresh.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -73,3 +100,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
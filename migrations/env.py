@@ -22,6 +22,19 @@ config.set_main_option("sqlalchemy.url", ALEMBIC_SAFE_URL)
 # Metadata for 'autogenerate'
 target_metadata = Base.metadata
 
+# Full-text search objects are managed by hand (see src/ai_agent/search.py); keep autogenerate away from them
+SEARCH_OBJECTS = {
+    "chat_search_index", "search_vector",
+    "ix_chat_sessions_search_vector", "ix_chat_messages_search_vector",
+    "ft_chat_sessions_title", "ft_chat_messages_content",
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if name in SEARCH_OBJECTS or (name or "").startswith("chat_search_index_"):
+        return False
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
@@ -32,6 +45,7 @@ def run_migrations_offline() -> None:
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
         render_as_batch=True if "sqlite" in url else False,  # Enable batch mode for SQLite
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -52,6 +66,7 @@ def run_migrations_online() -> None:
             connection=connection,
             target_metadata=target_metadata,
             render_as_batch=True if is_sqlite else False,  # Enable batch mode for SQLite
+            include_object=include_object,
         )
 
         with context.begin_transaction():
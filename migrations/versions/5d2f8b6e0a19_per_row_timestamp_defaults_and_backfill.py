@@ -0,0 +1,60 @@
+"""Per-row created_at/updated_at server defaults & backfill
+
+Revision ID: 5d2f8b6e0a19
+Revises: c41e9a7d2b53
+Create Date: 2026-10-17 11:02:17.734905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8b6e0a19'
+down_revision: Union[str, None] = 'c41e9a7d2b53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['api_keys', 'users', 'user_tokens', 'chat_sessions', 'chat_messages']
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at',
+                                  existing_type=sa.DateTime(timezone=True),
+                                  server_default=sa.func.now(),
+                                  existing_nullable=True)
+            batch_op.alter_column('updated_at',
+                                  existing_type=sa.DateTime(timezone=True),
+                                  server_default=sa.func.now(),
+                                  existing_nullable=True)
+
+    # Rows written so far carry their worker's start time; date_time holds the real per-row time
+    op.execute(
+        "UPDATE chat_messages SET created_at = date_time, updated_at = date_time "
+        "WHERE date_time IS NOT NULL"
+    )
+    op.execute(
+        "UPDATE chat_sessions SET created_at = ("
+        "SELECT MIN(chat_messages.date_time) FROM chat_messages "
+        "WHERE chat_messages.session_id = chat_sessions.session_id), "
+        "updated_at = date_time "
+        "WHERE EXISTS (SELECT 1 FROM chat_messages "
+        "WHERE chat_messages.session_id = chat_sessions.session_id)"
+    )
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('updated_at',
+                                  existing_type=sa.DateTime(timezone=True),
+                                  server_default=None,
+                                  existing_nullable=True)
+            batch_op.alter_column('created_at',
+                                  existing_type=sa.DateTime(timezone=True),
+                                  server_default=None,
+                                  existing_nullable=True)
@@ -0,0 +1,77 @@
+"""Full-text search indexes for session titles and messages
+
+Revision ID: 9a4b1c7e3f62
+Revises: 5d2f8b6e0a19
+Create Date: 2026-10-17 13:36:52.104387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4b1c7e3f62'
+down_revision: Union[str, None] = '5d2f8b6e0a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        # Standalone FTS5 table, kept in sync by src/ai_agent/search.py
+        op.execute(
+            "CREATE VIRTUAL TABLE chat_search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, session_id UNINDEXED, content, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "INSERT INTO chat_search_index (kind, ref_id, session_id, content) "
+            "SELECT 'title', id, session_id, title FROM chat_sessions WHERE title IS NOT NULL"
+        )
+        op.execute(
+            "INSERT INTO chat_search_index (kind, ref_id, session_id, content) "
+            "SELECT 'message', id, session_id, human_message || char(10) || coalesce(ai_message, '') "
+            "FROM chat_messages"
+        )
+
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE chat_sessions ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(title, ''))) STORED"
+        )
+        op.execute(
+            "ALTER TABLE chat_messages ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(human_message, '') || ' ' || "
+            "coalesce(ai_message, ''))) STORED"
+        )
+        op.create_index('ix_chat_sessions_search_vector', 'chat_sessions', ['search_vector'],
+                        unique=False, postgresql_using='gin')
+        op.create_index('ix_chat_messages_search_vector', 'chat_messages', ['search_vector'],
+                        unique=False, postgresql_using='gin')
+
+    elif dialect == 'mysql':
+        op.create_index('ft_chat_sessions_title', 'chat_sessions', ['title'],
+                        unique=False, mysql_prefix='FULLTEXT')
+        op.create_index('ft_chat_messages_content', 'chat_messages', ['human_message', 'ai_message'],
+                        unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS chat_search_index")
+
+    elif dialect == 'postgresql':
+        op.drop_index('ix_chat_messages_search_vector', table_name='chat_messages')
+        op.drop_index('ix_chat_sessions_search_vector', table_name='chat_sessions')
+        op.drop_column('chat_messages', 'search_vector')
+        op.drop_column('chat_sessions', 'search_vector')
+
+    elif dialect == 'mysql':
+        op.drop_index('ft_chat_messages_content', table_name='chat_messages')
+        op.drop_index('ft_chat_sessions_title', table_name='chat_sessions')
@@ -0,0 +1,34 @@
+"""Composite indexes for history and session listing queries
+
+Revision ID: c41e9a7d2b53
+Revises: 4eafa02ca717
+Create Date: 2026-10-17 09:20:41.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e9a7d2b53'
+down_revision: Union[str, None] = '4eafa02ca717'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_messages_session_history', ['session_id', 'is_deleted', 'is_active', 'id'], unique=False)
+
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_sessions_user_listing', ['user_id', 'is_deleted', 'is_active', 'date_time'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_sessions_user_listing')
+
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_messages_session_history')
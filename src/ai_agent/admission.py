@@ -0,0 +1,210 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from src.metrics import metrics
+from src.auth.exceptions import TooManyRequestsException
+
+load_dotenv()
+# All limits are per worker process: size LLM_MAX_CONCURRENCY as quota / workers
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_USER_RATE_PER_MINUTE = float(os.getenv("LLM_USER_RATE_PER_MINUTE", 20))
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", 5))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 30))
+LLM_QUEUE_SLO_SECONDS = float(os.getenv("LLM_QUEUE_SLO_SECONDS", 10))
+LLM_SUPERUSER_WEIGHT = float(os.getenv("LLM_SUPERUSER_WEIGHT", 2))
+QUEUE_UPDATE_SECONDS = 1.0  # How often streaming requests get a queue position event
+MAX_TRACKED_USERS = 10000
+
+
+class Ticket:
+    """A request waiting for, or holding, one of the agent slots."""
+
+    def __init__(self, controller: "AdmissionController", user_id: int, finish_tag: float, seq: int):
+        self.controller = controller
+        self.user_id = user_id
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self._granted = asyncio.get_running_loop().create_future()
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+    @property
+    def deadline(self) -> float:
+        return self.enqueued_at + self.controller.queue_timeout
+
+    def position(self) -> int:
+        """1-based place in the queue, 0 once granted."""
+        return 0 if self.granted else self.controller.position(self)
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to `timeout` seconds for a slot. Returns whether it was granted."""
+        if self.granted:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._granted), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def acquire(self):
+        """Wait for a slot until the queue deadline, then give up with a 429."""
+        if not await self.wait(max(0.0, self.deadline - time.monotonic())):
+            self.expire()
+
+    def expire(self):
+        self.controller.expire(self)
+
+    def release(self):
+        self.controller.release(self)
+
+
+class AdmissionController:
+    """
+    Admission control in front of the chat agent:
+    - a per-user token bucket rejects users over their request rate,
+    - at most `max_concurrency` agent runs at a time,
+    - waiting requests are served by weighted fair queuing across users (virtual finish tags),
+      so a user with many queued requests cannot starve the others,
+    - requests are shed up front when the estimated queue wait exceeds the SLO and
+      given up when they wait past the queue deadline.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        user_rate_per_minute: float = LLM_USER_RATE_PER_MINUTE,
+        user_burst: int = LLM_USER_BURST,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+        queue_slo: float = LLM_QUEUE_SLO_SECONDS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.user_rate = user_rate_per_minute / 60
+        self.user_burst = user_burst
+        self.queue_timeout = queue_timeout
+        self.queue_slo = queue_slo
+        self._active = 0
+        self._waiting = 0
+        self._queue: List[Tuple[float, int, Ticket]] = []  # (finish tag, seq, ticket)
+        self._virtual_time = 0.0
+        self._last_finish: Dict[int, float] = {}
+        self._buckets: Dict[int, Tuple[float, float]] = {}  # user_id -> (tokens, updated_at)
+        self._service_time = 5.0  # EWMA of seconds a slot is held
+        self._seq = itertools.count()
+
+    def enqueue(self, user_id: int, weight: float = 1.0) -> Ticket:
+        """Admit a request into the queue or raise TooManyRequestsException."""
+        self._take_token(user_id)
+
+        if self._active < self.max_concurrency and not self._waiting:
+            ticket = Ticket(self, user_id, self._virtual_time, next(self._seq))
+            self._grant(ticket)
+            return ticket
+
+        estimated_wait = self.estimated_wait(self._waiting + 1)
+        if estimated_wait > self.queue_slo:
+            metrics.inc("agent.admission.shed")
+            raise TooManyRequestsException(
+                429, "The assistant is busy, please try again shortly",
+                retry_after=math.ceil(estimated_wait - self.queue_slo) or 1)
+
+        start_tag = max(self._virtual_time,
+                        self._last_finish.get(user_id, 0.0))
+        ticket = Ticket(self, user_id, start_tag + 1 / weight, next(self._seq))
+        self._last_finish[user_id] = ticket.finish_tag
+        heapq.heappush(self._queue, (ticket.finish_tag, ticket.seq, ticket))
+        self._waiting += 1
+        self._report()
+        return ticket
+
+    def estimated_wait(self, position: int) -> float:
+        return position / self.max_concurrency * self._service_time
+
+    def position(self, ticket: Ticket) -> int:
+        key = (ticket.finish_tag, ticket.seq)
+        return 1 + sum(1 for finish_tag, seq, other in self._queue
+                       if (finish_tag, seq) < key and not other.released)
+
+    def release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self._active -= 1
+            held = time.monotonic() - ticket.granted_at
+            self._service_time = 0.8 * self._service_time + 0.2 * held
+        else:
+            self._waiting -= 1  # Left the queue; its heap entry is skipped on dispatch
+        self._dispatch()
+
+    def expire(self, ticket: Ticket):
+        """Drop a ticket that waited past the queue deadline."""
+        if ticket.granted:
+            return  # Granted while the timeout fired
+        self.release(ticket)
+        metrics.inc("agent.admission.queue_timeout")
+        raise TooManyRequestsException(
+            429, "The assistant is busy, please try again shortly")
+
+    def _take_token(self, user_id: int):
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(
+            user_id, (float(self.user_burst), now))
+        tokens = min(self.user_burst, tokens +
+                     (now - updated_at) * self.user_rate)
+        if tokens < 1:
+            metrics.inc("agent.admission.rate_limited")
+            raise TooManyRequestsException(
+                429, "Too many requests, please slow down",
+                retry_after=math.ceil((1 - tokens) / self.user_rate))
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > MAX_TRACKED_USERS:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        # Full buckets & finish tags behind the virtual clock carry no state worth keeping
+        self._buckets = {
+            user_id: (tokens, updated_at) for user_id, (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * self.user_rate < self.user_burst
+        }
+        self._last_finish = {
+            user_id: finish for user_id, finish in self._last_finish.items()
+            if finish > self._virtual_time
+        }
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency and self._queue:
+            finish_tag, _, ticket = heapq.heappop(self._queue)
+            if ticket.released:
+                continue
+            self._waiting -= 1
+            self._virtual_time = max(self._virtual_time, finish_tag)
+            self._grant(ticket)
+        self._report()
+
+    def _grant(self, ticket: Ticket):
+        self._active += 1
+        ticket.granted_at = time.monotonic()
+        if not ticket._granted.done():
+            ticket._granted.set_result(True)
+        metrics.observe("agent.admission.queue_wait_ms",
+                        (ticket.granted_at - ticket.enqueued_at) * 1000)
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("agent.admission.active", self._active)
+        metrics.set_gauge("agent.admission.waiting", self._waiting)
+
+
+admission = AdmissionController()
@@ -0,0 +1,393 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from configs.database import DB_TYPE
+from src.metrics import metrics
+
+load_dotenv()
+
+HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", 2000))
+HISTORY_CACHE_MAX_BYTES = int(
+    os.getenv("HISTORY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+HISTORY_CACHE_MAX_TURNS = int(os.getenv("HISTORY_MAX_MESSAGES", 50))
+TURN_OVERHEAD_BYTES = 512  # Rough size of the pydantic-ai message objects around the text
+
+# Semantic response cache (opt-in)
+RESPONSE_CACHE_ENABLED = os.getenv(
+    "RESPONSE_CACHE_ENABLED", "False").lower() in ("true", "1", "yes")
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 5000))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.8))
+RESPONSE_CACHE_DIMENSIONS = 512
+REPLAY_CHUNK_CHARS = 48
+NAME_PLACEHOLDER = "\x00user_name\x00"
+
+
+@dataclass
+class HistoryTurn:
+    """One stored ChatMessage, already converted to pydantic-ai messages."""
+    message_id: int
+    messages: List[Any]  # ModelRequest / ModelResponse
+    tokens: int
+
+    @property
+    def size(self) -> int:
+        return self.tokens * 4 + TURN_OVERHEAD_BYTES
+
+
+@dataclass
+class CachedHistory:
+    version: Optional[datetime]  # ChatSession.updated_at this entry is valid for
+    summary_until: Optional[int]
+    turns: List[HistoryTurn] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return sum(turn.size for turn in self.turns)
+
+
+def _normalize_version(value: Optional[datetime]) -> Optional[datetime]:
+    # The same timestamp comes back naive from some drivers and aware from others
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if value is not None and DB_TYPE == "mysql":
+        value = value.replace(microsecond=0)  # DATETIME columns keep whole seconds
+    return value
+
+
+class HistoryCache:
+    """
+    LRU cache of converted conversation tails keyed by session_id.
+    Entries are versioned by the session row's `updated_at`, which every chat turn bumps,
+    so a turn handled by another worker turns the next lookup here into a miss.
+    """
+
+    def __init__(self, max_sessions: int = HISTORY_CACHE_MAX_SESSIONS, max_bytes: int = HISTORY_CACHE_MAX_BYTES):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedHistory]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, session_id: str, version: Optional[datetime], summary_until: Optional[int]) -> Optional[List[HistoryTurn]]:
+        entry = self._entries.get(session_id)
+        if entry and (entry.version != _normalize_version(version) or entry.summary_until != summary_until):
+            # Another worker (or the summarizer) changed the session since this entry was built
+            self.invalidate(session_id)
+            entry = None
+        if not entry:
+            metrics.inc("agent.history_cache.miss")
+            return None
+        self._entries.move_to_end(session_id)
+        metrics.inc("agent.history_cache.hit")
+        return list(entry.turns)
+
+    def set(self, session_id: str, version: Optional[datetime], summary_until: Optional[int], turns: List[HistoryTurn]):
+        self.invalidate(session_id)
+        entry = CachedHistory(version=_normalize_version(version), summary_until=summary_until,
+                              turns=list(turns[-HISTORY_CACHE_MAX_TURNS:]))
+        self._entries[session_id] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def touch(self, session_id: str, version: Optional[datetime], previous_version: Optional[datetime] = None):
+        """
+        Move an entry to a new version after this worker updated the session row itself.
+        With `previous_version`, an entry not at that version is dropped instead, as it misses another worker's turns.
+        """
+        entry = self._entries.get(session_id)
+        if not entry:
+            return
+        if previous_version is not None and entry.version != _normalize_version(previous_version):
+            self.invalidate(session_id)
+            return
+        entry.version = _normalize_version(version)
+
+    def append(self, session_id: str, turn: HistoryTurn):
+        """Add a just-saved turn to a cached session, if it is cached."""
+        entry = self._entries.get(session_id)
+        if not entry:
+            return
+        entry.turns.append(turn)
+        self._bytes += turn.size
+        while len(entry.turns) > HISTORY_CACHE_MAX_TURNS:
+            self._bytes -= entry.turns.pop(0).size
+        self._evict()
+
+    def invalidate(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry:
+            self._bytes -= entry.size
+            metrics.inc("agent.history_cache.invalidation")
+        self._report()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            metrics.inc("agent.history_cache.eviction")
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("agent.history_cache.sessions", len(self._entries))
+        metrics.set_gauge("agent.history_cache.bytes", self._bytes)
+
+
+history_cache = HistoryCache()
+
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Follow-ups that only make sense with the earlier turns
+_CONTEXT_MARKERS = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|he|she|him|her|above|previous|earlier|again|more|same|else)\b")
+
+
+def name_pattern(names: List[str], flags: int = 0) -> re.Pattern:
+    """Whole-word match of any of `names`, longest first, so that "Ann" matches neither "Annual" nor "Anna"."""
+    alternatives = "|".join(re.escape(name) for name in sorted(set(names), key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", flags)
+
+
+def template_name(text: str, user_name: str) -> Optional[str]:
+    """
+    Replace the user's name in an answer by NAME_PLACEHOLDER, as whole words only.
+    Args:
+        text (str): The answer.
+        user_name (str): The name of the user it was written for.
+    Returns:
+        str: The answer with the placeholder, or None when a part of the name (a first name alone) or the
+        name in another case (e.g. "Will" & "will") is left over, which another user must not be shown.
+    """
+    if not user_name:
+        return text
+    templated = name_pattern([user_name]).sub(NAME_PLACEHOLDER, text)
+    if name_pattern([user_name] + user_name.split(), re.IGNORECASE).search(templated):
+        return None
+    return templated
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_WORD_PATTERN.findall((text or "").lower()))
+
+
+def embed_query(normalized: str, dimensions: int = RESPONSE_CACHE_DIMENSIONS) -> np.ndarray:
+    """
+    Local embedding: words, word pairs and character trigrams hashed into a fixed-size,
+    L2-normalized vector. Catches rewordings & typos of the same question without a model call.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    words = normalized.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {normalized} "
+    features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_STOPWORDS = frozenset(
+    "a an the is are was were be do does did can could would should will i me my you your ur "
+    "we our s what whats to of for in on at please tell".split())
+
+
+def _trigrams(word: str) -> set:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def same_content_words(first: str, second: str) -> bool:
+    """
+    Guard for similarity hits: hashed n-grams rate "capital of france" close to "capital of spain",
+    so the normalized queries may only differ in stopwords or misspellings of each other.
+    """
+    first_words, second_words = set(first.split()), set(second.split())
+    only_first = first_words - second_words - _STOPWORDS
+    only_second = second_words - first_words - _STOPWORDS
+
+    def close(word, candidates):
+        return any(len(_trigrams(word) & _trigrams(other)) * 2 >= len(_trigrams(word) | _trigrams(other))
+                   for other in candidates)
+
+    return all(close(word, only_second) for word in only_first) and \
+        all(close(word, only_first) for word in only_second)
+
+
+def is_context_dependent(query: str, has_history: bool) -> bool:
+    """Whether the answer to the query may depend on the earlier conversation."""
+    if not has_history:
+        return False
+    normalized = normalize_query(query)
+    return len(normalized.split()) < 4 or bool(_CONTEXT_MARKERS.search(normalized))
+
+
+def replay_chunks(text: str, size: int = REPLAY_CHUNK_CHARS) -> List[str]:
+    """Split a cached answer into stream-sized chunks on word boundaries."""
+    chunks, current = [], ""
+    for word in re.split(r"(?<=\s)", text):
+        current += word
+        if len(current) >= size:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    answer: str  # The user's name replaced by NAME_PLACEHOLDER
+    latency_ms: float  # What generating it originally cost
+    expires_at: float
+    day: date  # The system prompt carries today's date
+
+
+class ResponseCache:
+    """
+    Answers to standalone questions, looked up by normalized text first and then by cosine
+    similarity over a brute-force NumPy matrix of query embeddings.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        dimensions: int = RESPONSE_CACHE_DIMENSIONS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._entries: List[Optional[CachedResponse]] = [None] * max_entries
+        self._slots: "OrderedDict[str, int]" = OrderedDict()  # Normalized query -> row, in LRU order
+        self._free = list(range(max_entries - 1, -1, -1))
+
+    def get(self, query: str, user_name: str) -> Optional[CachedResponse]:
+        normalized = normalize_query(query)
+        slot = self._slots.get(normalized)
+        if slot is None and self._slots:
+            scores = self._vectors @ embed_query(normalized)
+            scores[~self._valid] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity and same_content_words(normalized, self._entries[best].query):
+                slot = best
+        entry = self._entries[slot] if slot is not None else None
+        if entry and (entry.expires_at < time.monotonic() or entry.day != date.today()):
+            self._remove(entry.query)
+            entry = None
+        if not entry:
+            self._record("miss")
+            return None
+
+        self._slots.move_to_end(entry.query)
+        self._record("hit")
+        metrics.observe("agent.response_cache.saved_ms", entry.latency_ms)
+        answer = entry.answer.replace(NAME_PLACEHOLDER, user_name) if user_name else entry.answer
+        return CachedResponse(query=entry.query, answer=answer, latency_ms=entry.latency_ms,
+                              expires_at=entry.expires_at, day=entry.day)
+
+    def set(self, query: str, answer: str, user_name: str, latency_ms: float):
+        normalized = normalize_query(query)
+        if not normalized or not answer:
+            return
+        templated = template_name(answer, user_name)
+        if templated is None:
+            metrics.inc("agent.response_cache.skipped_name")
+            return
+        self._remove(normalized)
+        if not self._free:
+            self._remove(next(iter(self._slots)))  # Least recently used
+            metrics.inc("agent.response_cache.eviction")
+        slot = self._free.pop()
+        self._vectors[slot] = embed_query(normalized)
+        self._valid[slot] = True
+        self._entries[slot] = CachedResponse(
+            query=normalized,
+            answer=templated,
+            latency_ms=latency_ms,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            day=date.today(),
+        )
+        self._slots[normalized] = slot
+        metrics.set_gauge("agent.response_cache.entries", len(self._slots))
+
+    def _remove(self, normalized: str):
+        slot = self._slots.pop(normalized, None)
+        if slot is None:
+            return
+        self._valid[slot] = False
+        self._entries[slot] = None
+        self._free.append(slot)
+        metrics.set_gauge("agent.response_cache.entries", len(self._slots))
+
+    def _record(self, outcome: str):
+        metrics.inc(f"agent.response_cache.{outcome}")
+        hits = metrics.counter("agent.response_cache.hit")
+        total = hits + metrics.counter("agent.response_cache.miss")
+        metrics.set_gauge("agent.response_cache.hit_rate", round(hits / total, 4))
+
+
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+
+
+class ToolResultCache:
+    """
+    TTL + LRU cache for agent tool results. Identical lookups that arrive while the first
+    one is still loading wait for it instead of calling the upstream again.
+    """
+
+    def __init__(self, name: str, ttl_seconds: int, max_entries: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: Dict[Any, asyncio.Task] = {}
+
+    async def get_or_load(self, key: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            metrics.inc(f"agent.tool.{self.name}.cache_hit")
+            return entry[1]
+        if entry:
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task:
+            metrics.inc(f"agent.tool.{self.name}.coalesced")
+        else:
+            metrics.inc(f"agent.tool.{self.name}.cache_miss")
+            task = asyncio.create_task(self._load(key, loader))
+            self._inflight[key] = task
+        # Shielded so one cancelled caller does not fail the others waiting on the same load
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.inc(f"agent.tool.{self.name}.eviction")
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,68 @@
+import time
+from typing import Optional
+
+from configs.logger import logger
+from src.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for `reset_timeout` seconds after `failure_threshold`
+    consecutive failures, then lets a single trial call through (half-open) to probe it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        metrics.inc(f"circuit.{self.name}.rejected")
+        return False
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being rejected, without claiming the half-open trial."""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        self._failures = 0
+        self._trial_running = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def release(self):
+        """Give up the half-open trial without an outcome (e.g. the call was cancelled), so another can probe."""
+        self._trial_running = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        metrics.set_gauge(f"circuit.{self.name}.open", 1 if state == OPEN else 0)
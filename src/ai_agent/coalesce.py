@@ -0,0 +1,199 @@
+import os
+import re
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from src.metrics import metrics
+from src.ai_agent.cache import name_pattern, normalize_query
+
+load_dotenv()
+# Single-flight for identical first messages: concurrent requests share one model run
+COALESCE_ENABLED = os.getenv(
+    "COALESCE_ENABLED", "True").lower() in ("true", "1", "yes")
+
+FlightKey = Tuple[str, str, str]
+_TRAILING_WORD = re.compile(r"\w*\Z")
+
+
+class FlightAbandoned(Exception):
+    """The shared run stopped before answering, because everyone waiting for it left or its leader gave up."""
+
+
+class Flight:
+    """
+    One model run shared by every request that asked the same first question while it was running.
+    The run is pumped by a task of its own (see `FlightRegistry.start`), so the leader leaving does not stop
+    it for the followers; followers read its deltas with the leader's name swapped for theirs.
+    """
+
+    def __init__(self, key: FlightKey, leader_name: str):
+        self.key = key
+        self.leader_name = leader_name
+        self.followers = 0
+        self.subscribers = 1  # The leader
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._deltas: List[str] = []
+        self._changed = asyncio.Event()
+
+    def publish(self, delta: str):
+        self._deltas.append(delta)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.finished = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def deltas(self) -> AsyncIterator[str]:
+        """
+        Every delta of the answer so far, then the live ones. Raises the run's error, or FlightAbandoned
+        when it was cancelled or timed out, in which case a follower should answer on its own.
+        """
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self._deltas):
+                yield self._deltas[sent]
+                sent += 1
+            if self.finished:
+                if isinstance(self.error, (asyncio.CancelledError, asyncio.TimeoutError)):
+                    raise FlightAbandoned() from self.error
+                if self.error:
+                    raise self.error
+                return
+            await changed.wait()
+
+    async def answer(self) -> str:
+        return "".join([delta async for delta in self.deltas()])
+
+
+class FlightRegistry:
+    """In-flight shared model runs of this worker, keyed by (normalized prompt, model, system prompt version)."""
+
+    def __init__(self):
+        self._flights: Dict[FlightKey, Flight] = {}
+
+    def key(self, user_message: str, model_name: str, prompt_fingerprint: str) -> FlightKey:
+        # The fingerprint leaves out the per-user fields of the prompt, so different users share a flight
+        return normalize_query(user_message), model_name, prompt_fingerprint
+
+    def join(self, key: FlightKey) -> Optional[Flight]:
+        flight = self._flights.get(key)
+        if flight:
+            flight.followers += 1
+            flight.subscribers += 1
+            metrics.inc("agent.coalesce.deduplicated")
+        return flight
+
+    def lead(self, key: FlightKey, leader_name: str) -> Flight:
+        flight = Flight(key, leader_name)
+        self._flights[key] = flight
+        metrics.inc("agent.coalesce.leaders")
+        return flight
+
+    def start(self, flight: Flight, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Run the leader's model stream for everyone in the flight; returns the leader's view of it."""
+        flight.task = asyncio.create_task(self._pump(flight, chunks))
+        return flight.deltas()
+
+    async def _pump(self, flight: Flight, chunks: AsyncIterator[str]):
+        try:
+            async for delta in chunks:
+                flight.publish(delta)
+        except asyncio.CancelledError as e:
+            self.land(flight, e)
+            raise
+        except Exception as e:
+            self.land(flight, e)
+            return
+        self.land(flight)
+
+    def leave(self, flight: Flight):
+        """A leader or follower stopped reading; the run is cancelled once nobody is left to read it."""
+        flight.subscribers -= 1
+        if flight.subscribers <= 0 and flight.task and not flight.task.done():
+            metrics.inc("agent.coalesce.cancelled")
+            flight.task.cancel()
+            # A task cancelled before it first ran never gets to land the flight itself
+            self.land(flight, asyncio.CancelledError())
+
+    def land(self, flight: Flight, error: Optional[BaseException] = None):
+        """Finish a flight; requests arriving after this start a new one."""
+        if flight.finished:
+            return
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        flight.finish(error)
+        if flight.followers:
+            metrics.observe("agent.coalesce.fan_out", flight.followers + 1)
+
+
+def _name_replacements(old: str, new: str) -> Dict[str, str]:
+    # The full name, and each part of it on its own ("Ann" of "Ann Lee"), to the matching part of the new name
+    replacements = {old: new}
+    new_parts = new.split()
+    for index, part in enumerate(old.split()):
+        replacements.setdefault(part, new_parts[index] if index < len(new_parts) and len(new_parts) > 1 else new)
+    return replacements
+
+
+def rename_text(text: str, old: str, new: str) -> str:
+    """Replace the name `old` with `new` in a whole answer, as whole words only."""
+    if not old or old == new:
+        return text
+    replacements = _name_replacements(old, new)
+    return name_pattern(list(replacements)).sub(lambda match: replacements[match.group()], text)
+
+
+async def rename_deltas(deltas: AsyncIterator[str], old: str, new: str) -> AsyncIterator[str]:
+    """
+    `rename_text` over streamed text. A tail that may still grow into a name, or into a longer word
+    that only starts like one ("Ann" then "ual"), is held back until the next delta decides it.
+    """
+    if not old or old == new:
+        async for delta in deltas:
+            yield delta
+        return
+    replacements = _name_replacements(old, new)
+    pattern = name_pattern(list(replacements))
+    text, sent = "", 0  # Sent text stays in `text` as context for the whole-word check
+
+    def rename(end: int) -> str:
+        parts, position = [], sent
+        for match in pattern.finditer(text, sent):
+            if match.end() > end:
+                break
+            parts.append(text[position:match.start()])
+            parts.append(replacements[match.group()])
+            position = match.end()
+        parts.append(text[position:end])
+        return "".join(parts)
+
+    async for delta in deltas:
+        text += delta
+        held = len(_TRAILING_WORD.search(text, sent).group())
+        for name in replacements:
+            for size in range(min(len(name), len(text) - sent), held, -1):
+                if text.endswith(name[:size]):
+                    held = size
+                    break
+        cut = len(text) - held
+        if cut > sent:
+            yield rename(cut)
+            sent = cut
+        # Only a little sent text is needed as context
+        if sent > 1:
+            text, sent = text[sent - 1:], 1
+    if len(text) > sent:
+        yield rename(len(text))
+
+
+flights = FlightRegistry() if COALESCE_ENABLED else None
@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import itertools
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Set
+
+import httpx
+from dotenv import load_dotenv
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelMessage
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.models.gemini import (
+    GeminiModel,
+    GeminiModelSettings,
+    _gemini_request_ta,
+    _settings_to_generation_config
+)
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+from configs.logger import logger
+from src.metrics import metrics
+from src.ai_agent.utils import estimate_tokens
+
+load_dotenv()
+# Explicit Gemini context caching of the static system prompt & tool definitions (opt-in, storage is billed per hour):
+# lifetime of a cache, refresh once less than this is left & the smallest prefix worth caching (the API's minimum)
+CONTEXT_CACHE_ENABLED = os.getenv(
+    "CONTEXT_CACHE_ENABLED", "False").lower() in ("true", "1", "yes")
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", 3600))
+CONTEXT_CACHE_REFRESH_SECONDS = int(os.getenv("CONTEXT_CACHE_REFRESH_SECONDS", 300))
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", 1024))
+CONTEXT_CACHE_API_URL = "https://generativelanguage.googleapis.com/v1beta/"
+EXPIRY_MARGIN_SECONDS = 30  # A request must not start on a cache about to expire under it
+CREATE_RETRY_SECONDS = 60  # Back off from a prefix whose cache could not be created
+
+
+@dataclass
+class CacheHandle:
+    """A cachedContents resource of the provider."""
+    name: str  # e.g. cachedContents/abc123
+    expires_at: float  # time.monotonic()
+    tokens: int
+
+
+class GeminiCacheClient:
+    """The cachedContents REST calls, through the provider's HTTP client (which carries the API key)."""
+
+    def __init__(self, client: httpx.AsyncClient, api_url: str = CONTEXT_CACHE_API_URL):
+        self.client = client
+        self.api_url = api_url
+
+    async def create(self, content: dict, ttl: int) -> CacheHandle:
+        response = await self.client.post(f"{self.api_url}cachedContents", json={**content, "ttl": f"{ttl}s"})
+        response.raise_for_status()
+        data = response.json()
+        return CacheHandle(name=data["name"], expires_at=time.monotonic() + ttl,
+                           tokens=data.get("usageMetadata", {}).get("totalTokenCount", 0))
+
+    async def refresh(self, handle: CacheHandle, ttl: int):
+        response = await self.client.patch(f"{self.api_url}{handle.name}", params={"updateMask": "ttl"},
+                                           json={"ttl": f"{ttl}s"})
+        response.raise_for_status()
+        handle.expires_at = time.monotonic() + ttl
+
+    async def delete(self, handle: CacheHandle):
+        response = await self.client.delete(f"{self.api_url}{handle.name}")
+        response.raise_for_status()
+
+
+class ContextCache:
+    """
+    Provider-side caches of stable prompt prefixes, shared by the requests of this worker.
+    One cache per (model, prefix, tools): created on first use, refreshed in the background
+    before it expires, dropped when the provider no longer knows it.
+    Only prefixes registered with `register_prefix` are cached, so nothing per-user is uploaded.
+    """
+
+    def __init__(
+        self,
+        client: GeminiCacheClient,
+        ttl: int = CONTEXT_CACHE_TTL_SECONDS,
+        refresh_before: int = CONTEXT_CACHE_REFRESH_SECONDS,
+        min_tokens: int = CONTEXT_CACHE_MIN_TOKENS,
+        expiry_margin: float = EXPIRY_MARGIN_SECONDS,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.refresh_before = refresh_before
+        self.min_tokens = min_tokens
+        self.expiry_margin = expiry_margin
+        self.prefixes: Set[str] = set()
+        self._handles: Dict[str, CacheHandle] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._deleting: Set[asyncio.Task] = set()
+        self._failed_until: Dict[str, float] = {}
+
+    def register_prefix(self, text: str):
+        self.prefixes.add(text)
+
+    async def get(self, content: dict) -> Optional[CacheHandle]:
+        """
+        The cache for a prefix, creating it if needed.
+        Args:
+            content (dict): The cachedContents body: model, systemInstruction, tools & toolConfig.
+        Returns:
+            CacheHandle: The cache, or None to send the prefix uncached (too short, or the cache is unavailable).
+        """
+        serialized = json.dumps(content, sort_keys=True)
+        if estimate_tokens(serialized) < self.min_tokens:
+            metrics.inc("agent.context_cache.too_short")
+            return None
+        key = hashlib.sha1(serialized.encode()).hexdigest()
+        now = time.monotonic()
+
+        handle = self._handles.get(key)
+        if handle and handle.expires_at - now > self.expiry_margin:
+            if handle.expires_at - now < self.refresh_before and key not in self._refreshing:
+                self._refreshing[key] = asyncio.create_task(self._refresh(key, handle))
+            metrics.inc("agent.context_cache.hit")
+            return handle
+        if handle:
+            del self._handles[key]  # Expired before a refresh got through
+        if self._failed_until.get(key, 0) > now:
+            return None
+
+        task = self._inflight.get(key)
+        if not task:
+            metrics.inc("agent.context_cache.miss")
+            task = asyncio.create_task(self._create(key, content))
+            self._inflight[key] = task
+        # Shielded so one cancelled request does not fail the others waiting on the same cache
+        return await asyncio.shield(task)
+
+    def invalidate(self, handle: CacheHandle):
+        """Forget a cache the provider rejected or that could not be refreshed; the next request creates a new one."""
+        for key, known in list(self._handles.items()):
+            if known is handle:
+                del self._handles[key]
+                metrics.inc("agent.context_cache.invalidated")
+        if handle.expires_at > time.monotonic():
+            # It may still exist & be billed until its TTL runs out
+            task = asyncio.create_task(self._delete(handle))
+            self._deleting.add(task)
+            task.add_done_callback(self._deleting.discard)
+        self._report()
+
+    async def _delete(self, handle: CacheHandle):
+        try:
+            await self.client.delete(handle)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                logger.error(f"Error deleting context cache {handle.name}: {e}")
+        except Exception as e:
+            logger.error(f"Error deleting context cache {handle.name}: {e}")
+
+    async def _create(self, key: str, content: dict) -> Optional[CacheHandle]:
+        try:
+            handle = await self.client.create(content, self.ttl)
+        except Exception as e:
+            logger.error(f"Error creating context cache for {content.get('model')}: {e}")
+            metrics.inc("agent.context_cache.errors")
+            self._failed_until[key] = time.monotonic() + CREATE_RETRY_SECONDS
+            return None
+        finally:
+            self._inflight.pop(key, None)
+        self._failed_until.pop(key, None)
+        self._handles[key] = handle
+        metrics.inc("agent.context_cache.created")
+        self._report()
+        return handle
+
+    async def _refresh(self, key: str, handle: CacheHandle):
+        try:
+            await self.client.refresh(handle, self.ttl)
+            metrics.inc("agent.context_cache.refreshed")
+        except Exception as e:
+            logger.error(f"Error refreshing context cache {handle.name}: {e}")
+            metrics.inc("agent.context_cache.errors")
+            self.invalidate(handle)
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _report(self):
+        metrics.set_gauge("agent.context_cache.entries", len(self._handles))
+        metrics.set_gauge("agent.context_cache.tokens", sum(handle.tokens for handle in self._handles.values()))
+
+    async def close(self):
+        """Delete this worker's caches on shutdown instead of paying for their storage until they expire."""
+        for task in self._refreshing.values():
+            task.cancel()
+        handles = list(self._handles.values())
+        self._handles.clear()
+        results = await asyncio.gather(*(self.client.delete(handle) for handle in handles), return_exceptions=True)
+        for handle, result in zip(handles, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error deleting context cache {handle.name}: {result}")
+        await asyncio.gather(*self._deleting, return_exceptions=True)
+        self._report()
+
+
+class CachedGeminiModel(GeminiModel):
+    """
+    GeminiModel that sends a registered static system prompt & the tool definitions as an explicit
+    context cache (`cachedContent`), instead of uploading them with every request.
+    The rest of the system prompt (per-user fields, summary, retrieved context) is moved in front of the
+    current user message, as the API does not allow a system instruction next to a cache.
+    Falls back to the plain request when there is nothing to cache or the provider rejects the cache.
+    """
+
+    def __init__(self, *args, context_cache: Optional[ContextCache] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.context_cache = context_cache
+
+    @asynccontextmanager
+    async def _make_request(
+        self,
+        messages: list[ModelMessage],
+        streamed: bool,
+        model_settings: GeminiModelSettings,
+        model_request_parameters: ModelRequestParameters,
+    ) -> AsyncIterator[httpx.Response]:
+        start = time.perf_counter()
+        handle, request_json = await self._cached_request(messages, model_settings, model_request_parameters)
+        if handle:
+            url = f'/{self.model_name}:{"streamGenerateContent" if streamed else "generateContent"}'
+            async with self.client.stream(
+                "POST",
+                url,
+                content=request_json,
+                headers={"Content-Type": "application/json"},
+                timeout=model_settings.get("timeout", httpx.USE_CLIENT_DEFAULT),
+            ) as response:
+                if response.status_code == 200:
+                    metrics.observe("agent.context_cache.first_byte_ms.cached", (time.perf_counter() - start) * 1000)
+                    yield response
+                    return
+                await response.aread()
+                if not _cache_rejected(response):
+                    raise ModelHTTPError(status_code=response.status_code, model_name=self.model_name,
+                                         body=response.text)
+                # Deleted, expired or not accessible: send the prefix with the request this time
+                logger.warning(f"Context cache {handle.name} rejected ({response.status_code}): {response.text}")
+                self.context_cache.invalidate(handle)
+
+        async with super()._make_request(messages, streamed, model_settings, model_request_parameters) as response:
+            metrics.observe("agent.context_cache.first_byte_ms.uncached", (time.perf_counter() - start) * 1000)
+            yield response
+
+    async def _cached_request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: GeminiModelSettings,
+        model_request_parameters: ModelRequestParameters,
+    ):
+        """The cache & the request body referencing it, or (None, None) to send a plain request."""
+        if self.context_cache is None or model_request_parameters.output_mode not in ("text", "tool"):
+            return None, None
+        sys_prompt_parts, contents = await self._message_to_gemini_content(messages)
+        if not sys_prompt_parts or sys_prompt_parts[0]["text"] not in self.context_cache.prefixes:
+            return None, None
+
+        prefix = {"contents": [], "systemInstruction": {"role": "user", "parts": sys_prompt_parts[:1]}}
+        tools = self._get_tools(model_request_parameters)
+        if tools is not None:
+            prefix["tools"] = tools
+        tool_config = self._get_tool_config(model_request_parameters, tools)
+        if tool_config is not None:
+            prefix["toolConfig"] = tool_config
+        content = _gemini_request_ta.dump_python(prefix, by_alias=True, mode="json")
+        del content["contents"]
+        handle = await self.context_cache.get({"model": f"models/{self.model_name}", **content})
+        if handle is None:
+            return None, None
+
+        if sys_prompt_parts[1:]:
+            # In front of the current user prompt (the latest text from the user, tool results come after it),
+            # so the history before it reads the same on every turn
+            current = next((content for content in reversed(contents) if content["role"] == "user"
+                            and any("text" in part for part in content["parts"])), None)
+            if current:
+                current["parts"] = sys_prompt_parts[1:] + current["parts"]
+            else:
+                contents.insert(0, {"role": "user", "parts": sys_prompt_parts[1:]})
+        request = {"contents": contents}
+        if safety_settings := model_settings.get("gemini_safety_settings"):
+            request["safetySettings"] = safety_settings
+        request = _gemini_request_ta.dump_python(request, by_alias=True, mode="json")
+        if generation_config := _settings_to_generation_config(model_settings):
+            request["generationConfig"] = generation_config
+        request["cachedContent"] = handle.name
+        return handle, json.dumps(request)
+
+
+def _cache_rejected(response: httpx.Response) -> bool:
+    """Whether a failed request was refused over its cachedContent (gone or not ours), not its own content."""
+    if response.status_code not in (403, 404):
+        return False
+    try:
+        message = response.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return "cachedcontent" in message.lower().replace(" ", "")
+
+
+def fake_gemini_provider(
+    answer: str = "This is a canned answer from a local fake Gemini.",
+    uncached_ms_per_1k_tokens: float = 20,
+    cached_ms_per_1k_tokens: float = 2,
+    cache_ttl_seconds: Optional[float] = None,
+) -> GoogleGLAProvider:
+    """
+    Local stand-in for the Gemini API, for exercising context caching without network calls.
+    It implements cachedContents (create, refresh, delete) and (stream)generateContent, reports
+    cachedContentTokenCount in the usage & waits before answering in proportion to the input tokens,
+    with cached tokens cheaper than uncached ones.
+    Args:
+        answer (str): The answer to every request.
+        uncached_ms_per_1k_tokens (float): Delay per 1000 input tokens sent with the request.
+        cached_ms_per_1k_tokens (float): Delay per 1000 input tokens read from a cache.
+        cache_ttl_seconds (float): Expire caches after this long regardless of their TTL, to simulate eviction.
+    Returns:
+        GoogleGLAProvider: A provider for GeminiModel / CachedGeminiModel.
+    """
+    caches: Dict[str, tuple] = {}  # name -> (expires_at, tokens)
+    ids = itertools.count(1)
+
+    def expires_at(ttl: str) -> float:
+        seconds = float(ttl.rstrip("s"))
+        return time.monotonic() + min(seconds, cache_ttl_seconds or seconds)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        body = json.loads(request.content) if request.content else {}
+        if path.endswith("/cachedContents") and request.method == "POST":
+            name = f"cachedContents/fake-{next(ids)}"
+            tokens = estimate_tokens(json.dumps(body))
+            caches[name] = (expires_at(body["ttl"]), tokens)
+            return httpx.Response(200, json={"name": name, "usageMetadata": {"totalTokenCount": tokens}})
+        if "/cachedContents/" in path:
+            name = path[path.index("cachedContents/"):]
+            if name not in caches or caches[name][0] < time.monotonic():
+                caches.pop(name, None)
+                return httpx.Response(404, json={"error": {"code": 404, "message": f"{name} not found"}})
+            if request.method == "PATCH":
+                caches[name] = (expires_at(body["ttl"]), caches[name][1])
+            else:
+                del caches[name]
+            return httpx.Response(200, json={})
+
+        cached_tokens = 0
+        if "cachedContent" in body:
+            cache = caches.get(body.pop("cachedContent"))
+            if not cache or cache[0] < time.monotonic():
+                return httpx.Response(403, json={"error": {"code": 403, "message": "CachedContent not found"}})
+            cached_tokens = cache[1]
+        uncached_tokens = estimate_tokens(json.dumps(body))
+        await asyncio.sleep((uncached_tokens * uncached_ms_per_1k_tokens + cached_tokens * cached_ms_per_1k_tokens)
+                            / 1000 / 1000)
+        output_tokens = estimate_tokens(answer)
+
+        def response(text: str) -> dict:
+            return {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {
+                    "promptTokenCount": uncached_tokens + cached_tokens,
+                    "cachedContentTokenCount": cached_tokens,
+                    "candidatesTokenCount": output_tokens,
+                    "totalTokenCount": uncached_tokens + cached_tokens + output_tokens,
+                },
+                "modelVersion": path.rsplit("/", 1)[-1].split(":")[0],
+            }
+
+        if not path.endswith(":streamGenerateContent"):
+            return httpx.Response(200, json=response(answer))
+
+        async def stream():
+            # A JSON array, one response per word, like the API's streamed responses
+            for index, word in enumerate(answer.split(" ")):
+                yield (("[" if index == 0 else ",\n") + json.dumps(response(word + " "))).encode()
+            yield b"]"
+
+        return httpx.Response(200, content=stream())
+
+    return GoogleGLAProvider(api_key="fake", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)))
@@ -1,151 +1,425 @@
 import os
 import json
-from typing import List
+import time
+import asyncio
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from sqlalchemy import update
 from datetime import datetime, timezone
 
-from ddgs import DDGS
 from pydantic_ai import Agent
 from pydantic_ai.messages import (
     ModelRequest,
-    SystemPromptPart
+    ModelResponse,
+    SystemPromptPart,
+    ToolCallPart
 )
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
 
 from configs.logger import logger
+from configs.database import AsyncSessionLocal
+from src.metrics import metrics
 
 from src.auth.models import User
-from src.ai_agent.models import ChatMessage
-from src.ai_agent.schemas import ChatGetResponse
-from src.ai_agent.tools import custom_knowledge_tool
-from src.ai_agent.utils import AgentDeps, to_pydantic_ai_message, save_conversation_history
+from src.ai_agent.models import ChatSession, ChatMessage
+from src.ai_agent.tools import (
+    PREFETCH_RETRIEVAL,
+    knowledge_tool,
+    cached_duckduckgo_search_tool,
+    prefetch_context
+)
+from src.auth.exceptions import TooManyRequestsException
+from src.ai_agent.search import index_session_title
+from src.ai_agent.router import RoutedModel
+from src.ai_agent.persistence import PendingTurn, turn_writer
+from src.ai_agent.jobs import job_runner, RUNNING, COMPLETED
+from src.ai_agent.coalesce import FlightAbandoned, flights, rename_deltas, rename_text
+from src.ai_agent.prompts import chat_prompt, record_usage
+from src.ai_agent.context_cache import CONTEXT_CACHE_ENABLED, CachedGeminiModel, ContextCache, GeminiCacheClient
+from src.ai_agent.admission import admission, LLM_SUPERUSER_WEIGHT, QUEUE_UPDATE_SECONDS
+from src.ai_agent.cache import (
+    HistoryTurn,
+    response_cache,
+    is_context_dependent,
+    replay_chunks
+)
+from src.ai_agent.utils import (
+    AgentDeps,
+    build_history_window,
+    coalesce_chunks,
+    truncate_to_tokens
+)
 
 # Load environment variables from .env file
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GOOGLE_GLA_API_KEY")
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
+SUMMARY_MODEL_NAME = os.getenv("SUMMARY_MODEL_NAME") or GEMINI_MODEL_NAME
+# Summarize once this many unsummarized turns pile up, keeping the newest ones verbatim; turns folded per model call
+SUMMARY_TRIGGER_MESSAGES = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", 20))
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", 6))
+SUMMARY_CHUNK_MESSAGES = int(os.getenv("SUMMARY_CHUNK_MESSAGES", 50))
+# Title generation: sessions per model call & how long to wait for a batch to fill
+TITLE_BATCH_SIZE = int(os.getenv("TITLE_BATCH_SIZE", 8))
+TITLE_BATCH_WAIT_MS = int(os.getenv("TITLE_BATCH_WAIT_MS", 200))
+# Chat models in order of preference; later ones serve hedged & failed-over requests
+CHAT_MODEL_NAMES = [name.strip() for name in (os.getenv("CHAT_MODEL_NAMES") or GEMINI_MODEL_NAME).split(",")
+                    if name.strip()]
 
 gemini_model = GeminiModel(
     GEMINI_MODEL_NAME, provider=GoogleGLAProvider(api_key=GEMINI_API_KEY)
 )
+# Provider-side cache of the static chat prompt & tool definitions, shared by this worker's requests
+context_cache = ContextCache(GeminiCacheClient(gemini_model.client)) if CONTEXT_CACHE_ENABLED else None
+if context_cache:
+    context_cache.register_prefix(chat_prompt.static)
+chat_model = RoutedModel(*[
+    CachedGeminiModel(name, provider=GoogleGLAProvider(api_key=GEMINI_API_KEY), context_cache=context_cache)
+    for name in CHAT_MODEL_NAMES
+])
+summary_model = gemini_model if SUMMARY_MODEL_NAME == GEMINI_MODEL_NAME else GeminiModel(
+    SUMMARY_MODEL_NAME, provider=GoogleGLAProvider(api_key=GEMINI_API_KEY)
+)
 
 # Initialize the agent with the Gemini model and tools
 ai_agent = Agent(
+    model=chat_model,
+    deps_type=AgentDeps,
+    tools=[cached_duckduckgo_search_tool(), knowledge_tool()],
+)
+
+summary_agent = Agent(
+    model=summary_model,
+    system_prompt="""You maintain a running summary of a conversation between a user and an AI assistant.
+    Merge the new conversation turns into the existing summary. Keep facts, names, preferences, decisions and open questions.
+    Drop small talk. Respond with the updated summary only, in at most 250 words.
+    """,
+)
+
+# Background summarization tasks, one per session
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+METADATA_PROMPT = """You are a helpful AI Assistant. Your purpose is to extract a short title from the user's query.\n
+    If the query is not relevant for a title, respond with "New chat". You do not answer any query only response with the plain title.\n
+    """
+metadata_agent = Agent(
+    model=gemini_model,
+    system_prompt=METADATA_PROMPT,
+)
+
+
+class TitleBatch(BaseModel):
+    titles: List[str]
+
+
+title_batch_agent = Agent(
     model=gemini_model,
-    tools=[duckduckgo_search_tool(duckduckgo_client=DDGS(), max_results=5)],
+    output_type=TitleBatch,
+    system_prompt=METADATA_PROMPT + """You receive several numbered queries. Return exactly one title per query, in the same order.
+    """,
 )
 
 
 async def execute_agent(
     user: User,
     user_message: str,
-    messages: List[ChatMessage],
+    messages: List[HistoryTurn],
     agent_deps: AgentDeps,
     stream: bool = False,
     sse_mode: bool = False,
     session_id: str = None,
     chat: ChatMessage = None,
-    db: Session = None,
-    start_time: datetime = None
+    start_time: datetime = None,
+    summary: Optional[str] = None,
+    retrieval: Optional[asyncio.Task] = None
 ):
     """
     Execute the AI agent with the provided user message and conversation history.
     Args:
         user (User): The user object.
         user_message (str): The message from the user.
-        messages (List[ChatMessage]): Conversation history.
+        messages (List[HistoryTurn]): Conversation history, see `to_history_turns`.
         agent_deps (AgentDeps): Dependencies for the agent.
         stream (bool): Whether to stream the response.
         sse_mode (bool): Whether to use Server-Sent Events mode.
         session_id (str): The session ID for the chat.
         chat (ChatMessage): Optional existing chat message to update.
-        db (Session): Database session for saving chat history.
         start_time (datetime): Start time for measuring duration.
+        summary (str): Rolling summary of the turns older than `messages`.
+        retrieval (asyncio.Task): Speculative retrieval started by `start_retrieval`, if any.
     Returns:
-        str or generator: The output from the agent or a generator for streaming responses.
+        str, generator or Job: The output from the agent, a generator for streaming responses,
+        or in SSE mode the background job generating the answer.
     """
-    # Convert ChatMessage objects to Pydantic AI message format
-    history = to_pydantic_ai_message(messages)
+    run_start = time.perf_counter()
+    mode = "prefetch" if retrieval else "baseline"
+    # Newest turns first, up to the token budget
+    history, history_tokens = build_history_window(messages)
+    metrics.observe("agent.history.tokens", history_tokens)
+    logger.info(
+        f"History window for session {session_id}: {len(history)} messages, ~{history_tokens} tokens")
 
-    prompt = f"""You are a helpful AI Assistant.
+    # Byte-stable instructions first, so the provider's prompt cache can serve them; name & date trail them
+    system_parts = chat_prompt.render(user.name)
+    if summary:
+        system_parts.append(SystemPromptPart(
+            content=f"Summary of the earlier conversation:\n{summary}"))
 
-    ## Important Instructions:
-    - ALWAYS address the user by name. User's name is {user.name}.
-    - Use the duckduckgo_search_tool to search the web if you need up to date information on something.
-    - Include the source of search results in markdown format like this: `Source: [Source 1](https://www.source1.com/news/abc), [Source 2](https://www.source2.com/news/abc), etc`, if you use the duckduckgo_search_tool.
-    - Today's date is: {datetime.now().strftime('%Y-%m-%d')} & today is {datetime.now().strftime('%A')}.
-    """
-    system_msg = ModelRequest(parts=[SystemPromptPart(content=prompt)])
-    messages_with_prompt = [system_msg] + history
+    # Standalone questions may be answered from the response cache; resubmits always regenerate
+    use_cache = response_cache is not None and not chat and \
+        not is_context_dependent(user_message, bool(history) or bool(summary))
+    cached = response_cache.get(user_message, user.name) if use_cache else None
+    if cached and retrieval:
+        retrieval.cancel()
+
+    # SSE answers run as background jobs (see src/ai_agent/jobs.py)
+    as_job = stream and sse_mode and session_id
+    if as_job:
+        try:
+            job_runner.check_capacity()
+        except TooManyRequestsException:
+            if retrieval:
+                retrieval.cancel()
+            raise
+
+    # Identical first messages asked at the same time share one model run (see src/ai_agent/coalesce.py)
+    flight_key, following, leading = None, None, None
+    if flights is not None and not cached and not chat and not history and not summary:
+        flight_key = flights.key(user_message, getattr(ai_agent.model, "model_name", str(ai_agent.model)),
+                                 chat_prompt.fingerprint)
+        following = flights.join(flight_key)
+        if following and retrieval:
+            retrieval.cancel()
+            retrieval = None
+
+    def admit():
+        # Admission control: rate limit, fair queue & shedding (raises a 429 before anything is streamed)
+        return admission.enqueue(user.id, LLM_SUPERUSER_WEIGHT if user.is_superuser else 1)
+
+    ticket = None
+    if not cached and not following:
+        try:
+            ticket = admit()
+        except TooManyRequestsException:
+            if retrieval:
+                retrieval.cancel()
+            raise
+        if flight_key:
+            leading = flights.lead(flight_key, user.name)
+
+    async def build_messages():
+        parts = list(system_parts)
+        if retrieval:
+            try:
+                context = await retrieval
+            except Exception as e:
+                logger.error(f"Speculative retrieval failed: {e}")
+                context = None
+            if context:
+                parts.append(SystemPromptPart(content=context))
+        return [ModelRequest(parts=parts)] + history
 
     if stream:
-        async def generator():
-            full_output = ""
-            prev_len = 0
+        async def agent_chunks():
+            first = True
             async with ai_agent.run_stream(
                 user_prompt=user_message,
-                message_history=messages_with_prompt,
+                message_history=await build_messages(),
                 deps=agent_deps
             ) as streamed_result:
-                async for partial_text in streamed_result.stream_text():
-                    # Delta logic
-                    new_chunk = partial_text[prev_len:]
-                    prev_len = len(partial_text)
+                # Deltas only: the cumulative text would be re-joined & re-sliced on every chunk
+                async for new_chunk in coalesce_chunks(streamed_result.stream_text(delta=True, debounce_by=None)):
+                    if first:
+                        first = False
+                        metrics.observe(f"agent.ttft_ms.{mode}",
+                                        (time.perf_counter() - run_start) * 1000)
+                    yield new_chunk
+            record_usage(streamed_result.usage())
+            metrics.observe(f"agent.tool_calls.{mode}",
+                            count_tool_calls(streamed_result.new_messages()))
+
+        def lead_chunks():
+            chunks = flights.start(leading, agent_chunks())
+            # The shared run keeps the admission slot until it ends, even if this request leaves first
+            leading.task.add_done_callback(lambda _: ticket.release())
+            return chunks
+
+        def shared_chunks():
+            # The leader's answer, addressed to this user
+            return rename_deltas(following.deltas(), following.leader_name, user.name)
+
+        async def cached_chunks():
+            for chunk in replay_chunks(cached.answer):
+                yield chunk
+
+        async def generator(message_id: Optional[int] = None):
+            nonlocal ticket, following
+            output_parts = []
+
+            async def queue_updates():
+                while ticket and not ticket.granted:
+                    if time.monotonic() >= ticket.deadline:
+                        ticket.expire()
+                    if sse_mode:
+                        position = ticket.position()
+                        queue_payload = {"position": position,
+                                         "estimated_wait_seconds": round(admission.estimated_wait(position), 1)}
+                        yield f"event: queue\ndata: {json.dumps(queue_payload)}\n\n"
+                    await ticket.wait(min(QUEUE_UPDATE_SECONDS, max(0.0, ticket.deadline - time.monotonic())))
+
+            async def relay(chunks):
+                async for new_chunk in chunks:
                     if not new_chunk:
                         continue
-
-                    full_output += new_chunk
+                    output_parts.append(new_chunk)
                     if sse_mode:
-                        yield f"event: chunk\ndata: {json.dumps({'text': new_chunk})}\n\n"
+                        # Same frame as json.dumps({"text": ...}), without building a dict per chunk
+                        yield f"event: chunk\ndata: {{\"text\": {json.dumps(new_chunk)}}}\n\n"
                     else:
                         yield new_chunk
 
-            # Only save + send done event in SSE mode
-            if sse_mode and db and session_id:
-                if not chat:
-                    chat_message = await save_conversation_history(
-                        session_id=session_id,
-                        human_message=user_message,
-                        ai_message=full_output,
-                        date_time=datetime.now(tz=timezone.utc),
-                        duration=(datetime.now(tz=timezone.utc) -
-                                  start_time).total_seconds() if start_time else None,
-                        db=db
-                    )
-                else:
-                    chat.human_message = user_message
-                    chat.ai_message = full_output
-                    chat.date_time = datetime.now(tz=timezone.utc)
-                    chat.duration = (datetime.now(
-                        tz=timezone.utc) - start_time).total_seconds() if start_time else None
-                    chat.positive_feedback = False
-                    chat.negative_feedback = False
-                    db.add(chat)
-                    db.commit()
-                    db.refresh(chat)
-                    chat_message = chat
+            try:
+                try:
+                    async for update in queue_updates():
+                        yield update
+                    chunks = cached_chunks() if cached else shared_chunks() if following else \
+                        lead_chunks() if leading else agent_chunks()
+                    async for frame in relay(chunks):
+                        yield frame
+                except FlightAbandoned:
+                    if output_parts or not following:
+                        raise
+                    # The shared run stopped before answering; answer on our own instead of failing with it
+                    metrics.inc("agent.coalesce.fallbacks")
+                    flights.leave(following)
+                    following = None
+                    ticket = admit()
+                    async for update in queue_updates():
+                        yield update
+                    async for frame in relay(agent_chunks()):
+                        yield frame
+            except TooManyRequestsException as e:
+                if not sse_mode:
+                    raise
+                yield f"event: error\ndata: {json.dumps({'status': e.status, 'message': e.message})}\n\n"
+                return
+            finally:
+                if leading:
+                    if leading.task is None:
+                        # Left before the shared run started; the followers answer on their own
+                        flights.land(leading, FlightAbandoned())
+                    flights.leave(leading)
+                if following:
+                    flights.leave(following)
+                if ticket and not (leading and leading.task):
+                    ticket.release()
+            full_output = "".join(output_parts)
+            if use_cache and not cached and not following:
+                response_cache.set(user_message, full_output, user.name,
+                                   (time.perf_counter() - run_start) * 1000)
+
+            # Only save + send done event for jobs; the turn is written behind the stream
+            if message_id:
+                turn = PendingTurn(
+                    message_id=message_id,
+                    session_id=session_id,
+                    human_message=user_message,
+                    ai_message=full_output,
+                    date_time=datetime.now(tz=timezone.utc),
+                    duration=(datetime.now(tz=timezone.utc) -
+                              start_time).total_seconds() if start_time else None,
+                    resubmit=chat is not None,
+                    generation_status=COMPLETED
+                )
+                await turn_writer.submit(turn)
                 done_payload = {
                     "status": 200,
                     "message": "success",
-                    "data": ChatGetResponse.model_validate(chat_message).model_dump(mode="json")
+                    "data": turn.to_response()
                 }
                 yield f"event: done\ndata: {json.dumps(done_payload)}\n\n"
 
-        return generator()
+        if not as_job:
+            return generator()
+        # The job id is the id of the message being answered; a new turn gets a hidden placeholder row
+        try:
+            message_id = chat.id if chat else await turn_writer.reserve(
+                session_id, user_message, start_time or datetime.now(tz=timezone.utc), generation_status=RUNNING)
+            if chat:
+                # Marked only once the job is accepted, so a 429 above leaves the resubmitted turn as it was
+                await turn_writer.set_status(chat.id, RUNNING)
+        except Exception:
+            if ticket:
+                ticket.release()
+            if retrieval:
+                retrieval.cancel()
+            if leading:
+                flights.land(leading, FlightAbandoned())
+            if following:
+                flights.leave(following)
+            raise
+        return job_runner.start(message_id, user.id, session_id, generator(message_id))
 
     else:
-        result = await ai_agent.run(
-            user_prompt=user_message,
-            message_history=messages_with_prompt,
-            deps=agent_deps
-        )
+        if cached:
+            return cached.answer
+        if following:
+            try:
+                return rename_text(await following.answer(), following.leader_name, user.name)
+            except FlightAbandoned:
+                # The shared run stopped before answering; answer on our own instead of failing with it
+                metrics.inc("agent.coalesce.fallbacks")
+                ticket = admit()
+            finally:
+                flights.leave(following)
+        try:
+            await ticket.acquire()
+            result = await ai_agent.run(
+                user_prompt=user_message,
+                message_history=await build_messages(),
+                deps=agent_deps
+            )
+            if leading:
+                leading.publish(result.output)
+                flights.land(leading)
+        except Exception as e:
+            if leading:
+                # Given up in the queue: the followers try for a slot of their own
+                flights.land(leading, FlightAbandoned() if isinstance(e, TooManyRequestsException) else e)
+            raise
+        finally:
+            ticket.release()
+            if leading:
+                # Cancelled: the followers answer on their own
+                flights.land(leading, FlightAbandoned())
         logger.info(f"Agent run details: {result.all_messages()}")
+        # Without streaming the first token arrives with the whole answer
+        metrics.observe(f"agent.ttft_ms.{mode}",
+                        (time.perf_counter() - run_start) * 1000)
+        metrics.observe(f"agent.tool_calls.{mode}",
+                        count_tool_calls(result.new_messages()))
+        record_usage(result.usage())
+        if use_cache:
+            response_cache.set(user_message, result.output, user.name,
+                               (time.perf_counter() - run_start) * 1000)
         return result.output
 
 
+def count_tool_calls(messages: list) -> int:
+    """Number of tool calls the model made, i.e. extra model round trips."""
+    return sum(isinstance(part, ToolCallPart) for message in messages
+               if isinstance(message, ModelResponse) for part in message.parts)
+
+
+def start_retrieval(user_message: str, agent_deps: AgentDeps, enabled: Optional[bool] = None) -> Optional[asyncio.Task]:
+    """Start speculative retrieval for a message, so it overlaps with loading the history."""
+    if not (PREFETCH_RETRIEVAL if enabled is None else enabled):
+        return None
+    return asyncio.create_task(prefetch_context(user_message, agent_deps))
+
+
 async def execute_metadata_agent(
     user_message: str
 ) -> str:
@@ -156,16 +430,213 @@ async def execute_metadata_agent(
     Returns:
         str: The output from the metadata agent.
     """
-    prompt = f"""You are a helpful AI Assistant. Your purpose is to extract a short title from the user's query.\n
-    If the query is not relevant for a title, respond with "New chat". You do not answer any query only response with the plain title.\n
-    """
-    metadata_agent = Agent(
-        model=gemini_model,
-        system_prompt=prompt,
-    )
     # Run the metadata agent with the user message
     result = await metadata_agent.run(user_prompt=user_message)
     output = result.output.replace("\n", " ").strip()
     logger.info(f"Metadata agent run details: {result.all_messages()}")
 
     return output
+
+
+async def execute_title_batch_agent(
+    user_messages: List[str]
+) -> List[str]:
+    """
+    Generate titles for several first messages with a single model call.
+    Args:
+        user_messages (List[str]): First messages of the sessions, one per session.
+    Returns:
+        List[str]: One title per message, in the same order.
+    """
+    if len(user_messages) == 1:
+        return [await execute_metadata_agent(user_messages[0])]
+
+    user_prompt = "\n".join(
+        f"{index}. {truncate_to_tokens(message, 200)}" for index, message in enumerate(user_messages, start=1))
+    result = await title_batch_agent.run(user_prompt=user_prompt)
+    titles = [title.replace("\n", " ").strip() for title in result.output.titles]
+    if len(titles) != len(user_messages):
+        # The model lost track of the numbering; fall back to one call per message
+        logger.warning(
+            f"Title batch returned {len(titles)} titles for {len(user_messages)} messages")
+        return list(await asyncio.gather(*(execute_metadata_agent(message) for message in user_messages)))
+    return titles
+
+
+async def execute_summary_agent(
+    previous_summary: Optional[str],
+    messages: List[ChatMessage]
+) -> str:
+    """
+    Fold conversation turns into the rolling session summary.
+    Args:
+        previous_summary (str): The current summary, if any.
+        messages (List[ChatMessage]): Turns to fold in, in chronological order.
+    Returns:
+        str: The updated summary.
+    """
+    transcript = "\n".join(
+        f"User: {truncate_to_tokens(msg.human_message or '', 500)}\n"
+        f"Assistant: {truncate_to_tokens(msg.ai_message or '', 500)}"
+        for msg in messages
+    )
+    user_prompt = f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+    result = await summary_agent.run(user_prompt=user_prompt)
+    return result.output.strip()
+
+
+async def summarize_session(session_id: str):
+    """
+    Fold all but the newest SUMMARY_KEEP_RECENT unsummarized turns of a session into its summary,
+    oldest first & SUMMARY_CHUNK_MESSAGES turns per model call, so a long backlog is folded completely.
+    """
+    start = time.perf_counter()
+    folded = 0
+    try:
+        async with AsyncSessionLocal() as db:
+            chat_session = await db.scalar(ChatSession.select_active().where(
+                ChatSession.session_id == session_id))
+            if not chat_session:
+                return
+            summary, summary_until = chat_session.summary, chat_session.summary_until
+
+            unsummarized = ChatMessage.select_active().where(ChatMessage.session_id == session_id)
+            if summary_until is not None:
+                unsummarized = unsummarized.where(ChatMessage.id > summary_until)
+            if SUMMARY_KEEP_RECENT:
+                # The oldest of the turns kept verbatim bounds the ones to fold
+                kept = (await db.scalars(
+                    unsummarized.with_only_columns(ChatMessage.id)
+                    .order_by(ChatMessage.id.desc())
+                    .limit(SUMMARY_KEEP_RECENT)
+                )).all()
+                if len(kept) < SUMMARY_KEEP_RECENT:
+                    return
+                unsummarized = unsummarized.where(ChatMessage.id < kept[-1])
+
+            while True:
+                query = unsummarized if summary_until is None else unsummarized.where(ChatMessage.id > summary_until)
+                to_fold = (await db.scalars(
+                    query.order_by(ChatMessage.id.asc()).limit(SUMMARY_CHUNK_MESSAGES))).all()
+                if not to_fold:
+                    break
+
+                new_summary = await execute_summary_agent(summary, to_fold)
+
+                # Only store it if nothing (e.g. a resubmit) reset the summary meanwhile
+                unchanged = ChatSession.summary_until.is_(None) if summary_until is None \
+                    else ChatSession.summary_until == summary_until
+                result = await db.execute(
+                    update(ChatSession)
+                    .where(ChatSession.session_id == session_id, unchanged)
+                    .values(summary=new_summary, summary_until=to_fold[-1].id)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if not result.rowcount:
+                    break
+                summary, summary_until = new_summary, to_fold[-1].id
+                folded += len(to_fold)
+        if not folded:
+            return
+        metrics.inc("agent.summary.runs")
+        metrics.observe("agent.summary.latency_ms",
+                        (time.perf_counter() - start) * 1000)
+        logger.info(
+            f"Summarized {folded} messages of session {session_id}")
+    except Exception as e:
+        metrics.inc("agent.summary.errors")
+        logger.error(f"Error summarizing session {session_id}: {e}")
+
+
+def schedule_session_summary(session_id: str, unsummarized_count: int):
+    """Start a background summarization when a session has grown past the threshold."""
+    if unsummarized_count < SUMMARY_TRIGGER_MESSAGES or session_id in _summary_tasks:
+        return
+    task = asyncio.create_task(summarize_session(session_id))
+    _summary_tasks[session_id] = task
+    task.add_done_callback(lambda _: _summary_tasks.pop(session_id, None))
+
+
+class TitleGenerator:
+    """
+    Background title generation. Requests for the same session share one job, and the
+    first messages of sessions created close together go to the model in one batch.
+    """
+
+    def __init__(self, batch_size: int = TITLE_BATCH_SIZE, batch_wait_ms: int = TITLE_BATCH_WAIT_MS):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._jobs: Dict[str, asyncio.Future] = {}
+        self._queue: List[tuple] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    def request(self, session_id: str, user_message: str) -> asyncio.Future:
+        """Queue a title for the session, or return the job already queued for it."""
+        job = self._jobs.get(session_id)
+        if job:
+            metrics.inc("agent.title.coalesced")
+            return job
+        loop = asyncio.get_running_loop()
+        job = loop.create_future()
+        self._jobs[session_id] = job
+        self._queue.append((session_id, user_message))
+        if len(self._queue) >= self.batch_size:
+            self._flush()
+        elif not self._flush_handle:
+            self._flush_handle = loop.call_later(self.batch_wait, self._flush)
+        return job
+
+    def _flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+        if self._queue:
+            self._flush_handle = asyncio.get_running_loop().call_later(0, self._flush)
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]):
+        start = time.perf_counter()
+        titles = [None] * len(batch)
+        try:
+            titles = await execute_title_batch_agent([message for _, message in batch])
+            await self._store(dict(zip((session_id for session_id, _ in batch), titles)))
+            metrics.inc("agent.title.batches")
+            metrics.observe("agent.title.batch_size", len(batch))
+            metrics.observe("agent.title.latency_ms",
+                            (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            metrics.inc("agent.title.errors")
+            logger.error(f"Error generating titles for {len(batch)} sessions: {e}")
+            titles = [None] * len(batch)
+        finally:
+            for (session_id, _), title in zip(batch, titles):
+                job = self._jobs.pop(session_id, None)
+                if job and not job.done():
+                    job.set_result(title)
+
+    async def _store(self, titles: Dict[str, str]):
+        async with AsyncSessionLocal() as db:
+            sessions = (await db.scalars(ChatSession.select_active().where(
+                ChatSession.session_id.in_(titles.keys()),
+                ChatSession.title.is_(None)
+            ))).all()
+            for session in sessions:
+                # A title set by the user meanwhile is kept by the is_(None) filter above
+                session.title = titles[session.session_id]
+                await index_session_title(db, session)
+            await db.commit()
+
+    async def stop(self):
+        """Flush queued sessions and wait for running batches, on shutdown."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+title_generator = TitleGenerator()
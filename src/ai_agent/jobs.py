@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Optional
+
+from dotenv import load_dotenv
+
+from configs.logger import logger
+from src.metrics import metrics
+from src.auth.exceptions import TooManyRequestsException
+from src.ai_agent.models import RUNNING, COMPLETED, FAILED, CANCELLED, TIMED_OUT
+from src.ai_agent.streams import Generation
+from src.ai_agent.persistence import turn_writer
+
+load_dotenv()
+# Background chat jobs (per worker): jobs generating at once, max run time of one & how long a finished one
+# can still be streamed or polled from memory
+JOB_MAX_ACTIVE = int(os.getenv("JOB_MAX_ACTIVE", 64))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", 300))
+JOB_RETAIN_SECONDS = float(os.getenv("JOB_RETAIN_SECONDS", 120))
+JOB_SHUTDOWN_TIMEOUT_SECONDS = 30
+
+
+class Job:
+    """One chat answer generated in the background. The job id is the id of the message it fills."""
+
+    def __init__(self, job_id: int, user_id: int, session_id: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.session_id = session_id
+        self.status = RUNNING
+        self.error: Optional[str] = None
+        self.generation = Generation()
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = time.monotonic()
+
+    @property
+    def finished(self) -> bool:
+        return self.status != RUNNING
+
+
+def effective_status(status: Optional[str], updated_at: Optional[datetime]) -> str:
+    """Status of a job read back from the DB, where no worker may be running it any more."""
+    if not status:
+        return COMPLETED  # Answered inline
+    if status == RUNNING and updated_at:
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        # Left behind by a worker that stopped before finishing it
+        if datetime.now(tz=timezone.utc) - updated_at > timedelta(seconds=JOB_TIMEOUT_SECONDS + JOB_SHUTDOWN_TIMEOUT_SECONDS):
+            return FAILED
+    return status
+
+
+class JobRunner:
+    """
+    Runs chat generation as background jobs, so the answer no longer depends on the request that asked for it:
+    - at most `max_active` jobs per worker (429 beyond that); model calls are further limited by admission control,
+    - each job is cancelled after `timeout` seconds or on request,
+    - the status is persisted on the message row, and the SSE frames are kept for streaming & resuming,
+    - finished jobs stay in memory for `retain` seconds for late subscribers & polls.
+    """
+
+    def __init__(
+        self,
+        max_active: int = JOB_MAX_ACTIVE,
+        timeout: float = JOB_TIMEOUT_SECONDS,
+        retain: float = JOB_RETAIN_SECONDS,
+    ):
+        self.max_active = max_active
+        self.timeout = timeout
+        self.retain = retain
+        self._jobs: Dict[int, Job] = {}
+        self._active = 0
+
+    def check_capacity(self):
+        """Raise a 429 before any work is done for a job that could not start."""
+        if self._active >= self.max_active:
+            metrics.inc("agent.jobs.rejected")
+            raise TooManyRequestsException(429, "Too many answers are being generated, please try again shortly")
+
+    def start(self, job_id: int, user_id: int, session_id: str, frames: AsyncIterator[str]) -> Job:
+        """Run an SSE frame generator as a job."""
+        self.check_capacity()
+        job = Job(job_id, user_id, session_id)
+        job.generation.append(
+            f"event: job\ndata: {json.dumps({'job_id': job_id, 'session_id': session_id})}\n\n")
+        self._jobs[job_id] = job
+        self._active += 1
+        job.task = asyncio.create_task(self._run(job, frames))
+        self._report()
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job: Job) -> bool:
+        if job.finished or not job.task:
+            return False
+        job.task.cancel()
+        return True
+
+    async def _run(self, job: Job, frames: AsyncIterator[str]):
+        try:
+            await asyncio.wait_for(self._pump(job, frames), self.timeout)
+        except asyncio.TimeoutError:
+            self._fail(job, TIMED_OUT, 504, "Generation timed out")
+        except asyncio.CancelledError:
+            self._fail(job, CANCELLED, 499, "Generation cancelled")
+        except Exception as e:
+            logger.error(f"Error generating job {job.job_id}: {e}")
+            self._fail(job, FAILED, 500, "Failed to generate a response")
+        finally:
+            if job.status == RUNNING:
+                job.status = FAILED  # The generator ended without a done event
+            job.generation.finish()
+            self._active -= 1
+            metrics.inc(f"agent.jobs.{job.status}")
+            metrics.observe("agent.jobs.duration_ms",
+                            (time.monotonic() - job.started_at) * 1000)
+            if job.status != COMPLETED:
+                # Completed turns are marked by the turn writer with the answer itself
+                await turn_writer.set_status(job.job_id, job.status)
+            asyncio.get_running_loop().call_later(self.retain, self._forget, job.job_id)
+            self._report()
+
+    async def _pump(self, job: Job, frames: AsyncIterator[str]):
+        async for frame in frames:
+            job.generation.append(frame)
+            if frame.startswith("event: done"):
+                job.status = COMPLETED
+            elif frame.startswith("event: error"):
+                job.status = FAILED
+                job.error = json.loads(frame.split("data: ", 1)[1]).get("message")
+
+    def _fail(self, job: Job, status: str, code: int, message: str):
+        job.status, job.error = status, message
+        job.generation.append(
+            f"event: error\ndata: {json.dumps({'status': code, 'message': message})}\n\n")
+
+    def _forget(self, job_id: int):
+        self._jobs.pop(job_id, None)
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge("agent.jobs.active", self._active)
+        metrics.set_gauge("agent.jobs.retained", len(self._jobs))
+
+    async def stop(self, timeout: float = JOB_SHUTDOWN_TIMEOUT_SECONDS):
+        """Let running jobs finish (and queue their turns) on shutdown, cancelling the rest."""
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.task.done()]
+        if not tasks:
+            return
+        _, not_done = await asyncio.wait(tasks, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.error(f"Cancelled {len(not_done)} chat jobs still running at shutdown")
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+
+job_runner = JobRunner()
@@ -1,8 +1,15 @@
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Double
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Double, Index
 
 from src.models import AbstractBase
 
+# Statuses of the background job generating a message, persisted in ChatMessage.generation_status
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timeout"
+
 
 class ChatSession(AbstractBase):
     __tablename__ = "chat_sessions"
@@ -13,6 +20,15 @@ class ChatSession(AbstractBase):
     user_id = Column(Integer, nullable=False)
     date_time = Column(DateTime(timezone=True), nullable=False)
     shared_to_public = Column(Boolean, default=False)
+    # Rolling summary of the turns up to & including message `summary_until`
+    summary = Column(Text, nullable=True)
+    summary_until = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        # Session listing: filter by owner & soft-delete flags, ordered by last activity
+        Index("ix_chat_sessions_user_listing",
+              "user_id", "is_deleted", "is_active", "date_time"),
+    )
 
     def __repr__(self):
         return f"{self.session_id}"
@@ -30,8 +46,16 @@ class ChatMessage(AbstractBase):
     duration = Column(Double, nullable=True)  # Duration in seconds
     positive_feedback = Column(Boolean, default=False)
     negative_feedback = Column(Boolean, default=False)
+    # Status of the background job generating the answer (see src/ai_agent/jobs.py); null for inline answers
+    generation_status = Column(String(20), nullable=True)
 
     chat_session = relationship("ChatSession", backref="chat_messages")
 
+    __table_args__ = (
+        # Conversation history: filter by session & soft-delete flags, newest rows first
+        Index("ix_chat_messages_session_history",
+              "session_id", "is_deleted", "is_active", "id"),
+    )
+
     def __repr__(self):
         return f"{self.session_id}"
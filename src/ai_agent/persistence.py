@@ -0,0 +1,248 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+
+from configs.logger import logger
+from configs.database import AsyncSessionLocal
+from src.metrics import metrics
+from src.ai_agent.models import ChatSession, ChatMessage, FAILED
+from src.ai_agent.schemas import ChatGetResponse
+from src.ai_agent.search import index_message
+from src.ai_agent.cache import history_cache
+from src.ai_agent.utils import to_history_turns
+
+load_dotenv()
+# Write-behind of streamed turns: rows per transaction, turns held in memory before streams wait for the writer,
+# retries of a failed batch, how long reads wait for a session's pending turns & the flush budget on shutdown
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", 32))
+PERSIST_MAX_PENDING = int(os.getenv("PERSIST_MAX_PENDING", 1000))
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", 3))
+PERSIST_READ_WAIT_SECONDS = float(os.getenv("PERSIST_READ_WAIT_SECONDS", 5))
+PERSIST_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("PERSIST_SHUTDOWN_TIMEOUT_SECONDS", 10))
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+@dataclass
+class PendingTurn:
+    """A streamed turn that was answered but not written yet."""
+    message_id: int
+    session_id: str
+    human_message: str
+    ai_message: str
+    date_time: datetime
+    duration: Optional[float] = None
+    resubmit: bool = False  # Replaces an existing message instead of filling a reserved row
+    generation_status: Optional[str] = None  # Final status of the job that generated it, if any
+    written: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+    def to_response(self) -> dict:
+        """The message as it will read back once written, for the `done` event."""
+        return ChatGetResponse(
+            id=self.message_id,
+            session_id=self.session_id,
+            human_message=self.human_message,
+            ai_message=self.ai_message,
+            date_time=self.date_time,
+            duration=self.duration,
+            positive_feedback=False,
+            negative_feedback=False
+        ).model_dump(mode="json")
+
+
+class TurnWriter:
+    """
+    Write-behind persistence of streamed turns.
+    A new turn gets its message id up front from a hidden placeholder row (see `reserve`), so the stream
+    can finish with the final message right away. A single background writer then stores queued turns in
+    batches, one transaction each, with retries. Reads of a session wait for its pending turns first.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = PERSIST_BATCH_SIZE,
+        max_pending: int = PERSIST_MAX_PENDING,
+        max_retries: int = PERSIST_MAX_RETRIES,
+    ):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[int, PendingTurn] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def reserve(
+        self, session_id: str, human_message: str, date_time: datetime, generation_status: Optional[str] = None
+    ) -> int:
+        """Insert an inactive placeholder for a new turn and return its id."""
+        async with AsyncSessionLocal() as db:
+            message = ChatMessage(
+                session_id=session_id,
+                human_message=human_message,
+                date_time=date_time,
+                generation_status=generation_status,
+                is_active=False  # Hidden from history & listings until the turn is written
+            )
+            db.add(message)
+            await db.commit()
+            return message.id
+
+    async def submit(self, turn: PendingTurn):
+        """Queue a turn for writing. Waits only when `max_pending` turns are already queued."""
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+        self._pending[turn.message_id] = turn
+        if self._queue.full():
+            metrics.inc("agent.persistence.backpressure")
+        await self._queue.put(turn)
+        metrics.set_gauge("agent.persistence.pending", len(self._pending))
+
+    async def wait_for_session(self, session_id: str, timeout: float = PERSIST_READ_WAIT_SECONDS):
+        """Wait until the session's queued turns are written, so a read sees them."""
+        await self._wait([turn.written for turn in self._pending.values() if turn.session_id == session_id], timeout)
+
+    async def wait_for_message(self, message_id: int, timeout: float = PERSIST_READ_WAIT_SECONDS):
+        turn = self._pending.get(message_id)
+        await self._wait([turn.written] if turn else [], timeout)
+
+    async def _wait(self, futures: List[asyncio.Future], timeout: float):
+        if not futures:
+            return
+        _, not_done = await asyncio.wait(futures, timeout=timeout)
+        if not_done:
+            logger.warning(f"Read went ahead with {len(not_done)} turns still queued for writing")
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Whatever queued up during the previous write goes into the same transaction
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._write(batch)
+            finally:
+                for turn in batch:
+                    self._pending.pop(turn.message_id, None)
+                    if not turn.written.done():
+                        turn.written.set_result(None)
+                    self._queue.task_done()
+                metrics.set_gauge("agent.persistence.pending", len(self._pending))
+
+    async def _write(self, batch: List[PendingTurn]):
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._store(batch)
+                metrics.inc("agent.persistence.batches")
+                metrics.observe("agent.persistence.batch_size", len(batch))
+                metrics.observe("agent.persistence.latency_ms",
+                                (time.perf_counter() - start) * 1000)
+                return
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} chat turns (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries:
+                    metrics.inc("agent.persistence.retries")
+                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+        if len(batch) > 1:
+            # Keep one bad turn from taking the rest of the batch down with it
+            for turn in batch:
+                try:
+                    await self._store([turn])
+                    continue
+                except Exception as e:
+                    logger.error(f"Error writing chat turn {turn.message_id}: {e}")
+                await self._drop(turn)
+            return
+        await self._drop(batch[0])
+
+    async def _drop(self, turn: PendingTurn):
+        # The client already got the message id in `done`; let a poll of it show the answer was lost
+        metrics.inc("agent.persistence.dropped")
+        await self.set_status(turn.message_id, FAILED)
+
+    async def _store(self, batch: List[PendingTurn]):
+        async with AsyncSessionLocal() as db:
+            messages = {message.id: message for message in (await db.scalars(select(ChatMessage).where(
+                ChatMessage.id.in_([turn.message_id for turn in batch])
+            ))).all()}
+            stored = []
+            for turn in batch:
+                message = messages.get(turn.message_id)
+                if not message or message.is_deleted:
+                    continue  # The session was deleted meanwhile
+                message.human_message = turn.human_message
+                message.ai_message = turn.ai_message
+                message.date_time = turn.date_time
+                message.duration = turn.duration
+                message.is_active = True
+                if turn.generation_status:
+                    message.generation_status = turn.generation_status
+                if turn.resubmit:
+                    message.positive_feedback = False
+                    message.negative_feedback = False
+                await index_message(db, message)
+                stored.append((turn, message))
+
+            # `updated_at` versions the sessions' history caches: move it with the turns, so a worker
+            # that read a session before its turn landed here reloads it rather than caching it without
+            session_ids = {turn.session_id for turn, _ in stored}
+            previous_versions = {}
+            version = datetime.now(tz=timezone.utc)
+            if session_ids:
+                previous_versions = dict((await db.execute(
+                    select(ChatSession.session_id, ChatSession.updated_at)
+                    .where(ChatSession.session_id.in_(session_ids))
+                    .with_for_update()
+                )).all())
+                await db.execute(
+                    update(ChatSession)
+                    .where(ChatSession.session_id.in_(session_ids))
+                    .values(updated_at=version)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+
+        # Keep this worker's hot copy of the sessions in step with the DB
+        for turn, message in stored:
+            if turn.resubmit:
+                history_cache.invalidate(turn.session_id)
+            else:
+                history_cache.append(turn.session_id, *to_history_turns([message]))
+        for session_id, previous_version in previous_versions.items():
+            history_cache.touch(session_id, version, previous_version)
+
+    async def set_status(self, message_id: int, generation_status: str):
+        """Record how the job generating a message ended, when it did not produce a turn to write."""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(ChatMessage)
+                    .where(ChatMessage.id == message_id)
+                    .values(generation_status=generation_status)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error saving status {generation_status} of message {message_id}: {e}")
+
+    async def stop(self, timeout: float = PERSIST_SHUTDOWN_TIMEOUT_SECONDS):
+        """Write out queued turns on shutdown."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Shutting down with {len(self._pending)} chat turns not written")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+turn_writer = TurnWriter()
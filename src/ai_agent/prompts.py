@@ -0,0 +1,106 @@
+import os
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from pydantic_ai.messages import SystemPromptPart
+from pydantic_ai.usage import Usage
+
+from src.metrics import metrics
+
+load_dotenv()
+# Version of the chat system prompt to send (the newest registered one if unset)
+CHAT_PROMPT_VERSION = os.getenv("CHAT_PROMPT_VERSION") or None
+
+
+class PromptTemplate:
+    """
+    A versioned system prompt split in two parts:
+    - `static`: the instructions, identical for every request, so the provider can cache them as a prefix,
+    - `dynamic`: a short trailing part with the per-request fields (user's name, date), filled by `render`.
+    The static part is built once; nothing per-request may go into it, or every request misses the cache.
+    """
+
+    def __init__(self, name: str, version: str, static: str, dynamic: str = ""):
+        self.name = name
+        self.version = version
+        self.static = static
+        self.dynamic = dynamic
+        self.static_part = SystemPromptPart(content=static)
+        # Identifies the prompt independently of the per-request fields, e.g. for sharing answers
+        self.fingerprint = f"{name}@{version}:{hashlib.sha1((static + dynamic).encode()).hexdigest()[:12]}"
+
+    def render(self, user_name: str, now: Optional[datetime] = None) -> List[SystemPromptPart]:
+        """
+        System prompt parts for one request.
+        Args:
+            user_name (str): The user's name.
+            now (datetime): Current time, for the date fields.
+        Returns:
+            List[SystemPromptPart]: The shared static part, then the per-request part if the template has one.
+        """
+        if not self.dynamic:
+            return [self.static_part]
+        now = now or datetime.now()
+        return [self.static_part, _dynamic_part(self, user_name, now.strftime("%Y-%m-%d"), now.strftime("%A"))]
+
+
+@lru_cache(maxsize=1024)
+def _dynamic_part(template: PromptTemplate, user_name: str, date: str, weekday: str) -> SystemPromptPart:
+    # The same user asks many times a day; reuse the part instead of formatting it on every call
+    return SystemPromptPart(content=template.dynamic.format(user_name=user_name, date=date, weekday=weekday))
+
+
+class PromptRegistry:
+    """Prompt templates by name & version. Registering a new version leaves the old ones selectable."""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        versions = self._templates.setdefault(template.name, {})
+        if template.version in versions:
+            raise ValueError(f"Prompt {template.name} version {template.version} is already registered")
+        versions[template.version] = template
+        return template
+
+    def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
+        """The given version of a prompt, or its latest registered one."""
+        versions = self._templates[name]
+        if version is None:
+            return list(versions.values())[-1]
+        if version not in versions:
+            raise KeyError(f"Unknown version {version} of prompt {name}, known: {', '.join(versions)}")
+        return versions[version]
+
+
+def record_usage(usage: Usage):
+    """Count prompt tokens & the part of them the provider served from its prompt cache."""
+    if not usage.request_tokens:
+        return
+    cached_tokens = (usage.details or {}).get("cached_content_tokens", 0)
+    metrics.inc("agent.prompt.request_tokens", usage.request_tokens)
+    metrics.inc("agent.prompt.cached_tokens", cached_tokens)
+    metrics.inc("agent.prompt.uncached_tokens", usage.request_tokens - cached_tokens)
+    metrics.observe("agent.prompt.cached_share", cached_tokens / usage.request_tokens)
+
+
+prompts = PromptRegistry()
+
+prompts.register(PromptTemplate(
+    name="chat",
+    version="1",
+    static="""You are a helpful AI Assistant.
+
+    ## Important Instructions:
+    - ALWAYS address the user by name. The user's name is given below.
+    - Use the custom_knowledge_tool first for questions about our own products, services & documentation.
+    - Use the duckduckgo_search_tool to search the web if you need up to date information on something.
+    - Include the source of search results in markdown format like this: `Source: [Source 1](https://www.source1.com/news/abc), [Source 2](https://www.source2.com/news/abc), etc`, if you use the duckduckgo_search_tool.
+    """,
+    dynamic="User's name is {user_name}. Today's date is: {date} & today is {weekday}.",
+))
+
+chat_prompt = prompts.get("chat", CHAT_PROMPT_VERSION)
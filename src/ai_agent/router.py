@@ -0,0 +1,299 @@
+import os
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+
+from dotenv import load_dotenv
+from pydantic_ai.exceptions import FallbackExceptionGroup
+from pydantic_ai.messages import FinalResultEvent, ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.settings import ModelSettings, merge_model_settings
+
+from configs.logger import logger
+from src.metrics import metrics
+
+load_dotenv()
+# Hedge once the first token is later than this percentile of the primary's recent latencies
+MODEL_HEDGE_ENABLED = os.getenv(
+    "MODEL_HEDGE_ENABLED", "True").lower() in ("true", "1", "yes")
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", 95))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", 20))
+MODEL_HEDGE_DEFAULT_MS = float(os.getenv("MODEL_HEDGE_DEFAULT_MS", 3000))
+MODEL_HEDGE_MIN_MS = float(os.getenv("MODEL_HEDGE_MIN_MS", 300))
+MODEL_HEDGE_MAX_MS = float(os.getenv("MODEL_HEDGE_MAX_MS", 10000))
+
+_DONE = object()
+
+
+@dataclass
+class _Attempt:
+    """One model's stream, pumped by its own task so the loser can be cancelled cleanly."""
+    model: Model
+    started_at: float = field(default_factory=time.perf_counter)
+    first_event: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future())
+    events: asyncio.Queue = field(default_factory=asyncio.Queue)
+    response: Optional[StreamedResponse] = None
+    task: Optional[asyncio.Task] = None
+
+
+@dataclass
+class RelayedStreamedResponse(StreamedResponse):
+    """Re-emits the events of the winning attempt; the parts are built by the attempt's own response."""
+    attempt: _Attempt = None
+
+    async def _get_event_iterator(self):
+        while True:
+            event = await self.attempt.events.get()
+            if event is _DONE:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    def get(self) -> ModelResponse:
+        return self.attempt.response.get()
+
+    def usage(self):
+        return self.attempt.response.usage()
+
+    @property
+    def model_name(self) -> str:
+        return self.attempt.response.model_name
+
+    @property
+    def timestamp(self) -> datetime:
+        return self.attempt.response.timestamp
+
+
+class RoutedModel(Model):
+    """
+    Ordered list of models with hedging & failover:
+    - the first model gets the request; if its first token (or, without streaming, its answer)
+      is later than the p95 of its recent latencies, the next model is started as a hedge and
+      whichever answers first wins, the other is cancelled,
+    - a model that fails before answering is replaced by the next one in the list.
+    """
+
+    def __init__(self, *models: Model, hedge: bool = MODEL_HEDGE_ENABLED, max_hedges: int = 1):
+        super().__init__()
+        self.models: List[Model] = list(models)
+        self.hedge = hedge
+        self.max_hedges = max_hedges
+
+    @property
+    def model_name(self) -> str:
+        return f"router:{','.join(model.model_name for model in self.models)}"
+
+    @property
+    def system(self) -> str:
+        return self.models[0].system
+
+    @property
+    def base_url(self) -> Optional[str]:
+        return self.models[0].base_url
+
+    def hedge_delay(self, model: Model, kind: str) -> float:
+        """Seconds to wait for `model` before hedging, from its recent latency percentile."""
+        name = f"agent.model.{model.model_name}.{kind}"
+        if metrics.sample_count(name) < MODEL_HEDGE_MIN_SAMPLES:
+            delay_ms = MODEL_HEDGE_DEFAULT_MS
+        else:
+            delay_ms = metrics.percentile(name, MODEL_HEDGE_PERCENTILE)
+        return min(MODEL_HEDGE_MAX_MS, max(MODEL_HEDGE_MIN_MS, delay_ms)) / 1000
+
+    def _can_hedge(self, started: int, hedges: int) -> bool:
+        return self.hedge and hedges < self.max_hedges and started < len(self.models)
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        running = {}  # task -> (model, started_at)
+        exceptions: List[Exception] = []
+        started = hedges = 0
+
+        def start(model: Model):
+            task = asyncio.create_task(model.request(
+                messages,
+                merge_model_settings(model.settings, model_settings),
+                model.customize_request_parameters(model_request_parameters),
+            ))
+            running[task] = (model, time.perf_counter())
+
+        start(self.models[0])
+        started = 1
+        try:
+            while running:
+                primary = next(iter(running.values()))[0]
+                timeout = self.hedge_delay(primary, "latency_ms") \
+                    if self._can_hedge(started, hedges) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.inc("agent.model.hedges")
+                    logger.warning(
+                        f"{primary.model_name} slow to answer, hedging with {self.models[started].model_name}")
+                    start(self.models[started])
+                    started += 1
+                    hedges += 1
+                    continue
+                for task in done:
+                    model, started_at = running.pop(task)
+                    if task.exception() is None:
+                        metrics.observe(f"agent.model.{model.model_name}.latency_ms",
+                                        (time.perf_counter() - started_at) * 1000)
+                        if model is not self.models[0]:
+                            metrics.inc(f"agent.model.{model.model_name}.wins")
+                        return task.result()
+                    exceptions.append(task.exception())
+                    metrics.inc(f"agent.model.{model.model_name}.errors")
+                    logger.error(f"Model {model.model_name} failed: {task.exception()}")
+                if not running and started < len(self.models):
+                    metrics.inc("agent.model.failovers")
+                    start(self.models[started])
+                    started += 1
+            raise FallbackExceptionGroup("All models of the router failed", exceptions)
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _pump(self, attempt: _Attempt, messages, model_settings, model_request_parameters, run_context):
+        model = attempt.model
+        try:
+            async with model.request_stream(
+                messages,
+                merge_model_settings(model.settings, model_settings),
+                model.customize_request_parameters(model_request_parameters),
+                run_context,
+            ) as response:
+                attempt.response = response
+                async for event in response:
+                    if isinstance(event, FinalResultEvent):
+                        continue  # Re-derived by the relaying response
+                    if not attempt.first_event.done():
+                        metrics.observe(f"agent.model.{model.model_name}.ttft_ms",
+                                        (time.perf_counter() - attempt.started_at) * 1000)
+                        attempt.first_event.set_result(True)
+                    attempt.events.put_nowait(event)
+            if not attempt.first_event.done():
+                attempt.first_event.set_result(True)  # Empty answer
+            attempt.events.put_nowait(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc(f"agent.model.{model.model_name}.errors")
+            if not attempt.first_event.done():
+                attempt.first_event.set_exception(e)
+            else:
+                attempt.events.put_nowait(e)
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+        run_context: Any = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        attempts: List[_Attempt] = []  # Still running, in start order
+        exceptions: List[Exception] = []
+        started = hedges = 0
+
+        def start(model: Model):
+            attempt = _Attempt(model=model)
+            attempt.task = asyncio.create_task(self._pump(
+                attempt, messages, model_settings, model_request_parameters, run_context))
+            attempts.append(attempt)
+
+        start(self.models[0])
+        started = 1
+        try:
+            winner = None
+            while winner is None:
+                primary = attempts[0].model
+                timeout = self.hedge_delay(primary, "ttft_ms") \
+                    if self._can_hedge(started, hedges) else None
+                waiting = {attempt.first_event: attempt for attempt in attempts}
+                done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.inc("agent.model.hedges")
+                    logger.warning(
+                        f"{primary.model_name} slow to first token, hedging with {self.models[started].model_name}")
+                    start(self.models[started])
+                    started += 1
+                    hedges += 1
+                    continue
+                for future in done:
+                    attempt = waiting[future]
+                    if future.exception() is None:
+                        winner = winner or attempt
+                    else:
+                        exceptions.append(future.exception())
+                        attempts.remove(attempt)
+                        logger.error(
+                            f"Model {attempt.model.model_name} failed: {future.exception()}")
+                if winner is None and not attempts:
+                    if started == len(self.models):
+                        raise FallbackExceptionGroup("All models of the router failed", exceptions)
+                    metrics.inc("agent.model.failovers")
+                    start(self.models[started])
+                    started += 1
+
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.task.cancel()
+            if winner.model is not self.models[0]:
+                metrics.inc(f"agent.model.{winner.model.model_name}.wins")
+            yield RelayedStreamedResponse(model_request_parameters=model_request_parameters, attempt=winner)
+        finally:
+            for attempt in attempts:
+                attempt.task.cancel()
+
+
+def fake_model(
+    name: str,
+    first_token_ms: float = 200,
+    slow_rate: float = 0.0,
+    slow_ms: float = 5000,
+    error_rate: float = 0.0,
+    text: str = "This is a canned answer from a local fake model.",
+    seed: Optional[int] = None,
+) -> FunctionModel:
+    """
+    Local stand-in for a provider model, for exercising the router without network calls.
+    Args:
+        name (str): Model name reported in responses & metrics.
+        first_token_ms (float): Usual delay before the first token.
+        slow_rate (float): Share of requests that take `slow_ms` instead (the tail).
+        slow_ms (float): First-token delay of the slow requests.
+        error_rate (float): Share of requests that fail before answering.
+        text (str): The answer, streamed word by word.
+        seed (int): Seed for reproducible runs.
+    Returns:
+        FunctionModel: A pydantic-ai model supporting `request` and `request_stream`.
+    """
+    rng = random.Random(seed)
+
+    async def delay():
+        slow = rng.random() < slow_rate
+        await asyncio.sleep((slow_ms if slow else first_token_ms) / 1000)
+        if rng.random() < error_rate:
+            raise RuntimeError(f"{name}: simulated provider error")
+
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await delay()
+        return ModelResponse(parts=[TextPart(content=text)], model_name=name)
+
+    async def stream(messages: List[ModelMessage], info: AgentInfo):
+        await delay()
+        for word in text.split(" "):
+            yield word + " "
+
+    return FunctionModel(respond, stream_function=stream, model_name=name)
@@ -1,14 +1,18 @@
 import os
+import asyncio
+from typing import Optional
 from dotenv import load_dotenv
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import StreamingResponse
 
 from configs.logger import logger
-from configs.database import get_db
+from configs.database import get_async_db
 from src.helpers import ResponseHelper
+from src.metrics import metrics
 from src.auth.dependencies import get_current_user
 
 from src.auth.models import User
@@ -19,20 +23,29 @@ from src.ai_agent.schemas import (
     ChatGetResponse,
     ChatResubmitRequest,
     EditTitleRequest,
+    ChatJobResponse,
 )
 
 from src.ai_agent.utils import (
     AgentDeps,
     fetch_conversation_history,
+    load_conversation_history,
     save_conversation_history,
+    to_history_turns,
     get_new_session
 )
-from src.ai_agent.core import execute_agent, execute_metadata_agent
+from src.ai_agent.search import index_message, index_session_title
+from src.ai_agent.cache import history_cache
+from src.ai_agent.persistence import turn_writer
+from src.ai_agent.jobs import Job, job_runner, effective_status, COMPLETED, FAILED
+from src.ai_agent.core import execute_agent, schedule_session_summary, start_retrieval, title_generator
 
 load_dotenv()
 QUADSEARCH_BASE_URL = os.getenv("QUADSEARCH_BASE_URL")
 QUADSEARCH_API_KEY = os.getenv("QUADSEARCH_API_KEY")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+# How long /chat/title waits on a title that is still being generated
+TITLE_WAIT_SECONDS = float(os.getenv("TITLE_WAIT_SECONDS", 10))
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 response = ResponseHelper()
@@ -42,48 +55,62 @@ response = ResponseHelper()
 async def invoke_agent(
     data: ChatInvokeRequest,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
+    chat_session = None
     if not data.session_id:
-        session_id = get_new_session(db=db, user=user)
+        session_id = await get_new_session(db=db, user=user)
+        # The title only needs the first message, so it is generated alongside the answer
+        title_generator.request(session_id, data.query)
     else:
         session_id = data.session_id
-        chat_session = ChatSession.get_active(db).filter(
+        chat_session = await db.scalar(ChatSession.select_active().where(
             ChatSession.session_id == session_id,
             ChatSession.user_id == user.id
-        ).first()
+        ))
         if not chat_session:
             return response.error_response(404, "Session not found")
+        # The bump below moves updated_at; the history cache is keyed on the value before it
+        previous_version = chat_session.updated_at
         chat_session.date_time = datetime.now(tz=timezone.utc)
         db.add(chat_session)
-        db.commit()
+        await db.commit()
 
     user_message = data.query
     start_time = datetime.now(tz=timezone.utc)
-    history = await fetch_conversation_history(session_id=session_id, db=db)
-
     agent_deps = AgentDeps(
         quadsearch_base_url=QUADSEARCH_BASE_URL,
         quadsearch_api_key=QUADSEARCH_API_KEY,
         collection_name=COLLECTION_NAME
     )
+    retrieval = start_retrieval(user_message, agent_deps, data.prefetch)
+    summary = chat_session.summary if chat_session else None
+    history = []
+    if chat_session:
+        # The previous answer may still be queued for writing
+        await turn_writer.wait_for_session(session_id)
+        history = await load_conversation_history(
+            chat_session=chat_session,
+            previous_version=previous_version,
+            db=db
+        )
+        schedule_session_summary(session_id, len(history))
 
-    if data.stream:
-        return StreamingResponse(
-            await execute_agent(
-                user=user,
-                user_message=user_message,
-                messages=history,
-                agent_deps=agent_deps,
-                stream=True,
-                sse_mode=True,
-                session_id=session_id,
-                db=db,
-                start_time=start_time
-            ),
-            media_type="text/event-stream"
+    if data.stream or data.background:
+        job = await execute_agent(
+            user=user,
+            user_message=user_message,
+            messages=history,
+            agent_deps=agent_deps,
+            stream=True,
+            sse_mode=True,
+            session_id=session_id,
+            start_time=start_time,
+            summary=summary,
+            retrieval=retrieval
         )
+        return job_response(job, request, data.background)
 
     else:
         agent_response = await execute_agent(
@@ -91,7 +118,10 @@ async def invoke_agent(
             user_message=user_message,
             messages=history,
             agent_deps=agent_deps,
-            stream=False
+            stream=False,
+            session_id=session_id,
+            summary=summary,
+            retrieval=retrieval
         )
         chat_message = await save_conversation_history(
             session_id=session_id,
@@ -106,11 +136,97 @@ async def invoke_agent(
         return response.success_response(200, "success", data=resp_data)
 
 
+def job_response(job: Job, request: Request, background: bool):
+    """Stream a job's answer, or hand out where to stream or poll it from."""
+    if not background:
+        return StreamingResponse(job.generation.subscribe(), media_type="text/event-stream")
+    resp_data = ChatJobResponse(
+        job_id=job.job_id,
+        session_id=job.session_id,
+        status=job.status,
+        stream_url=request.app.url_path_for("stream_job", job_id=str(job.job_id)),
+        status_url=request.app.url_path_for("get_job", job_id=str(job.job_id))
+    )
+    return response.success_response(202, "Generation started", data=resp_data)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user),
+):
+    job = job_runner.get(job_id)
+    if job and job.user_id != user.id:
+        job = None
+    if job and not job.finished:
+        return response.success_response(200, "success", data=ChatJobResponse(
+            job_id=job_id, session_id=job.session_id, status=job.status))
+
+    # Finished here, or run by another worker: the message row has the answer & the persisted status
+    await turn_writer.wait_for_message(job_id)
+    chat = await db.scalar(select(ChatMessage).join(ChatSession).where(
+        ChatMessage.id == job_id,
+        ChatMessage.is_deleted == False,
+        ChatSession.user_id == user.id
+    ))
+    if not chat:
+        return response.error_response(404, "Job not found")
+    # A finished job's turn may still have failed to be written
+    status = job.status if job and chat.generation_status != FAILED else \
+        effective_status(chat.generation_status, chat.updated_at)
+    resp_data = ChatJobResponse(
+        job_id=job_id,
+        session_id=chat.session_id,
+        status=status,
+        error=job.error if job else None,
+        message=ChatGetResponse.model_validate(chat) if status == COMPLETED and chat.is_active else None
+    )
+    return response.success_response(200, "success", data=resp_data)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(
+    job_id: int,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    user: User = Depends(get_current_user),
+):
+    # Attach to a job's answer, e.g. after a dropped connection; the Last-Event-ID header wins over the query param
+    job = job_runner.get(job_id)
+    if not job or job.user_id != user.id:
+        return response.error_response(404, "Stream not found or expired")
+    header = request.headers.get("last-event-id")
+    try:
+        after = int(header) if header else (last_event_id or 0)
+    except ValueError:
+        return response.error_response(400, "Invalid Last-Event-ID")
+    if not job.generation.can_resume(after):
+        return response.error_response(410, "Stream can no longer be resumed from this event")
+    metrics.inc("agent.stream.resumes")
+    return StreamingResponse(job.generation.subscribe(after), media_type="text/event-stream")
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(
+    job_id: int,
+    request: Request,
+    user: User = Depends(get_current_user),
+):
+    job = job_runner.get(job_id)
+    if not job or job.user_id != user.id:
+        return response.error_response(404, "Job not found or not running")
+    if not job_runner.cancel(job):
+        return response.error_response(409, "Job already finished")
+    return response.success_response(200, "Job cancelled")
+
+
 @router.post("/title")
 async def generate_title(
     request: Request,
     data: ChatTitleRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     if not data.user_message:
@@ -119,10 +235,10 @@ async def generate_title(
         return response.error_response(400, "Session ID is required")
 
     # Check if session exists
-    session = ChatSession.get_active(db).filter(
+    session = await db.scalar(ChatSession.select_active().where(
         ChatSession.session_id == data.session_id,
         ChatSession.user_id == user.id
-    ).first()
+    ))
     if not session:
         return response.error_response(404, "Session not found")
 
@@ -131,16 +247,20 @@ async def generate_title(
             "title": session.title
         })
 
-    title_response = await execute_metadata_agent(user_message=data.user_message)
-    logger.info(f"Title agent response: {title_response}")
-
-    # Store the title in the session
-    session.title = title_response
-    db.add(session)
-    db.commit()
+    # Join the job started with the first message, or start one for older sessions
+    job = title_generator.request(session.session_id, data.user_message)
+    try:
+        title = await asyncio.wait_for(asyncio.shield(job), TITLE_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        return response.success_response(202, "Title is being generated", data={
+            "title": None
+        })
+    if not title:
+        return response.error_response(500, "Failed to generate title")
+    logger.info(f"Title for session {session.session_id}: {title}")
 
     return response.success_response(200, "Success", data={
-        "title": title_response
+        "title": title
     })
 
 
@@ -148,22 +268,23 @@ async def generate_title(
 async def edit_title(
     request: Request,
     data: EditTitleRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     try:
-        session = ChatSession.get_active(db).filter(
+        session = await db.scalar(ChatSession.select_active().where(
             ChatSession.session_id == data.session_id,
             ChatSession.user_id == user.id
-        ).first()
+        ))
         if not session:
             return response.error_response(404, "Session not found")
 
         session.title = data.title
-        db.commit()
+        await index_session_title(db, session)
+        await db.commit()
     except Exception as e:
         logger.error(f"Error editing title for session {data.session_id}: {e}")
-        db.rollback()
+        await db.rollback()
         return response.error_response(500, "Failed to edit title")
 
     return response.success_response(200, "Title edited successfully")
@@ -173,65 +294,83 @@ async def edit_title(
 async def resubmit(
     data: ChatResubmitRequest,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
-    chat = ChatMessage.get_active(db).join(ChatSession).filter(
+    # The message being resubmitted may be the one still queued for writing
+    await turn_writer.wait_for_session(data.session_id)
+    chat = await db.scalar(ChatMessage.select_active().join(ChatSession).where(
         ChatMessage.id == data.chat_id,
         ChatSession.user_id == user.id
-    ).first()
+    ))
     if not chat:
         return response.error_response(404, "Chat not found or you don't have access")
 
-    chat_session = ChatSession.get_active(db).filter(
+    chat_session = await db.scalar(ChatSession.select_active().where(
         ChatSession.session_id == data.session_id,
         ChatSession.user_id == user.id
-    ).first()
+    ))
     if not chat_session:
         return response.error_response(404, "Session not found or you don't have access")
     chat_session.date_time = datetime.now(tz=timezone.utc)
+    if chat_session.summary_until and chat.id <= chat_session.summary_until:
+        # The summary covers turns that are about to be replaced
+        chat_session.summary = None
+        chat_session.summary_until = None
     db.add(chat_session)
-    db.commit()
+    await db.commit()
+    history_cache.invalidate(data.session_id)
 
     user_message = data.query
     start_time = datetime.now(tz=timezone.utc)
-
-    # soft delete all messages after the current chat message for the session
-    ChatMessage.get_active(db).filter(
-        ChatMessage.session_id == chat.session_id,
-        ChatMessage.id > chat.id
-    ).update({"is_active": False, "is_deleted": True}, synchronize_session=False)
-    db.commit()
-
-    # Fetch conversation history
-    history = await fetch_conversation_history(session_id=data.session_id, fetch_until=chat.id, db=db)
-
-    # Create agent dependencies
     agent_deps = AgentDeps(
         quadsearch_base_url=QUADSEARCH_BASE_URL,
         quadsearch_api_key=QUADSEARCH_API_KEY,
         collection_name=COLLECTION_NAME
     )
+    retrieval = start_retrieval(user_message, agent_deps, data.prefetch)
+
+    # soft delete all messages after the current chat message for the session
+    await db.execute(
+        update(ChatMessage)
+        .where(
+            # Inactive rows too: placeholders of turns still being written, which the writer then skips
+            ChatMessage.is_deleted == False,
+            ChatMessage.session_id == chat.session_id,
+            ChatMessage.id > chat.id
+        )
+        .values(is_active=False, is_deleted=True)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
 
-    if data.stream:
-        return StreamingResponse(
-            await execute_agent(
-                user=user,
-                user_message=user_message,
-                messages=history,
-                agent_deps=agent_deps,
-                stream=True,
-                sse_mode=True,
-                session_id=data.session_id,
-                chat=chat,
-                db=db,
-                start_time=start_time
-            ),
-            media_type="text/event-stream"
+    # Fetch conversation history
+    history = to_history_turns(await fetch_conversation_history(
+        session_id=data.session_id,
+        fetch_until=chat.id,
+        fetch_after=chat_session.summary_until,
+        db=db
+    ))
+
+    if data.stream or data.background:
+        job = await execute_agent(
+            user=user,
+            user_message=user_message,
+            messages=history,
+            agent_deps=agent_deps,
+            stream=True,
+            sse_mode=True,
+            session_id=data.session_id,
+            chat=chat,
+            start_time=start_time,
+            summary=chat_session.summary,
+            retrieval=retrieval
         )
+        return job_response(job, request, data.background)
     else:
         agent_response = await execute_agent(
-            user=user, user_message=user_message, messages=history, agent_deps=agent_deps)
+            user=user, user_message=user_message, messages=history, agent_deps=agent_deps,
+            session_id=data.session_id, chat=chat, summary=chat_session.summary, retrieval=retrieval)
         logger.info(f"Agent response: {agent_response}")
 
         chat.human_message = user_message
@@ -244,8 +383,10 @@ async def resubmit(
 
         # Save the updated chat message
         db.add(chat)
-        db.commit()
-        db.refresh(chat)
+        await index_message(db, chat)
+        await db.commit()
+        await db.refresh(chat)
+        history_cache.invalidate(data.session_id)
 
         logger.info(
             f"Chat history saved for session {data.session_id} and user {user.id}")
@@ -1,8 +1,12 @@
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Request, Depends
+from typing import Optional
+from datetime import datetime
+from urllib.parse import urlencode
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Request, Depends, Query
 
 from configs.logger import logger
-from configs.database import get_db
+from configs.database import get_async_db
 from src.helpers import ResponseHelper
 from src.auth.dependencies import get_current_user
 
@@ -12,9 +16,17 @@ from src.ai_agent.schemas import (
     SessionGetResponse,
     SessionListResponse,
     ChatGetResponse,
+    ChatListResponse,
     Pagination,
+    CursorPagination,
+    SearchResultResponse,
+    SearchListResponse,
     ChatFeedbackRequest,
 )
+from src.ai_agent.search import search_chats
+from src.ai_agent.cache import history_cache
+from src.ai_agent.persistence import turn_writer
+from src.ai_agent.utils import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 response = ResponseHelper()
@@ -23,27 +35,72 @@ response = ResponseHelper()
 @router.get("")
 async def get_sessions(
     request: Request,
-    page: int = 1,
-    limit: int = 20,
-    db: Session = Depends(get_db),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    pagination: str = "offset",
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
-    query = ChatSession.get_active(db).filter(
+    query = ChatSession.select_active().where(
         ChatSession.user_id == user.id
     )
 
+    # Keyset pagination on (date_time, id): no count or deep offset scan per page
+    if cursor is not None or pagination == "cursor":
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+                last_date_time = datetime.fromisoformat(position["d"])
+                last_id = int(position["i"])
+            except (ValueError, KeyError, TypeError):
+                return response.error_response(400, "Invalid cursor")
+            page_query = query.where(or_(
+                ChatSession.date_time < last_date_time,
+                and_(ChatSession.date_time == last_date_time,
+                     ChatSession.id < last_id)
+            ))
+        else:
+            page_query = query
+
+        rows = (await db.scalars(
+            page_query.order_by(ChatSession.date_time.desc(), ChatSession.id.desc())
+            .limit(limit + 1)
+        )).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = encode_cursor(
+            {"d": rows[-1].date_time.isoformat(), "i": rows[-1].id}) if has_more else None
+        total_records = await db.scalar(
+            select(func.count()).select_from(query.subquery())) if include_total else None
+
+        base_url = str(request.url.path)
+        resp_data = SessionListResponse(
+            sessions=[SessionGetResponse.model_validate(chat) for chat in rows],
+            pagination=CursorPagination(
+                record_per_page=limit,
+                has_more=has_more,
+                next_cursor=next_cursor,
+                next_page_url=f"{base_url}?{urlencode({'cursor': next_cursor, 'limit': limit})}" if next_cursor else None,
+                total_records=total_records
+            )
+        )
+        return response.success_response(200, "success", data=resp_data)
+
     # Count total sessions
-    total_records = query.count()
+    total_records = await db.scalar(
+        select(func.count()).select_from(query.subquery()))
     total_pages = (total_records + limit - 1) // limit
     offset = (page - 1) * limit
 
     # Fetch paginated results
-    data_list = (
+    data_list = (await db.scalars(
         query.order_by(ChatSession.date_time.desc())
         .offset(offset)
         .limit(limit)
-        .all()
-    )
+    )).all()
 
     sessions = [SessionGetResponse.model_validate(chat) for chat in data_list]
 
@@ -71,16 +128,37 @@ async def get_sessions(
 async def search_sessions(
     request: Request,
     query: str,
-    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
-    search_query = f"%{query}%"
-    sessions = ChatSession.get_active(db).filter(
-        ChatSession.user_id == user.id,
-        ChatSession.title.ilike(search_query)
-    ).order_by(ChatSession.date_time.desc()).limit(20).all()
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return response.error_response(400, "Invalid cursor")
 
-    resp_data = [SessionGetResponse.model_validate(chat) for chat in sessions]
+    try:
+        results = await search_chats(
+            db, user_id=user.id, query=query, limit=limit + 1, after=after)
+    except (KeyError, TypeError):
+        return response.error_response(400, "Invalid cursor")
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    next_cursor = encode_cursor(results[-1]["_position"]) if has_more else None
+    base_url = str(request.url.path)
+    resp_data = SearchListResponse(
+        results=[SearchResultResponse.model_validate(result) for result in results],
+        pagination=CursorPagination(
+            record_per_page=limit,
+            has_more=has_more,
+            next_cursor=next_cursor,
+            next_page_url=f"{base_url}?{urlencode({'query': query, 'cursor': next_cursor, 'limit': limit})}" if next_cursor else None
+        )
+    )
 
     return response.success_response(200, "success", data=resp_data)
 
@@ -89,15 +167,40 @@ async def search_sessions(
 async def get_chats(
     session_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
-    chats = ChatMessage.get_active(db).filter(
-        ChatMessage.session_id == session_id).order_by(ChatMessage.created_at.asc()).all()
-    if not chats:
+    await turn_writer.wait_for_session(session_id)
+    # Pages walk backwards from the newest message; each page is returned in chronological order
+    query = ChatMessage.select_active().where(
+        ChatMessage.session_id == session_id)
+    if cursor:
+        try:
+            before_id = int(decode_cursor(cursor)["i"])
+        except (ValueError, KeyError, TypeError):
+            return response.error_response(400, "Invalid cursor")
+        query = query.where(ChatMessage.id < before_id)
+
+    rows = (await db.scalars(
+        query.order_by(ChatMessage.id.desc()).limit(limit + 1))).all()
+    if not rows and not cursor:
         return response.error_response(404, "No messages found for this session")
+    has_more = len(rows) > limit
+    chats = rows[:limit][::-1]
 
-    resp_data = [ChatGetResponse.model_validate(chat) for chat in chats]
+    next_cursor = encode_cursor({"i": chats[0].id}) if has_more else None
+    base_url = str(request.url.path)
+    resp_data = ChatListResponse(
+        chats=[ChatGetResponse.model_validate(chat) for chat in chats],
+        pagination=CursorPagination(
+            record_per_page=limit,
+            has_more=has_more,
+            next_cursor=next_cursor,
+            next_page_url=f"{base_url}?{urlencode({'session_id': session_id, 'cursor': next_cursor, 'limit': limit})}" if next_cursor else None
+        )
+    )
 
     return response.success_response(200, "success", data=resp_data)
 
@@ -106,27 +209,27 @@ async def get_chats(
 async def share_session(
     session_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     # Share chat history for the session
     try:
-        chat_history = ChatSession.get_active(db).filter(
+        chat_history = await db.scalar(ChatSession.select_active().where(
             ChatSession.session_id == session_id,
             ChatSession.user_id == user.id
-        ).first()
+        ))
 
         if not chat_history:
             return response.error_response(404, "Session not found")
 
         if not chat_history.shared_to_public:
             chat_history.shared_to_public = True
-            db.commit()
+            await db.commit()
         else:
             pass  # Already shared, no action needed
     except Exception as e:
         logger.error(f"Error sharing session {session_id}: {e}")
-        db.rollback()
+        await db.rollback()
         return response.error_response(500, "Failed to share session")
 
     return response.success_response(200, "Session shared successfully")
@@ -136,19 +239,20 @@ async def share_session(
 async def get_shared_session(
     session_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Get shared chat history for the session
-    chat_session = ChatSession.get_active(db).filter(
+    await turn_writer.wait_for_session(session_id)
+    chat_session = await db.scalar(ChatSession.select_active().where(
         ChatSession.session_id == session_id,
         ChatSession.shared_to_public == True
-    ).first()
+    ))
 
     if not chat_session:
         return response.error_response(404, "Session not found or you don't have access")
 
-    chats = ChatMessage.get_active(db).filter(
-        ChatMessage.session_id == session_id).order_by(ChatMessage.date_time.asc()).all()
+    chats = (await db.scalars(ChatMessage.select_active().where(
+        ChatMessage.session_id == session_id).order_by(ChatMessage.id.asc()))).all()
 
     resp_data = [ChatGetResponse.model_validate(chat) for chat in chats]
 
@@ -159,29 +263,32 @@ async def get_shared_session(
 async def delete_session(
     session_id: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     # Delete chat session and its messages
     try:
-        session = ChatSession.get_active(db).filter(
+        session = await db.scalar(ChatSession.select_active().where(
             ChatSession.session_id == session_id,
             ChatSession.user_id == user.id
-        ).first()
+        ))
         if not session:
             return response.error_response(404, "Session not found")
         session.is_deleted = True
         session.is_active = False
         db.add(session)
 
-        db.query(ChatMessage).filter(ChatMessage.session_id == session_id).update(
-            {"is_deleted": True, "is_active": False},
-            synchronize_session=False
+        await db.execute(
+            update(ChatMessage)
+            .where(ChatMessage.session_id == session_id)
+            .values(is_deleted=True, is_active=False)
+            .execution_options(synchronize_session=False)
         )
-        db.commit()
+        await db.commit()
+        history_cache.invalidate(session_id)
     except Exception as e:
         logger.error(f"Error deleting session {session_id}: {e}")
-        db.rollback()
+        await db.rollback()
         return response.error_response(500, "Failed to delete session")
 
     return response.success_response(200, "Session deleted successfully")
@@ -191,24 +298,25 @@ async def delete_session(
 async def submit_feedback(
     request: Request,
     data: ChatFeedbackRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     try:
-        chat = ChatMessage.get_active(db).join(ChatSession).filter(
+        await turn_writer.wait_for_message(data.id)
+        chat = await db.scalar(ChatMessage.select_active().join(ChatSession).where(
             ChatMessage.id == data.id,
             ChatSession.user_id == user.id
-        ).first()
+        ))
         if not chat:
             return response.error_response(404, "Chat not found or you don't have access")
 
         # Update chat feedback
         chat.positive_feedback = data.positive_feedback
         chat.negative_feedback = data.negative_feedback
-        db.commit()
+        await db.commit()
     except Exception as e:
         logger.error(f"Error submitting feedback for chat {data.id}: {e}")
-        db.rollback()
+        await db.rollback()
         return response.error_response(500, "Failed to submit feedback")
 
     return response.success_response(200, "Feedback submitted successfully")
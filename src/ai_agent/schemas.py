@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timezone
 from pydantic import BaseModel, Field, field_validator
 
@@ -12,6 +12,8 @@ class ChatInvokeRequest(BaseModel):
     session_id: str = Field(None, max_length=100)
     query: str = Field(..., max_length=500)
     stream: Optional[bool] = False
+    prefetch: Optional[bool] = None  # Speculative retrieval; None uses PREFETCH_RETRIEVAL
+    background: Optional[bool] = False  # Return a job to stream or poll instead of the answer
 
 
 class ChatResubmitRequest(BaseModel):
@@ -19,6 +21,8 @@ class ChatResubmitRequest(BaseModel):
     session_id: str = Field(..., max_length=100)
     query: str = Field(..., max_length=500)
     stream: Optional[bool] = False
+    prefetch: Optional[bool] = None
+    background: Optional[bool] = False
 
 
 class SessionGetResponse(BaseModel):
@@ -60,6 +64,16 @@ class ChatGetResponse(BaseModel):
         from_attributes = True
 
 
+class ChatJobResponse(BaseModel):
+    job_id: int  # Id of the message being answered
+    session_id: str
+    status: str  # running, completed, failed, cancelled or timeout
+    error: Optional[str] = None
+    message: Optional[ChatGetResponse] = None
+    stream_url: Optional[str] = None
+    status_url: Optional[str] = None
+
+
 class Pagination(BaseModel):
     current_page: int
     total_pages: int
@@ -69,19 +83,51 @@ class Pagination(BaseModel):
     next_page_url: Optional[str]
 
 
+class CursorPagination(BaseModel):
+    record_per_page: int
+    has_more: bool
+    next_cursor: Optional[str]
+    next_page_url: Optional[str]
+    total_records: Optional[int] = None
+
+
 class ChatListResponse(BaseModel):
     chats: List[ChatGetResponse]
-    pagination: Pagination
+    pagination: Union[Pagination, CursorPagination]
 
 
 class SessionListResponse(BaseModel):
     sessions: List[SessionGetResponse]
-    pagination: Pagination
+    pagination: Union[Pagination, CursorPagination]
 
     class Config:
         from_attributes = True
 
 
+class SearchResultResponse(BaseModel):
+    session_id: str
+    title: Optional[str] = None
+    match_type: str  # 'title' or 'message'
+    message_id: Optional[int] = None
+    snippet: str
+    score: float
+    date_time: datetime
+
+    @field_validator('date_time', mode='before')
+    @classmethod
+    def ensure_datetime_has_timezone(cls, v):
+        if isinstance(v, str):
+            v = datetime.fromisoformat(v)
+        if isinstance(v, datetime) and v.tzinfo is None:
+            return v.replace(tzinfo=timezone.utc)
+        return v
+
+
+class SearchListResponse(BaseModel):
+    results: List[SearchResultResponse]
+    pagination: CursorPagination
+
+
 class ChatFeedbackRequest(BaseModel):
     id: int
     positive_feedback: Optional[bool] = None
@@ -0,0 +1,231 @@
+import re
+import html
+from typing import List, Optional, Dict, Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from configs.logger import logger
+from configs.database import DB_TYPE
+from src.ai_agent.models import ChatSession, ChatMessage
+
+# Full-text search over session titles and messages.
+# - sqlite: FTS5 table `chat_search_index`, kept in sync by the index_* helpers below
+# - postgresql: generated `search_vector` tsvector columns with GIN indexes
+# - mysql: FULLTEXT indexes on the title & message columns
+# All of them are created by migration 9a4b1c7e3f62.
+
+SEARCH_TABLE = "chat_search_index"
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+# FTS5 marks matches with these, so the snippet can be escaped before the tags are added
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+SNIPPET_WORDS = 16
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _terms(query: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(query.lower())
+
+
+def highlight(content: str, terms: List[str], width: int = 160) -> str:
+    """Build a snippet around the first matching term and wrap every match in highlight tags."""
+    content = content or ""
+    if not terms:
+        return html.escape(content[:width])
+    pattern = re.compile("|".join(re.escape(term)
+                         for term in terms), re.IGNORECASE)
+    match = pattern.search(content)
+    start = max(0, match.start() - width // 3) if match else 0
+    window = content[start:start + width]
+    snippet = pattern.sub(
+        lambda m: f"{HIGHLIGHT_OPEN}{m.group(0)}{HIGHLIGHT_CLOSE}", html.escape(window))
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + width < len(content) else ""
+    return f"{prefix}{snippet}{suffix}"
+
+
+async def index_message(db: AsyncSession, message: ChatMessage):
+    """Add or refresh a message in the search index. Call before committing the message."""
+    if DB_TYPE != "sqlite":
+        return  # Maintained by the database
+    if message.id is None:
+        await db.flush()
+    content = f"{message.human_message or ''}\n{message.ai_message or ''}"
+    await _replace_entry(db, "message", message.id, message.session_id, content)
+
+
+async def index_session_title(db: AsyncSession, session: ChatSession):
+    """Add or refresh a session title in the search index. Call before committing the session."""
+    if DB_TYPE != "sqlite":
+        return  # Maintained by the database
+    if session.id is None:
+        await db.flush()
+    await _replace_entry(db, "title", session.id, session.session_id, session.title or "")
+
+
+async def _replace_entry(db: AsyncSession, kind: str, ref_id: int, session_id: str, content: str):
+    try:
+        await db.execute(
+            text(f"DELETE FROM {SEARCH_TABLE} WHERE kind = :kind AND ref_id = :ref_id"),
+            {"kind": kind, "ref_id": ref_id}
+        )
+        await db.execute(
+            text(f"INSERT INTO {SEARCH_TABLE} (kind, ref_id, session_id, content) "
+                 "VALUES (:kind, :ref_id, :session_id, :content)"),
+            {"kind": kind, "ref_id": ref_id,
+                "session_id": session_id, "content": content}
+        )
+    except Exception as e:
+        # Search must never block a chat write; the entry is rebuilt on the next update
+        logger.error(f"Error updating search index for {kind} {ref_id}: {e}")
+
+
+def _hits_sql() -> str:
+    """Per-dialect query yielding (kind, ref_id, session_id, title, date_time, score, content, snippet).
+    Only sqlite builds the snippet in SQL; the others are highlighted in Python after the page is cut."""
+    active_session = "s.user_id = :user_id AND s.is_active = :true AND s.is_deleted = :false"
+    active_message = "m.is_active = :true AND m.is_deleted = :false"
+
+    if DB_TYPE == "sqlite":
+        return f"""
+            SELECT f.kind AS kind, f.ref_id AS ref_id, f.session_id AS session_id,
+                   s.title AS title, s.date_time AS date_time,
+                   -bm25({SEARCH_TABLE}) AS score, f.content AS content,
+                   snippet({SEARCH_TABLE}, 3, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet
+            FROM {SEARCH_TABLE} f
+            JOIN chat_sessions s ON s.session_id = f.session_id
+            LEFT JOIN chat_messages m ON f.kind = 'message' AND m.id = f.ref_id
+            WHERE {SEARCH_TABLE} MATCH :match AND {active_session}
+              AND (f.kind = 'title' OR ({active_message}))
+        """
+
+    if DB_TYPE == "postgresql":
+        return f"""
+            SELECT 'title' AS kind, s.id AS ref_id, s.session_id AS session_id,
+                   s.title AS title, s.date_time AS date_time,
+                   ts_rank(s.search_vector, q) AS score, s.title AS content, NULL AS snippet
+            FROM chat_sessions s, websearch_to_tsquery('simple', :query) q
+            WHERE {active_session} AND s.search_vector @@ q
+            UNION ALL
+            SELECT 'message', m.id, m.session_id, s.title, s.date_time,
+                   ts_rank(m.search_vector, q),
+                   concat_ws(' ', m.human_message, m.ai_message), NULL
+            FROM chat_messages m
+            JOIN chat_sessions s ON s.session_id = m.session_id,
+                 websearch_to_tsquery('simple', :query) q
+            WHERE {active_session} AND {active_message} AND m.search_vector @@ q
+        """
+
+    # mysql
+    return f"""
+        SELECT 'title' AS kind, s.id AS ref_id, s.session_id AS session_id,
+               s.title AS title, s.date_time AS date_time,
+               MATCH (s.title) AGAINST (:query IN NATURAL LANGUAGE MODE) AS score,
+               s.title AS content, NULL AS snippet
+        FROM chat_sessions s
+        WHERE {active_session} AND MATCH (s.title) AGAINST (:query IN NATURAL LANGUAGE MODE)
+        UNION ALL
+        SELECT 'message', m.id, m.session_id, s.title, s.date_time,
+               MATCH (m.human_message, m.ai_message) AGAINST (:query IN NATURAL LANGUAGE MODE),
+               CONCAT_WS(' ', m.human_message, m.ai_message), NULL
+        FROM chat_messages m
+        JOIN chat_sessions s ON s.session_id = m.session_id
+        WHERE {active_session} AND {active_message}
+          AND MATCH (m.human_message, m.ai_message) AGAINST (:query IN NATURAL LANGUAGE MODE)
+    """
+
+
+async def search_chats(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    after: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ranked full-text search over a user's session titles and messages.
+    Args:
+        db (AsyncSession): Database session.
+        user_id (int): Owner of the sessions to search.
+        query (str): Raw search text from the user.
+        limit (int): Number of results to return.
+        after (dict): Keyset position {"score", "kind", "ref_id"} of the last result of the previous page.
+    Returns:
+        List[dict]: Results ordered by relevance, each with a highlighted snippet.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    params = {
+        "user_id": user_id,
+        "query": query,
+        # FTS5 syntax: every term must match, as a prefix
+        "match": " ".join(f'"{term}"*' for term in terms),
+        "true": True,
+        "false": False,
+        "limit": limit,
+    }
+    page_filter = ""
+    if after:
+        page_filter = ("WHERE score < :after_score OR (score = :after_score AND "
+                       "(kind > :after_kind OR (kind = :after_kind AND ref_id > :after_ref_id)))")
+        params.update(after_score=after["score"], after_kind=after["kind"],
+                      after_ref_id=after["ref_id"])
+
+    sql = f"""
+        WITH hits AS ({_hits_sql()})
+        SELECT kind, ref_id, session_id, title, date_time, score, content, snippet
+        FROM hits {page_filter}
+        ORDER BY score DESC, kind ASC, ref_id ASC
+        LIMIT :limit
+    """
+    try:
+        rows = (await db.execute(text(sql), params)).mappings().all()
+    except Exception as e:
+        logger.error(
+            f"Full-text search unavailable, falling back to title match: {e}")
+        await db.rollback()
+        return await _search_titles_fallback(db, user_id, query, terms, limit, after)
+
+    results = []
+    for row in rows:
+        snippet = row["snippet"]
+        if snippet:
+            snippet = html.escape(snippet).replace(
+                _MARK_START, HIGHLIGHT_OPEN).replace(_MARK_END, HIGHLIGHT_CLOSE)
+        else:
+            snippet = highlight(row["content"], terms)
+        results.append({
+            "session_id": row["session_id"],
+            "title": row["title"],
+            "match_type": row["kind"],
+            "message_id": row["ref_id"] if row["kind"] == "message" else None,
+            "snippet": snippet,
+            "score": float(row["score"] or 0),
+            "date_time": row["date_time"],
+            "_position": {"score": float(row["score"] or 0), "kind": row["kind"], "ref_id": row["ref_id"]},
+        })
+    return results
+
+
+async def _search_titles_fallback(db, user_id, query, terms, limit, after):
+    # Substring match on titles, used when the full-text index has not been migrated yet
+    offset = int(after.get("offset", 0)) if after else 0
+    sessions = (await db.scalars(ChatSession.select_active().where(
+        ChatSession.user_id == user_id,
+        ChatSession.title.ilike(f"%{query}%")
+    ).order_by(ChatSession.date_time.desc(), ChatSession.id.desc()).offset(offset).limit(limit))).all()
+    return [{
+        "session_id": session.session_id,
+        "title": session.title,
+        "match_type": "title",
+        "message_id": None,
+        "snippet": highlight(session.title, terms),
+        "score": 0.0,
+        "date_time": session.date_time,
+        "_position": {"offset": offset + index + 1},
+    } for index, session in enumerate(sessions)]
@@ -0,0 +1,80 @@
+import os
+import json
+import asyncio
+import itertools
+from collections import deque
+from typing import AsyncIterator, Deque, Tuple
+
+from dotenv import load_dotenv
+
+from src.metrics import metrics
+
+load_dotenv()
+# Replay buffer per streamed answer, in bytes
+STREAM_REPLAY_MAX_BYTES = int(os.getenv("STREAM_REPLAY_MAX_BYTES", 262144))
+
+
+class Generation:
+    """
+    The SSE frames of one answer, detached from the connection that started it.
+    Frames are numbered with `id:` & kept in a bounded replay buffer, so a client that lost the
+    connection can reattach with `Last-Event-ID` instead of paying for a second model run.
+    """
+
+    def __init__(self, max_bytes: int = STREAM_REPLAY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.finished = False
+        self._frames: Deque[Tuple[int, str]] = deque()
+        self._bytes = 0
+        self._seq = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def last_event_id(self) -> int:
+        return self._seq
+
+    def can_resume(self, last_event_id: int) -> bool:
+        """Whether every frame after `last_event_id` is still in the buffer."""
+        if last_event_id < 0 or last_event_id > self._seq:
+            return False
+        first_seq = self._frames[0][0] if self._frames else self._seq + 1
+        return last_event_id >= first_seq - 1
+
+    def append(self, frame: str):
+        self._seq += 1
+        frame = f"id: {self._seq}\n{frame}"
+        self._frames.append((self._seq, frame))
+        self._bytes += len(frame)
+        # The newest frame is always kept, even if it alone is over the budget
+        while self._bytes > self.max_bytes and len(self._frames) > 1:
+            self._bytes -= len(self._frames.popleft()[1])
+            metrics.inc("agent.stream.replay_evictions")
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def finish(self):
+        self.finished = True
+        self._changed.set()
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncIterator[str]:
+        """Frames after `last_event_id`, then live ones until the generation finishes."""
+        sent = last_event_id
+        try:
+            while True:
+                changed = self._changed
+                if self._frames:
+                    if sent + 1 < self._frames[0][0]:
+                        # Fell behind the replay buffer; resuming would leave a gap in the answer
+                        yield f"event: error\ndata: {json.dumps({'status': 410, 'message': 'Stream can no longer be resumed'})}\n\n"
+                        return
+                    start = sent + 1 - self._frames[0][0]
+                    for seq, frame in list(itertools.islice(self._frames, start, None)):
+                        yield frame
+                        sent = seq
+                if self.finished and sent >= self._seq:
+                    return
+                await changed.wait()
+        finally:
+            if sent < self._seq or not self.finished:
+                # The generation keeps going; the client can come back with Last-Event-ID
+                metrics.inc("agent.stream.disconnects")
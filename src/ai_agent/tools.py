@@ -1,50 +1,223 @@
-from pydantic_ai import RunContext
+import os
+import time
+import asyncio
+import functools
+import threading
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from ddgs import DDGS
+from dotenv import load_dotenv
+from pydantic_ai import RunContext, Tool
+from pydantic_ai.tools import ToolDefinition
+from pydantic_ai.common_tools.duckduckgo import DuckDuckGoResult, duckduckgo_ta
 
 from configs.logger import logger
+from src.metrics import metrics
 from src.helpers import get_http_client
 from src.ai_agent.utils import AgentDeps
+from src.ai_agent.cache import ToolResultCache, normalize_query
+from src.ai_agent.circuit_breaker import CircuitBreaker, CircuitOpenError
 
+load_dotenv()
+DDG_MAX_RESULTS = int(os.getenv("DDG_MAX_RESULTS", 5))
+DDG_SEARCH_WORKERS = int(os.getenv("DDG_SEARCH_WORKERS", 4))
+DDG_SEARCH_TIMEOUT_SECONDS = float(os.getenv("DDG_SEARCH_TIMEOUT_SECONDS", 10))
+DDG_CACHE_TTL_SECONDS = int(os.getenv("DDG_CACHE_TTL_SECONDS", 600))
+DDG_CACHE_MAX_ENTRIES = int(os.getenv("DDG_CACHE_MAX_ENTRIES", 1000))
+QUADSEARCH_LIMIT = int(os.getenv("QUADSEARCH_LIMIT", 5))
+QUADSEARCH_TIMEOUT_SECONDS = float(os.getenv("QUADSEARCH_TIMEOUT_SECONDS", 5))
+QUADSEARCH_CACHE_TTL_SECONDS = int(os.getenv("QUADSEARCH_CACHE_TTL_SECONDS", 300))
+QUADSEARCH_CACHE_MAX_ENTRIES = int(
+    os.getenv("QUADSEARCH_CACHE_MAX_ENTRIES", 2000))
+QUADSEARCH_BREAKER_FAILURES = int(os.getenv("QUADSEARCH_BREAKER_FAILURES", 5))
+QUADSEARCH_BREAKER_RESET_SECONDS = float(
+    os.getenv("QUADSEARCH_BREAKER_RESET_SECONDS", 30))
+# Speculative retrieval before the first model call
+PREFETCH_RETRIEVAL = os.getenv(
+    "PREFETCH_RETRIEVAL", "False").lower() in ("true", "1", "yes")
+PREFETCH_TIMEOUT_SECONDS = float(os.getenv("PREFETCH_TIMEOUT_SECONDS", 2))
 
-# Tool: Get answers from Knowledge Base
-async def custom_knowledge_tool(ctx: RunContext[AgentDeps], query: str) -> str:
-    """
-    Fetch answers from custom knowledge base.
+# DDGS is synchronous; searches get their own bounded pool instead of the loop's default threads
+_search_executor = ThreadPoolExecutor(
+    max_workers=DDG_SEARCH_WORKERS, thread_name_prefix="ddg-search")
+_search_clients = threading.local()
+search_cache = ToolResultCache(
+    "duckduckgo_search", DDG_CACHE_TTL_SECONDS, DDG_CACHE_MAX_ENTRIES)
+knowledge_cache = ToolResultCache(
+    "custom_knowledge", QUADSEARCH_CACHE_TTL_SECONDS, QUADSEARCH_CACHE_MAX_ENTRIES)
+quadsearch_breaker = CircuitBreaker(
+    "quadsearch", QUADSEARCH_BREAKER_FAILURES, QUADSEARCH_BREAKER_RESET_SECONDS)
+
+
+def _ddg_text(query: str) -> list:
+    # One client per pool thread
+    client = getattr(_search_clients, "client", None)
+    if client is None:
+        client = _search_clients.client = DDGS()
+    return client.text(query, max_results=DDG_MAX_RESULTS)
+
+
+async def _search_ddg(query: str) -> List[DuckDuckGoResult]:
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.wait_for(
+            loop.run_in_executor(_search_executor, functools.partial(_ddg_text, query)),
+            DDG_SEARCH_TIMEOUT_SECONDS
+        )
+        return duckduckgo_ta.validate_python(results)
+    except Exception:
+        metrics.inc("agent.tool.duckduckgo_search.errors")
+        raise
+    finally:
+        metrics.observe("agent.tool.duckduckgo_search.upstream_ms",
+                        (time.perf_counter() - start) * 1000)
+
+
+async def duckduckgo_search(query: str) -> List[DuckDuckGoResult]:
+    """Searches DuckDuckGo for the given query and returns the results.
 
     Args:
-        query: The query string to search for in the custom knowledge base.
+        query: The query to search for.
 
     Returns:
-        A list of document chunks containing relevant information from the custom knowledge base.
+        The search results.
     """
+    start = time.perf_counter()
     try:
-        client = get_http_client()
-        base_url = ctx.deps.quadsearch_base_url
-        api_key = ctx.deps.quadsearch_api_key
-        data = {
-            "query": query,
-            "limit": 5,
-            "collection_name": ctx.deps.collection_name,
-        }
+        return await search_cache.get_or_load(normalize_query(query), lambda: _search_ddg(query))
+    finally:
+        metrics.observe("agent.tool.duckduckgo_search.latency_ms",
+                        (time.perf_counter() - start) * 1000)
+
+
+def cached_duckduckgo_search_tool() -> Tool:
+    """Drop-in replacement for pydantic-ai's duckduckgo_search_tool with caching & de-duplication."""
+    return Tool(
+        duckduckgo_search,
+        name="duckduckgo_search",
+        description="Searches DuckDuckGo for the given query and returns the results.",
+    )
+
+
+def close_search_executor():
+    _search_executor.shutdown(wait=False, cancel_futures=True)
+
 
+# Tool: Get answers from Knowledge Base
+async def _search_knowledge(deps: AgentDeps, query: str) -> str:
+    # Only real upstream calls take the half-open trial; cache hits & coalesced waiters never get here
+    if not quadsearch_breaker.allow():
+        raise CircuitOpenError("quadsearch")
+    start = time.perf_counter()
+    try:
+        client = get_http_client()
         response = await client.post(
-            f"{base_url}/api/v1/qdrant/search",
-            json=data,
-            headers={"Authorization": api_key},
+            f"{deps.quadsearch_base_url}/api/v1/qdrant/search",
+            json={
+                "query": query,
+                "limit": QUADSEARCH_LIMIT,
+                "collection_name": deps.collection_name,
+            },
+            headers={"Authorization": deps.quadsearch_api_key},
+            timeout=QUADSEARCH_TIMEOUT_SECONDS,
         )
-
+        response.raise_for_status()
         data = response.json()
-        logger.info(f"Fetched answers for query: '{query}': {data}")
-        if data:
-            # Format the list of document chunks
-            formatted_chunks = [
-                f"Content: {item['payload']['content']}\n"
-                for item in data.get('data', [])
-            ]
-            # logger.info(f"Formatted chunks: {formatted_chunks}")
-            return "\n\n".join(formatted_chunks)
-        else:
-            return "Error fetching answers. Please try again later."
+        quadsearch_breaker.record_success()
+    except Exception:
+        quadsearch_breaker.record_failure()
+        metrics.inc("agent.tool.custom_knowledge.errors")
+        raise
+    finally:
+        quadsearch_breaker.release()  # Also when cancelled, which records neither outcome
+        metrics.observe("agent.tool.custom_knowledge.upstream_ms",
+                        (time.perf_counter() - start) * 1000)
+
+    logger.info(f"Fetched answers for query: '{query}': {data}")
+    if not data:
+        raise ValueError("Empty response from quadsearch")
+    # Format the list of document chunks
+    formatted_chunks = [
+        f"Content: {item['payload']['content']}\n"
+        for item in data.get('data', [])
+    ]
+    return "\n\n".join(formatted_chunks)
+
 
+def knowledge_available(deps: AgentDeps) -> bool:
+    return bool(deps and deps.quadsearch_base_url) and not quadsearch_breaker.is_open()
+
+
+async def search_knowledge(deps: AgentDeps, query: str) -> str:
+    """Cached, circuit-guarded knowledge base search shared by the tool & speculative retrieval."""
+    start = time.perf_counter()
+    try:
+        key = (deps.collection_name, normalize_query(query))
+        return await knowledge_cache.get_or_load(key, lambda: _search_knowledge(deps, query))
+    except CircuitOpenError:
+        return "The knowledge base is temporarily unavailable."
     except Exception as e:
         logger.error(f"Error reaching quadsearch server: {str(e)}")
         return "Error fetching answers. Please try again later."
+    finally:
+        metrics.observe("agent.tool.custom_knowledge.latency_ms",
+                        (time.perf_counter() - start) * 1000)
+
+
+async def custom_knowledge_tool(ctx: RunContext[AgentDeps], query: str) -> str:
+    """
+    Fetch answers from custom knowledge base.
+
+    Args:
+        query: The query string to search for in the custom knowledge base.
+
+    Returns:
+        A list of document chunks containing relevant information from the custom knowledge base.
+    """
+    return await search_knowledge(ctx.deps, query)
+
+
+async def _prepare_knowledge_tool(ctx: RunContext[AgentDeps], tool_def: ToolDefinition) -> Optional[ToolDefinition]:
+    # Only offer the tool when a knowledge base is configured and reachable
+    return tool_def if knowledge_available(ctx.deps) else None
+
+
+def knowledge_tool() -> Tool:
+    return Tool(custom_knowledge_tool, takes_ctx=True, prepare=_prepare_knowledge_tool)
+
+
+async def prefetch_context(query: str, deps: AgentDeps) -> Optional[str]:
+    """
+    Speculative retrieval: query the knowledge base and the web concurrently, before the
+    model asks for either, and format whatever arrives within PREFETCH_TIMEOUT_SECONDS.
+    Args:
+        query (str): The user's message.
+        deps (AgentDeps): Agent dependencies with the knowledge base settings.
+    Returns:
+        str: Context to add to the system prompt, or None if nothing useful came back.
+    """
+    start = time.perf_counter()
+    lookups = {"web": asyncio.create_task(duckduckgo_search(query))}
+    if knowledge_available(deps):
+        lookups["knowledge"] = asyncio.create_task(search_knowledge(deps, query))
+    done, pending = await asyncio.wait(lookups.values(), timeout=PREFETCH_TIMEOUT_SECONDS)
+    for task in pending:
+        task.cancel()
+    metrics.observe("agent.prefetch.latency_ms", (time.perf_counter() - start) * 1000)
+    metrics.inc("agent.prefetch.timeouts", len(pending))
+
+    sections = []
+    knowledge = lookups.get("knowledge")
+    if knowledge in done and not knowledge.exception() and knowledge.result().startswith("Content:"):
+        sections.append(f"### custom_knowledge_tool results for the user's message\n{knowledge.result()}")
+    web = lookups["web"]
+    if web in done and not web.exception() and web.result():
+        results = "\n".join(
+            f"- [{item['title']}]({item['href']}): {item['body']}" for item in web.result())
+        sections.append(f"### duckduckgo_search_tool results for the user's message\n{results}")
+    if not sections:
+        return None
+    return ("Search results were fetched for this message in advance. Use them instead of calling the same "
+            "tool again, and only call a tool if they are not enough.\n\n" + "\n\n".join(sections))
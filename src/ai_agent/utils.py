@@ -1,10 +1,15 @@
+import os
+import json
+import base64
+import asyncio
 from uuid import uuid4
+from dotenv import load_dotenv
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 
 from fastapi import Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic_ai.messages import (
     ModelRequest,
     ModelResponse,
@@ -13,9 +18,23 @@ from pydantic_ai.messages import (
 )
 
 from configs.logger import logger
-from configs.database import get_db
+from configs.database import get_async_db
 from src.auth.models import User
 from src.ai_agent.models import ChatSession, ChatMessage
+from src.ai_agent.search import index_message
+from src.ai_agent.cache import HistoryTurn, history_cache
+
+load_dotenv()
+
+# History window: newest turns are kept until the token budget is spent
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", 50))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 4000))
+HISTORY_MESSAGE_TOKEN_LIMIT = int(
+    os.getenv("HISTORY_MESSAGE_TOKEN_LIMIT", 1000))
+TRUNCATION_MARKER = " … [truncated]"
+# Streaming: model deltas are merged into one frame for up to this long (0 disables) or until this many bytes pile up
+STREAM_COALESCE_MS = int(os.getenv("STREAM_COALESCE_MS", 100))
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", 2048))
 
 
 # Agent dependencies
@@ -30,26 +49,29 @@ class AgentDeps:
 async def fetch_conversation_history(
         session_id: str,
         fetch_until: int = None,
-        limit: int = 10,
-        db: Session = Depends(get_db)
+        fetch_after: int = None,
+        limit: int = HISTORY_MAX_MESSAGES,
+        db: AsyncSession = Depends(get_async_db)
 ) -> List[Dict[str, Any]]:
     """Fetch conversation history from DB."""
     try:
         if fetch_until:
-            query = ChatMessage.get_active(db).filter(
+            query = ChatMessage.select_active().where(
                 ChatMessage.session_id == session_id,
                 ChatMessage.id < fetch_until
             )
         else:
-            query = ChatMessage.get_active(db).filter(
+            query = ChatMessage.select_active().where(
                 ChatMessage.session_id == session_id
             )
-        data = (
+        if fetch_after:
+            # Older messages are already folded into the session summary
+            query = query.where(ChatMessage.id > fetch_after)
+        data = (await db.scalars(
             query
-            .order_by(ChatMessage.created_at.desc())
+            .order_by(ChatMessage.id.desc())
             .limit(limit)
-            .all()
-        )
+        )).all()
 
         # Reverse to get chronological order
         messages = data[::-1]
@@ -64,9 +86,9 @@ async def save_conversation_history(
     session_id: str,
     human_message: str,
     ai_message: Optional[str] = None,
-    date_time: datetime = datetime.now(),
+    date_time: Optional[datetime] = None,
     duration: Optional[float] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> ChatMessage:
     """Save conversation history to DB."""
     try:
@@ -74,15 +96,18 @@ async def save_conversation_history(
             session_id=session_id,
             human_message=human_message,
             ai_message=ai_message,
-            date_time=date_time,
+            date_time=date_time or datetime.now(tz=timezone.utc),
             duration=duration
         )
         db.add(chat_history)
-        db.commit()
-        db.refresh(chat_history)
+        await index_message(db, chat_history)
+        await db.commit()
+        await db.refresh(chat_history)
+        # Keep this worker's hot copy of the session in step with the DB
+        history_cache.append(session_id, *to_history_turns([chat_history]))
         return chat_history
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error saving conversation history: {e}")
         return None
 
@@ -107,6 +132,172 @@ def to_pydantic_ai_message(
     return pydantic_messages
 
 
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 UTF-8 bytes per token), close enough for budgeting."""
+    if not text:
+        return 0
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, keeping the beginning."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    encoded = text.encode("utf-8")[:max(0, max_tokens * 4 - len(TRUNCATION_MARKER))]
+    return encoded.decode("utf-8", errors="ignore") + TRUNCATION_MARKER
+
+
+def to_history_turns(
+    messages: List[ChatMessage],
+    message_token_limit: int = HISTORY_MESSAGE_TOKEN_LIMIT,
+) -> List[HistoryTurn]:
+    """Convert ChatMessage rows to truncated Pydantic AI turns with their token estimates."""
+    turns = []
+    for msg in messages:
+        if not msg or not isinstance(msg, ChatMessage):
+            logger.warning("Invalid message format or None encountered.")
+            continue
+
+        human_message = truncate_to_tokens(
+            msg.human_message or "", message_token_limit)
+        ai_message = truncate_to_tokens(
+            msg.ai_message or "", message_token_limit)
+        turn = []
+        if human_message:
+            turn.append(ModelRequest(
+                parts=[UserPromptPart(content=human_message)]))
+        if ai_message:
+            turn.append(ModelResponse(parts=[TextPart(content=ai_message)]))
+        turns.append(HistoryTurn(
+            message_id=msg.id,
+            messages=turn,
+            tokens=estimate_tokens(human_message) + estimate_tokens(ai_message)
+        ))
+    return turns
+
+
+async def load_conversation_history(
+    chat_session: ChatSession,
+    previous_version: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+) -> List[HistoryTurn]:
+    """
+    Load the unsummarized conversation tail of a session, from the history cache when it is current.
+    Args:
+        chat_session (ChatSession): Session row, already committed with this turn's update.
+        previous_version (datetime): `updated_at` of the session before this turn touched it.
+        db (AsyncSession): Database session.
+    Returns:
+        List[HistoryTurn]: Conversation turns in chronological order.
+    """
+    session_id = chat_session.session_id
+    turns = history_cache.get(
+        session_id, previous_version, chat_session.summary_until)
+    if turns is not None:
+        history_cache.touch(session_id, chat_session.updated_at)
+        return turns
+
+    messages = await fetch_conversation_history(
+        session_id=session_id,
+        fetch_after=chat_session.summary_until,
+        db=db
+    )
+    turns = to_history_turns(messages)
+    history_cache.set(session_id, chat_session.updated_at,
+                      chat_session.summary_until, turns)
+    return turns
+
+
+def build_history_window(
+    turns: List[HistoryTurn],
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Select the newest conversation turns that fit into the token budget.
+    Args:
+        turns (List[HistoryTurn]): Conversation history in chronological order, see `to_history_turns`.
+        token_budget (int): Maximum estimated tokens for the whole window.
+    Returns:
+        Tuple[List[ModelMessage], int]: Pydantic AI messages in chronological order & the tokens they use.
+    """
+    selected = []
+    tokens_used = 0
+    for turn in reversed(turns):
+        if tokens_used + turn.tokens > token_budget:
+            break
+        selected.append(turn)
+        tokens_used += turn.tokens
+
+    history = [message for turn in reversed(selected) for message in turn.messages]
+    return history, tokens_used
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterator[str],
+    window_ms: int = STREAM_COALESCE_MS,
+    max_bytes: int = STREAM_COALESCE_BYTES
+) -> AsyncIterator[str]:
+    """
+    Merge small text deltas so each streamed frame carries up to `window_ms` worth of text.
+    The first delta is passed through right away, so time to first token is unchanged.
+    Deltas are pulled by one task into a buffer, so the cost per delta is an append; the
+    consumer wakes once per frame.
+    Args:
+        chunks (AsyncIterator[str]): Text deltas, e.g. from `stream_text(delta=True)`.
+        window_ms (int): How long a delta may wait for more text before it is flushed.
+        max_bytes (int): Flush as soon as the buffered text reaches this size (0 for no cap).
+    Returns:
+        AsyncIterator[str]: The same text, in fewer & larger chunks.
+    """
+    if window_ms <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    buffer: List[str] = []
+    buffered_bytes = 0
+    arrived = asyncio.Event()  # Text is waiting in the buffer
+    flush_now = asyncio.Event()  # The size cap was reached or the stream ended
+
+    async def pull():
+        nonlocal buffered_bytes
+        try:
+            async for chunk in chunks:
+                buffer.append(chunk)
+                buffered_bytes += len(chunk)
+                arrived.set()
+                if max_bytes > 0 and buffered_bytes >= max_bytes:
+                    flush_now.set()
+        finally:
+            arrived.set()
+            flush_now.set()
+
+    puller = asyncio.create_task(pull())
+    first = True
+    try:
+        while True:
+            await arrived.wait()
+            if not first and not flush_now.is_set():
+                try:
+                    await asyncio.wait_for(flush_now.wait(), window_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            first = False
+            arrived.clear()
+            if buffer:
+                text = "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                if not puller.done():
+                    flush_now.clear()
+                yield text
+            if puller.done() and not buffer:
+                break
+        puller.result()  # Re-raise an error of the model stream
+    finally:
+        puller.cancel()
+
+
 def to_simple_message(
     messages: List[ChatMessage]
 ) -> List[Dict[str, Any]]:
@@ -124,12 +315,29 @@ def to_simple_message(
     return simple_messages
 
 
-def get_new_session(db: Session, user: User) -> str:
+async def get_new_session(db: AsyncSession, user: User) -> str:
     """Create a new session object with a unique session ID."""
     session_id = str(uuid4())
     new_session = ChatSession(
         session_id=session_id, user_id=user.id, date_time=datetime.now(tz=timezone.utc))
     db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
+    await db.commit()
     return new_session.session_id
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """Encode keyset pagination values into an opaque cursor string."""
+    raw = json.dumps(data, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(data, dict):
+        raise ValueError("Invalid cursor")
+    return data
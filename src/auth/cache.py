@@ -0,0 +1,104 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.metrics import metrics
+from src.auth.models import User
+
+load_dotenv()
+
+TOKEN_CACHE_TTL_SECONDS = int(os.environ.get("TOKEN_CACHE_TTL_SECONDS", 60))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get("TOKEN_CACHE_MAX_SIZE", 10000))
+
+
+@dataclass
+class CachedToken:
+    jti: str
+    user_id: int
+    user_data: dict
+    expires_at: float  # Unix timestamp, never later than the token's `exp`
+
+    async def attach_user(self, db: AsyncSession) -> User:
+        """Rebuild the cached user and attach it to the request session without a DB round trip."""
+        user = User(**self.user_data)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+
+class TokenCache:
+    """
+    LRU cache of verified access tokens keyed by `jti`.
+    An entry means the token was not blacklisted, matched a stored `user_tokens` row
+    and resolved to an active user when it was cached.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE, ttl: int = TOKEN_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedToken]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+
+    def get(self, jti: str) -> Optional[CachedToken]:
+        entry = self._entries.get(jti)
+        if entry and entry.expires_at <= time.time():
+            self._remove(jti)
+            entry = None
+        if not entry:
+            metrics.inc("auth.token_cache.miss")
+            return None
+        self._entries.move_to_end(jti)
+        metrics.inc("auth.token_cache.hit")
+        return entry
+
+    def set(self, jti: str, user: User, exp: Optional[float] = None):
+        if not jti or self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp:
+            expires_at = min(expires_at, float(exp))
+        user_data = {column.key: getattr(user, column.key)
+                     for column in User.__table__.columns}
+
+        self._remove(jti)
+        self._entries[jti] = CachedToken(
+            jti=jti, user_id=user.id, user_data=user_data, expires_at=expires_at)
+        self._by_user.setdefault(user.id, set()).add(jti)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            metrics.inc("auth.token_cache.eviction")
+        metrics.set_gauge("auth.token_cache.size", len(self._entries))
+
+    def invalidate(self, jti: str):
+        if self._remove(jti):
+            metrics.inc("auth.token_cache.invalidation")
+        metrics.set_gauge("auth.token_cache.size", len(self._entries))
+
+    def invalidate_user(self, user_id: int):
+        for jti in list(self._by_user.get(user_id, ())):
+            self.invalidate(jti)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+        metrics.set_gauge("auth.token_cache.size", 0)
+
+    def _remove(self, jti: str) -> bool:
+        entry = self._entries.pop(jti, None)
+        if not entry:
+            return False
+        user_jtis = self._by_user.get(entry.user_id)
+        if user_jtis is not None:
+            user_jtis.discard(jti)
+            if not user_jtis:
+                del self._by_user[entry.user_id]
+        return True
+
+
+token_cache = TokenCache()
@@ -1,11 +1,13 @@
 import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, Security
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from configs.database import get_db
-from src.auth.utils import decode_token
+from configs.database import get_async_db
+from src.auth.cache import token_cache
+from src.auth.revocation import revocation_feed
+from src.auth.utils import read_token, validate_token_in_db
 from src.auth.exceptions import APIKeyException, JWTException
 
 from src.auth.models import ApiKey, User
@@ -18,16 +20,16 @@ api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
 async def get_api_key(
     api_key: str = Security(api_key_header),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if api_key is None:
         raise APIKeyException(
             status=401, message="Authorization header missing")
 
     token = api_key.replace("Bearer ", "")
-    api_key_obj = ApiKey.get_active(db).filter(
+    api_key_obj = await db.scalar(ApiKey.select_active().where(
         ApiKey.key == token
-    ).first()
+    ))
 
     if not api_key_obj:
         raise APIKeyException(status=403, message="Invalid API Key")
@@ -35,13 +37,13 @@ async def get_api_key(
     return api_key_obj
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: AsyncSession = Depends(get_async_db)):
     if credentials is None:
         raise JWTException(401, message="Authorization header missing")
 
     token = credentials.credentials
     try:
-        payload = decode_token(db, token, token_type="access")
+        payload = read_token(token, token_type="access")
         user_id = payload.get('user_id')
         if not user_id:
             raise JWTException(401, message="Invalid token")
@@ -49,8 +51,15 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_
         raise JWTException(
             401, message="Could not validate credentials")
 
-    user_id = payload.get("user_id")
-    user = User.get_active(db).filter(User.id == user_id).first()
+    # Verified tokens are cached by jti so repeat requests skip the DB checks
+    jti = payload.get("jti")
+    cached = token_cache.get(jti)
+    if cached and cached.user_id == user_id and not revocation_feed.is_revoked(jti):
+        return await cached.attach_user(db)
+
+    await validate_token_in_db(db, payload, token_type="access")
+    user = await db.scalar(User.select_active().where(User.id == user_id))
     if not user:
         raise JWTException(401, message="Invalid user")
+    token_cache.set(jti, user, exp=payload.get("exp"))
     return user
@@ -10,3 +10,11 @@ class JWTException(Exception):
         self.status = status
         self.message = message
         self.data = data or {}
+
+
+class TooManyRequestsException(Exception):
+    def __init__(self, status: int, message: str, data: dict = None, retry_after: int = 1):
+        self.status = status
+        self.message = message
+        self.data = data or {}
+        self.retry_after = retry_after
@@ -0,0 +1,221 @@
+import os
+import time
+import asyncio
+import hashlib
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from configs.logger import logger
+from configs.database import AsyncSessionLocal
+from src.metrics import metrics
+from src.auth.cache import token_cache
+
+from src.auth.models import User, UserToken
+
+load_dotenv()
+
+# Append-only file shared by the workers of one host; each revocation is one line
+# (`<jti> <exp>`, or `user:<id> <time>` to drop every cached token of a changed user)
+REVOCATION_FEED_PATH = os.environ.get(
+    "REVOCATION_FEED_PATH", "/tmp/pydantic_ai_agent_revocations.feed")
+REVOCATION_FEED_MAX_BYTES = int(
+    os.environ.get("REVOCATION_FEED_MAX_BYTES", 1024 * 1024))
+REVOCATION_POLL_SECONDS = float(os.environ.get("REVOCATION_POLL_SECONDS", 1))
+# Incremental sync from `user_tokens`, catches revocations made on other hosts
+REVOCATION_DB_SYNC_SECONDS = float(
+    os.environ.get("REVOCATION_DB_SYNC_SECONDS", 30))
+
+
+def _as_timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return float("inf")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevokedTokenSet:
+    """
+    Revoked jtis stored as 64-bit hashes with their expiry, so membership is an O(1) lookup.
+    Entries are dropped once the token would have expired anyway.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, float] = {}
+
+    @staticmethod
+    def _key(jti: str) -> int:
+        return int.from_bytes(hashlib.blake2b(jti.encode(), digest_size=8).digest(), "big")
+
+    def add(self, jti: str, expires_at: float):
+        self._entries[self._key(jti)] = expires_at
+
+    def __contains__(self, jti: str) -> bool:
+        return self._key(jti) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def prune(self, now: Optional[float] = None):
+        now = now or time.time()
+        expired = [key for key, exp in self._entries.items() if exp <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+class RevocationFeed:
+    """
+    Keeps each worker's view of blacklisted tokens up to date.
+    Local revocations are appended to a shared feed file that every worker tails,
+    and `user_tokens` is polled by `updated_at` watermark as the durable source.
+    """
+
+    def __init__(
+        self,
+        path: str = REVOCATION_FEED_PATH,
+        poll_interval: float = REVOCATION_POLL_SECONDS,
+        db_sync_interval: float = REVOCATION_DB_SYNC_SECONDS,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.db_sync_interval = db_sync_interval
+        self.revoked = RevokedTokenSet()
+        self.ready = False
+        self._watermark = None
+        self._user_watermark = None
+        self._offset = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, jti: str) -> Optional[bool]:
+        """Return whether the jti is revoked, or None if the feed is not loaded in this process."""
+        if not self.ready:
+            return None
+        return jti in self.revoked
+
+    def publish(self, jti: str, expires_at: Optional[datetime] = None):
+        """Record a revocation locally and broadcast it to the other workers."""
+        exp = _as_timestamp(expires_at)
+        self._apply(jti, exp)
+        self._write(f"{jti} {exp}\n")
+
+    def publish_user(self, user_id: int):
+        """Drop the user's cached tokens in every worker, e.g. after their password or state changed."""
+        token_cache.invalidate_user(user_id)
+        self._write(f"user:{user_id} {time.time()}\n")
+
+    def _write(self, line: str):
+        try:
+            mode = "a"
+            if os.path.exists(self.path) and os.path.getsize(self.path) > REVOCATION_FEED_MAX_BYTES:
+                # Readers notice the shrink and re-read; the DB sync covers anything missed
+                mode = "w"
+            with open(self.path, mode) as feed:
+                feed.write(line)
+        except OSError as e:
+            logger.error(f"Error writing revocation feed: {e}")
+
+    async def start(self):
+        try:
+            await self.sync_from_db()
+            self._offset = os.path.getsize(
+                self.path) if os.path.exists(self.path) else 0
+            self.ready = True
+        except Exception as e:
+            logger.error(
+                f"Revocation feed unavailable, falling back to DB checks: {e}")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+    async def sync_from_db(self):
+        """Load revocations recorded since the last watermark."""
+        query = select(UserToken.jti, UserToken.expires_at, UserToken.updated_at).where(
+            UserToken.is_blacklisted == True,
+            UserToken.is_deleted == False,
+            UserToken.expires_at > datetime.now(timezone.utc)
+        )
+        if self._watermark is not None:
+            # >= so rows sharing the watermark timestamp are not skipped; re-adding is idempotent
+            query = query.where(UserToken.updated_at >= self._watermark)
+
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+
+        for jti, expires_at, updated_at in rows:
+            if jti:
+                self._apply(jti, _as_timestamp(expires_at))
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+        await self.sync_users_from_db()
+        metrics.inc("auth.revocation.db_sync")
+
+    async def sync_users_from_db(self):
+        """Drop cached tokens of users changed since the last watermark, e.g. by a password reset on another host."""
+        query = select(User.id, User.updated_at)
+        if self._user_watermark is not None:
+            query = query.where(User.updated_at >= self._user_watermark)
+        else:
+            # Nothing is cached before the first sync, only the watermark is needed
+            query = query.order_by(User.updated_at.desc()).limit(1)
+
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+
+        for user_id, updated_at in rows:
+            token_cache.invalidate_user(user_id)
+            if updated_at is not None and (self._user_watermark is None or updated_at > self._user_watermark):
+                self._user_watermark = updated_at
+
+    def read_feed(self):
+        """Apply revocations appended to the feed file since the last read."""
+        if not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) < self._offset:
+            self._offset = 0
+        with open(self.path) as feed:
+            feed.seek(self._offset)
+            for line in feed:
+                if not line.endswith("\n"):
+                    break  # Partially written line, pick it up next poll
+                self._offset += len(line)
+                parts = line.split()
+                if len(parts) != 2:
+                    continue
+                if parts[0].startswith("user:"):
+                    token_cache.invalidate_user(int(parts[0][len("user:"):]))
+                else:
+                    self._apply(parts[0], float(parts[1]))
+                metrics.inc("auth.revocation.feed_event")
+
+    def _apply(self, jti: str, expires_at: float):
+        self.revoked.add(jti, expires_at)
+        token_cache.invalidate(jti)
+        metrics.set_gauge("auth.revocation.size", len(self.revoked))
+
+    async def _run(self):
+        last_db_sync = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.read_feed()
+                if time.monotonic() - last_db_sync >= self.db_sync_interval:
+                    last_db_sync = time.monotonic()
+                    await self.sync_from_db()
+                    self.revoked.prune()
+            except Exception as e:
+                logger.error(f"Error refreshing revocation feed: {e}")
+
+
+revocation_feed = RevocationFeed()
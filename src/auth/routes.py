@@ -1,12 +1,16 @@
+import time
 import uuid
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Request, Depends
 
-from configs.database import get_db
+from configs.database import get_async_db
+from src.metrics import metrics
 from src.helpers import ResponseHelper
+from src.auth.revocation import revocation_feed
 from src.auth.dependencies import get_current_user
 from src.auth.utils import (
-    create_token, verify_password, blacklist_token, decode_token, hash_password
+    create_token, verify_password_async, blacklist_token, decode_token, hash_password_async
 )
 
 from src.auth.models import User
@@ -20,49 +24,54 @@ response = ResponseHelper()
 async def login(
     request: Request,
     data: LoginSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = db.query(User).filter(User.phone == data.phone).first()
-    if not user or not verify_password(data.password, user.password):
-        return response.error_response(401, message="Invalid credentials")
-    if not user.is_active:
-        return response.error_response(403, message="Inactive user")
-
-    jti = str(uuid.uuid4())
-    access_token = create_token(
-        db=db, data={"user_id": user.id, "phone": user.phone}, jti=jti, token_type="access"
-    )
-    refresh_token = create_token(
-        db=db, data={"user_id": user.id, "phone": user.phone}, jti=jti, token_type="refresh"
-    )
-
-    user_data = {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "phone": user.phone,
-        "is_active": user.is_active
-    }
-    resp_data = LoginResponseSchema(
-        access_token=access_token,
-        refresh_token=refresh_token,
-        user=user_data,
-    )
-
-    return response.success_response(200, 'success', resp_data)
+    start = time.perf_counter()
+    try:
+        user = await db.scalar(select(User).where(User.phone == data.phone))
+        if not user or not await verify_password_async(data.password, user.password):
+            return response.error_response(401, message="Invalid credentials")
+        if not user.is_active:
+            return response.error_response(403, message="Inactive user")
+
+        jti = str(uuid.uuid4())
+        access_token = await create_token(
+            db=db, data={"user_id": user.id, "phone": user.phone}, jti=jti, token_type="access"
+        )
+        refresh_token = await create_token(
+            db=db, data={"user_id": user.id, "phone": user.phone}, jti=jti, token_type="refresh"
+        )
+
+        user_data = {
+            "id": user.id,
+            "name": user.name,
+            "email": user.email,
+            "phone": user.phone,
+            "is_active": user.is_active
+        }
+        resp_data = LoginResponseSchema(
+            access_token=access_token,
+            refresh_token=refresh_token,
+            user=user_data,
+        )
+
+        return response.success_response(200, 'success', resp_data)
+    finally:
+        metrics.observe("auth.login.latency_ms",
+                        (time.perf_counter() - start) * 1000)
 
 
 @router.post("/refresh-token")
 async def refresh_token(
     request: Request,
     data: RefreshTokenSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Refresh a token
     """
-    payload = decode_token(db, data.refresh_token, token_type="refresh")
-    access_token = create_token(
+    payload = await decode_token(db, data.refresh_token, token_type="refresh")
+    access_token = await create_token(
         db=db,
         data={"user_id": payload.get(
             "user_id"), "phone": payload.get("phone")},
@@ -81,13 +90,13 @@ async def refresh_token(
 async def logout(
     request: Request,
     data: RefreshTokenSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     """
     Blacklist the token
     """
-    blacklist_token(data.refresh_token, db)
+    await blacklist_token(data.refresh_token, db)
     return response.success_response(200, 'success')
 
 
@@ -95,17 +104,18 @@ async def logout(
 async def reset_password(
     request: Request,
     data: ResetPasswordSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user),
 ):
     """
     Reset Users Password
     """
-    if not verify_password(data.current_password, user.password):
+    if not await verify_password_async(data.current_password, user.password):
         return response.error_response(400, message="Current password did not matched!")
-    new_password = hash_password(data.new_password)
+    new_password = await hash_password_async(data.new_password)
 
     user.password = new_password
-    db.commit()
+    await db.commit()
+    revocation_feed.publish_user(user.id)
 
     return response.success_response(200, 'success')
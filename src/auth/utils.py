@@ -1,12 +1,19 @@
 import os
 import jwt
+import time
+import asyncio
+import multiprocessing
 from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 
-from src.auth.exceptions import JWTException
+from src.metrics import metrics
+from src.auth.cache import token_cache
+from src.auth.revocation import revocation_feed
+from src.auth.exceptions import JWTException, TooManyRequestsException
 
 from src.auth.models import UserToken
 
@@ -19,10 +26,17 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(
 REFRESH_TOKEN_EXPIRE_MINUTES = int(
     os.environ.get("JWT_REFRESH_TOKEN_EXPIRE_MINUTES", 60*24*7))
 
+# bcrypt runs in a separate process pool so it never holds the event loop (or the GIL) of a worker
+PASSWORD_POOL_SIZE = int(os.environ.get("PASSWORD_POOL_SIZE", 2))
+PASSWORD_POOL_MAX_PENDING = int(os.environ.get("PASSWORD_POOL_MAX_PENDING", 16))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_password_pool: ProcessPoolExecutor | None = None
+_pending_password_jobs = 0
+
 
-def create_token(db: Session, data: dict, jti: str, token_type: str, expires_delta: Optional[timedelta] = None) -> str:
+async def create_token(db: AsyncSession, data: dict, jti: str, token_type: str, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT token (access or refresh).
 
@@ -57,17 +71,16 @@ def create_token(db: Session, data: dict, jti: str, token_type: str, expires_del
         user_token = UserToken(expires_at=expire,
                                user_id=to_encode.get("user_id"), jti=jti)
         db.add(user_token)
-        db.commit()
+        await db.commit()
 
     return encoded_jwt
 
 
-def decode_token(db: Session, token: str, token_type: str) -> dict:
+def read_token(token: str, token_type: str) -> dict:
     """
-    Decode a JWT and validate it.
+    Verify a JWT's signature, expiry and type without touching the database.
 
     Args:
-        db: Database session
         token: JWT token to decode
         token_type: Type of token ('access' or 'refresh')
 
@@ -76,59 +89,90 @@ def decode_token(db: Session, token: str, token_type: str) -> dict:
     """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-
-        # Check token type
-        if payload.get("type") != token_type:
-            raise JWTException(401, message="Invalid token type")
-
-        # Check if token is blacklisted
-        check_blacklist_token(db=db, jti=payload.get("jti"))
-
-        # Additional validation based on token type
-        if token_type == "access":
-            match_jti_from_db(db=db, jti=payload.get("jti"),
-                              user_id=payload.get("user_id"))
-        elif token_type == "refresh":
-            if not UserToken.get_active(db).filter(
-                    UserToken.jti == payload.get("jti")).first():
-                raise JWTException(401, message="Invalid token")
-
-        return payload
     except jwt.ExpiredSignatureError:
         raise JWTException(401, message="Token has expired")
     except jwt.InvalidTokenError:
         raise JWTException(401, message="Invalid token")
 
+    # Check token type
+    if payload.get("type") != token_type:
+        raise JWTException(401, message="Invalid token type")
+    return payload
+
+
+async def validate_token_in_db(db: AsyncSession, payload: dict, token_type: str):
+    """
+    Check a decoded token's state against the `user_tokens` table.
+
+    Args:
+        db: Database session
+        payload: Decoded token payload
+        token_type: Type of token ('access' or 'refresh')
+    """
+    # Check if token is blacklisted
+    await check_blacklist_token(db=db, jti=payload.get("jti"))
+
+    # Additional validation based on token type
+    if token_type == "access":
+        await match_jti_from_db(db=db, jti=payload.get("jti"),
+                                user_id=payload.get("user_id"))
+    elif token_type == "refresh":
+        if not await db.scalar(UserToken.select_active().where(
+                UserToken.jti == payload.get("jti"))):
+            raise JWTException(401, message="Invalid token")
+
 
-def blacklist_token(token: str, db: Session):
+async def decode_token(db: AsyncSession, token: str, token_type: str) -> dict:
+    """
+    Decode a JWT and validate it.
+
+    Args:
+        db: Database session
+        token: JWT token to decode
+        token_type: Type of token ('access' or 'refresh')
+
+    Returns:
+        dict: Decoded token payload
+    """
+    payload = read_token(token, token_type)
+    await validate_token_in_db(db, payload, token_type)
+    return payload
+
+
+async def blacklist_token(token: str, db: AsyncSession):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.PyJWTError:
         raise JWTException(
             401, message="Invalid token")
     jti = payload.get("jti")
-    check_blacklist_token(db=db, jti=jti)
-    db_token = UserToken.get_active(db).filter(
-        UserToken.jti == jti, UserToken.is_blacklisted == False).first()
+    await check_blacklist_token(db=db, jti=jti)
+    db_token = await db.scalar(UserToken.select_active().where(
+        UserToken.jti == jti, UserToken.is_blacklisted == False))
     if db_token:
         db_token.is_blacklisted = True
-        db.commit()
+        await db.commit()
+        token_cache.invalidate(jti)
+        revocation_feed.publish(jti, db_token.expires_at)
     else:
         raise JWTException(401, message="Invalid token")
 
 
-def check_blacklist_token(db: Session, jti: str):
-    db_token = UserToken.get_active(db).filter(
-        UserToken.jti == jti, UserToken.is_blacklisted == True).first()
-    if db_token:
+async def check_blacklist_token(db: AsyncSession, jti: str):
+    # In-memory check against the revocation feed; query the DB only when the feed isn't loaded
+    revoked = revocation_feed.is_revoked(jti)
+    if revoked is None:
+        revoked = await db.scalar(UserToken.select_active().where(
+            UserToken.jti == jti, UserToken.is_blacklisted == True)) is not None
+    if revoked:
         raise JWTException(401, message="Token has been blacklisted")
     else:
         return True
 
 
-def match_jti_from_db(db: Session, jti: str, user_id: int) -> Optional[UserToken]:
-    db_token = UserToken.get_active(db).filter(
-        UserToken.jti == jti, UserToken.user_id == user_id, UserToken.is_blacklisted == False).first()
+async def match_jti_from_db(db: AsyncSession, jti: str, user_id: int) -> Optional[UserToken]:
+    db_token = await db.scalar(UserToken.select_active().where(
+        UserToken.jti == jti, UserToken.user_id == user_id, UserToken.is_blacklisted == False))
     if not db_token:
         raise JWTException(401, message="Invalid token")
     return db_token
@@ -140,3 +184,51 @@ def hash_password(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def init_password_pool():
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # Start the worker processes now rather than on the first login
+        for _ in range(PASSWORD_POOL_SIZE):
+            _password_pool.submit(int)
+
+
+def close_password_pool():
+    global _password_pool
+    if _password_pool:
+        # Called from the async lifespan hook; don't block the event loop while the workers exit
+        _password_pool.shutdown(wait=False, cancel_futures=True)
+        _password_pool = None
+
+
+async def _run_in_password_pool(func, *args):
+    global _pending_password_jobs
+    if _pending_password_jobs >= PASSWORD_POOL_MAX_PENDING:
+        metrics.inc("auth.password_pool.rejected")
+        raise TooManyRequestsException(
+            429, message="Too many requests, please try again shortly")
+
+    init_password_pool()
+    _pending_password_jobs += 1
+    metrics.set_gauge("auth.password_pool.pending", _pending_password_jobs)
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_pool, func, *args)
+    finally:
+        _pending_password_jobs -= 1
+        metrics.set_gauge("auth.password_pool.pending", _pending_password_jobs)
+        metrics.observe("auth.password_pool.latency_ms",
+                        (time.perf_counter() - start) * 1000)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_password_pool(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_password_pool(verify_password, plain_password, hashed_password)
@@ -2,7 +2,7 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 
-from src.auth.exceptions import APIKeyException, JWTException
+from src.auth.exceptions import APIKeyException, JWTException, TooManyRequestsException
 
 app = FastAPI()
 
@@ -61,3 +61,16 @@ async def jwt_exception_handler(request: Request, exc: JWTException):
             "data": {}
         }
     )
+
+
+@app.exception_handler(TooManyRequestsException)
+async def too_many_requests_exception_handler(request: Request, exc: TooManyRequestsException):
+    return JSONResponse(
+        status_code=429,
+        content={
+            "status": 429,
+            "message": exc.message,
+            "data": exc.data
+        },
+        headers={"Retry-After": str(exc.retry_after)}
+    )
@@ -1,4 +1,7 @@
-from httpx import AsyncClient
+import os
+import importlib.util
+from dotenv import load_dotenv
+from httpx import AsyncClient, Limits, Timeout
 from pydantic import BaseModel
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
@@ -30,13 +33,35 @@ class ResponseHelper:
         )
 
 
+load_dotenv()
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", 30))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", 3))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 10))
+# HTTP/2 needs the optional `h2` package (httpx[http2])
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "True").lower() in ("true", "1", "yes") \
+    and importlib.util.find_spec("h2") is not None
+
 _http_client: AsyncClient | None = None
 
 
 async def init_http_client():
     global _http_client
     if _http_client is None:
-        _http_client = AsyncClient()
+        _http_client = AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=Timeout(HTTP_TIMEOUT_SECONDS,
+                            connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        )
 
 
 async def close_http_client():
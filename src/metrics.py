@@ -0,0 +1,81 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and latency samples.
+    Values are per worker; the snapshot is exposed on the /metrics endpoint.
+    """
+
+    def __init__(self, sample_size: int = 1024):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(int)
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=sample_size))
+        self._totals: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record a sample (e.g. a latency in ms) for the named histogram."""
+        with self._lock:
+            self._samples[name].append(value)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += value
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def sample_count(self, name: str) -> int:
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """Return the q-th percentile (0-100) of the recent samples, or None if there are none."""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            samples = {name: sorted(values)
+                       for name, values in self._samples.items()}
+            totals = {name: list(values)
+                      for name, values in self._totals.items()}
+
+        histograms = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            count, total = totals[name]
+
+            def pick(q):
+                return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+            histograms[name] = {
+                "count": count,
+                "avg": total / count,
+                "p50": pick(0.50),
+                "p95": pick(0.95),
+                "p99": pick(0.99),
+                "max": values[-1],
+            }
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+metrics = MetricsRegistry()
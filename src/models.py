@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, DateTime, Boolean
+from sqlalchemy import Column, DateTime, Boolean, Select, select, func
 
 from configs.database import Base
 
@@ -10,10 +10,11 @@ class AbstractBase(Base):
 
     is_active = Column(Boolean, default=True)
     is_deleted = Column(Boolean, default=False)
+    # Callables so every row gets its own timestamp; server defaults cover rows written outside the ORM
     created_at = Column(DateTime(timezone=True),
-                        default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=datetime.now(
-        timezone.utc), onupdate=datetime.now(timezone.utc))
+                        default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+                        server_default=func.now(), onupdate=lambda: datetime.now(timezone.utc))
 
     def soft_delete(self):
         self.is_active = False
@@ -24,3 +25,8 @@ class AbstractBase(Base):
     @classmethod
     def get_active(cls, db: Session):
         return db.query(cls).filter(cls.is_active == True, cls.is_deleted == False)
+
+    @classmethod
+    def select_active(cls) -> Select:
+        # Async counterpart of get_active, to be executed with an AsyncSession
+        return select(cls).where(cls.is_active == True, cls.is_deleted == False)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The modules read their settings at import; keep the tests off real services & databases
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("SQLITE_DB_PATH", ":memory:")
+os.environ.setdefault("GOOGLE_GLA_API_KEY", "test")
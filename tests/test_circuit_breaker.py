@@ -0,0 +1,112 @@
+import asyncio
+
+from src.ai_agent import tools
+from src.ai_agent.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from src.ai_agent.utils import AgentDeps
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    open_breaker(breaker)
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_released_trial_can_be_retried():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"data": [{"payload": {"content": "answer"}}]}
+
+
+class FakeClient:
+    def __init__(self, gate: asyncio.Event = None):
+        self.calls = 0
+        self.gate = gate
+
+    async def post(self, *args, **kwargs):
+        self.calls += 1
+        if self.gate:
+            await self.gate.wait()
+        return FakeResponse()
+
+
+def knowledge_setup(monkeypatch, client: FakeClient) -> AgentDeps:
+    breaker = CircuitBreaker("test_quadsearch", failure_threshold=1, reset_timeout=0)
+    monkeypatch.setattr(tools, "quadsearch_breaker", breaker)
+    monkeypatch.setattr(tools, "get_http_client", lambda: client)
+    tools.knowledge_cache.clear()
+    return AgentDeps(quadsearch_base_url="http://quadsearch", quadsearch_api_key="key", collection_name="docs")
+
+
+def test_cache_hits_do_not_take_the_half_open_trial(monkeypatch):
+    client = FakeClient()
+    deps = knowledge_setup(monkeypatch, client)
+
+    async def run():
+        assert "answer" in await tools.search_knowledge(deps, "what is it")
+        open_breaker(tools.quadsearch_breaker)
+        # Served from the cache while half-open: the trial slot stays free
+        assert "answer" in await tools.search_knowledge(deps, "what is it")
+        assert tools.quadsearch_breaker.state == OPEN
+        assert tools.knowledge_available(deps)
+        assert "answer" in await tools.search_knowledge(deps, "something else")
+
+    asyncio.run(run())
+    assert tools.quadsearch_breaker.state == CLOSED
+    assert client.calls == 2
+
+
+def test_cancelled_trial_frees_the_breaker(monkeypatch):
+    gate = asyncio.Event()
+    client = FakeClient(gate)
+    deps = knowledge_setup(monkeypatch, client)
+    open_breaker(tools.quadsearch_breaker)
+
+    async def run():
+        trial = asyncio.create_task(tools._search_knowledge(deps, "first"))
+        await asyncio.sleep(0)
+        assert tools.quadsearch_breaker.state == HALF_OPEN
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        gate.set()
+        assert "answer" in await tools.search_knowledge(deps, "second")
+
+    asyncio.run(run())
+    assert tools.quadsearch_breaker.state == CLOSED
@@ -0,0 +1,121 @@
+import random
+import asyncio
+
+import pytest
+
+from src.ai_agent.coalesce import FlightAbandoned, FlightRegistry, rename_deltas, rename_text
+
+
+def test_rename_whole_words_only():
+    assert rename_text("Hi Ann, the Annual report. Anna agrees, Ann.", "Ann", "Bob") == \
+        "Hi Bob, the Annual report. Anna agrees, Bob."
+    assert rename_text("Al: Also, Al.", "Al", "Christopher") == "Christopher: Also, Christopher."
+
+
+def test_rename_parts_of_a_full_name():
+    assert rename_text("Hi Ann Lee! Ann, see Lee's note.", "Ann Lee", "Bob Ray") == \
+        "Hi Bob Ray! Bob, see Ray's note."
+
+
+async def split(text: str, rng: random.Random):
+    index = 0
+    while index < len(text):
+        size = rng.randint(1, 4)
+        yield text[index:index + size]
+        index += size
+
+
+@pytest.mark.parametrize("text, old, new", [
+    ("Hi Ann, the Annual report for Ann. Anna said Ann", "Ann", "Bob"),
+    ("Hi Ann Lee! Ann, Lee's Annual. Ann Leeway Ann Lee", "Ann Lee", "Bob Ray"),
+    ("Al: Also Al.Al", "Al", "Christopher"),
+])
+def test_streamed_rename_matches_whole_text(text, old, new):
+    rng = random.Random(7)
+
+    async def run():
+        for _ in range(200):
+            streamed = "".join([delta async for delta in rename_deltas(split(text, rng), old, new)])
+            assert streamed == rename_text(text, old, new)
+
+    asyncio.run(run())
+
+
+async def words(*parts: str, delay: float = 0.01):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+def test_follower_reads_the_whole_answer():
+    async def run():
+        registry = FlightRegistry()
+        key = registry.key("What is it?", "model", "prompt")
+        leader = registry.lead(key, "Ann")
+        follower = registry.join(key)
+        assert follower is leader
+        chunks = registry.start(leader, words("Hi ", "Ann", "."))
+        assert "".join([delta async for delta in chunks]) == "Hi Ann."
+        assert rename_text(await follower.answer(), follower.leader_name, "Bob") == "Hi Bob."
+        assert registry.join(key) is None
+
+    asyncio.run(run())
+
+
+def test_leader_leaving_does_not_stop_the_followers_run():
+    async def run():
+        registry = FlightRegistry()
+        key = registry.key("What is it?", "model", "prompt")
+        leader = registry.lead(key, "Ann")
+        follower = registry.join(key)
+        registry.start(leader, words("Hi ", "Ann", "."))
+        registry.leave(leader)
+        answer = await follower.answer()
+        registry.leave(follower)
+        return answer
+
+    assert asyncio.run(run()) == "Hi Ann."
+
+
+def test_run_is_cancelled_once_everyone_left():
+    async def run():
+        registry = FlightRegistry()
+        leader = registry.lead(registry.key("What is it?", "model", "prompt"), "Ann")
+        registry.start(leader, words("Hi ", "Ann", ".", delay=10))
+        registry.leave(leader)
+        await asyncio.gather(leader.task, return_exceptions=True)
+        with pytest.raises(FlightAbandoned):
+            await leader.answer()
+
+    asyncio.run(run())
+
+
+def test_follower_sees_an_abandoned_flight():
+    async def run():
+        registry = FlightRegistry()
+        key = registry.key("What is it?", "model", "prompt")
+        leader = registry.lead(key, "Ann")
+        follower = registry.join(key)
+        # The leader gave up before its run started
+        registry.land(leader, FlightAbandoned())
+        with pytest.raises(FlightAbandoned):
+            await follower.answer()
+
+    asyncio.run(run())
+
+
+def test_run_errors_are_passed_on():
+    async def failing():
+        yield "Hi "
+        raise RuntimeError("provider error")
+
+    async def run():
+        registry = FlightRegistry()
+        key = registry.key("What is it?", "model", "prompt")
+        leader = registry.lead(key, "Ann")
+        follower = registry.join(key)
+        registry.start(leader, failing())
+        with pytest.raises(RuntimeError):
+            await follower.answer()
+
+    asyncio.run(run())
@@ -0,0 +1,75 @@
+import json
+import time
+import asyncio
+
+import httpx
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from pydantic_ai.models import ModelRequestParameters
+
+from src.ai_agent.context_cache import (
+    CacheHandle,
+    CachedGeminiModel,
+    ContextCache,
+    GeminiCacheClient,
+    _cache_rejected,
+    fake_gemini_provider
+)
+
+STATIC = "You are a helpful AI Assistant."
+
+
+def error(status: int, message: str) -> httpx.Response:
+    return httpx.Response(status, json={"error": {"code": status, "message": message}})
+
+
+def test_only_cache_errors_count_as_rejected():
+    assert _cache_rejected(error(403, "CachedContent not found (or permission denied)"))
+    assert _cache_rejected(error(404, "Cached content cachedContents/abc not found"))
+    # Bad requests caused by the user's content must not drop a good cache
+    assert not _cache_rejected(error(400, "Request contains an invalid argument."))
+    assert not _cache_rejected(error(403, "Method doesn't allow unregistered callers"))
+    assert not _cache_rejected(httpx.Response(500, text="oops"))
+
+
+class RecordingClient:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete(self, handle: CacheHandle):
+        self.deleted.append(handle.name)
+
+
+def test_dropped_caches_are_deleted_while_still_alive():
+    async def run():
+        client = RecordingClient()
+        cache = ContextCache(client)
+        cache.invalidate(CacheHandle(name="cachedContents/alive", expires_at=time.monotonic() + 60, tokens=1))
+        cache.invalidate(CacheHandle(name="cachedContents/expired", expires_at=time.monotonic() - 1, tokens=1))
+        await cache.close()
+        return client.deleted
+
+    assert asyncio.run(run()) == ["cachedContents/alive"]
+
+
+def test_per_user_prompt_goes_before_the_current_message():
+    async def run():
+        provider = fake_gemini_provider()
+        cache = ContextCache(GeminiCacheClient(provider.client), min_tokens=0)
+        cache.register_prefix(STATIC)
+        model = CachedGeminiModel("gemini-fake", provider=provider, context_cache=cache)
+        messages = [
+            ModelRequest(parts=[SystemPromptPart(content=STATIC), SystemPromptPart(content="User's name is Ann."),
+                                UserPromptPart(content="First question")]),
+            ModelResponse(parts=[TextPart(content="First answer")]),
+            ModelRequest(parts=[UserPromptPart(content="Second question")]),
+        ]
+        handle, request_json = await model._cached_request(
+            messages, {}, ModelRequestParameters(output_mode="text", allow_text_output=True))
+        await cache.close()
+        return handle, json.loads(request_json)
+
+    handle, request = asyncio.run(run())
+    assert request["cachedContent"] == handle.name
+    assert "systemInstruction" not in request
+    assert request["contents"][0]["parts"] == [{"text": "First question"}]
+    assert request["contents"][-1]["parts"] == [{"text": "User's name is Ann."}, {"text": "Second question"}]
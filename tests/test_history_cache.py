@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from src.ai_agent.cache import HistoryCache, HistoryTurn
+
+V1 = datetime(2024, 1, 1)
+V2 = V1 + timedelta(seconds=1)
+V3 = V2 + timedelta(seconds=1)
+
+
+def turn(message_id: int) -> HistoryTurn:
+    return HistoryTurn(message_id=message_id, messages=[], tokens=10)
+
+
+def test_entry_is_stale_once_the_session_moved():
+    cache = HistoryCache()
+    cache.set("s", V1, None, [turn(1)])
+    assert [t.message_id for t in cache.get("s", V1, None)] == [1]
+    assert cache.get("s", V2, None) is None
+
+
+def test_written_turn_moves_an_up_to_date_entry():
+    cache = HistoryCache()
+    cache.set("s", V1, None, [turn(1)])
+    cache.append("s", turn(2))
+    cache.touch("s", V2, previous_version=V1)
+    assert [t.message_id for t in cache.get("s", V2, None)] == [1, 2]
+
+
+def test_written_turn_drops_an_entry_missing_other_workers_turns():
+    cache = HistoryCache()
+    cache.set("s", V1, None, [turn(1)])
+    # The session moved to V2 elsewhere before this worker's write bumped it to V3
+    cache.touch("s", V3, previous_version=V2)
+    assert cache.get("s", V3, None) is None
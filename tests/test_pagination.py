@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from configs.database import Base, get_async_db
+from src.auth.dependencies import get_current_user
+from src.auth.models import User
+from src.ai_agent.models import ChatMessage, ChatSession
+from src.ai_agent.routes.chat_operation import router
+from src.ai_agent.utils import decode_cursor, encode_cursor
+
+USER_ID = 1
+
+
+def test_cursor_round_trip():
+    position = {"d": "2024-01-02T03:04:05+00:00", "i": 42}
+    cursor = encode_cursor(position)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == position
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "WzEsMl0", ""])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def client(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    sessions = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def setup():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with sessions() as db:
+            for index in range(5):
+                db.add(ChatSession(session_id=f"s{index}", user_id=USER_ID,
+                                   date_time=start + timedelta(minutes=index // 2)))  # Pairs share a date_time
+            for index in range(7):
+                db.add(ChatMessage(session_id="s0", human_message=f"q{index}", date_time=start))
+            await db.commit()
+
+    asyncio.run(setup())
+
+    async def get_test_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_db] = get_test_db
+    app.dependency_overrides[get_current_user] = lambda: User(id=USER_ID, name="Ann")
+    with TestClient(app) as test_client:
+        yield test_client
+    asyncio.run(engine.dispose())
+
+
+def walk(client, path, key, **params):
+    """Follow next cursors to the end, returning the items of every page."""
+    pages = []
+    while True:
+        data = client.get(path, params=params).json()["data"]
+        pages.append(data[key])
+        if not data["pagination"]["has_more"]:
+            return pages
+        params["cursor"] = data["pagination"]["next_cursor"]
+
+
+def test_session_cursor_pages_cover_every_session_once(client):
+    pages = walk(client, "/chat", "sessions", pagination="cursor", limit=2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    ids = [session["session_id"] for page in pages for session in page]
+    # Newest first, ties on date_time broken by id
+    assert ids == ["s4", "s3", "s2", "s1", "s0"]
+
+
+def test_message_cursor_pages_walk_back_in_chronological_pages(client):
+    pages = walk(client, "/chat/session", "chats", session_id="s0", limit=3)
+    assert [[chat["human_message"] for chat in page] for page in pages] == \
+        [["q4", "q5", "q6"], ["q1", "q2", "q3"], ["q0"]]
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/chat", {"pagination": "cursor"}),
+    ("/chat", {}),
+    ("/chat/session", {"session_id": "s0"}),
+])
+@pytest.mark.parametrize("limit", [0, -1, 101])
+def test_page_size_is_bounded(client, path, params, limit):
+    assert client.get(path, params={**params, "limit": limit}).status_code == 422
+
+
+def test_invalid_cursor_is_a_bad_request(client):
+    assert client.get("/chat", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/chat/session", params={"session_id": "s0", "cursor": "garbage"}).status_code == 400
@@ -0,0 +1,30 @@
+from src.ai_agent.cache import NAME_PLACEHOLDER, ResponseCache, template_name
+
+
+def test_name_is_replaced_as_a_whole_word_only():
+    assert template_name("Hi Ann, see the Annual report.", "Ann") == f"Hi {NAME_PLACEHOLDER}, see the Annual report."
+    assert template_name("Also, Al: done.", "Al") == f"Also, {NAME_PLACEHOLDER}: done."
+    assert template_name("Ann's plan", "Ann") == f"{NAME_PLACEHOLDER}'s plan"
+
+
+def test_names_with_regex_characters():
+    assert template_name("Thanks, J.R.!", "J.R.") == f"Thanks, {NAME_PLACEHOLDER}!"
+
+
+def test_leftover_name_parts_are_not_templated():
+    # The first name alone would stay behind for the next user to see
+    assert template_name("Hi Ann Lee! Ann, here it is.", "Ann Lee") is None
+    # The name is also an ordinary word in the answer
+    assert template_name("Will, it will rain.", "Will") is None
+
+
+def test_cached_answer_is_addressed_to_the_reader():
+    cache = ResponseCache(max_entries=4)
+    cache.set("What is the annual fee?", "Hi Ann, the Annual fee is 10.", "Ann", 100)
+    assert cache.get("What is the annual fee?", "Bob").answer == "Hi Bob, the Annual fee is 10."
+
+
+def test_answers_holding_part_of_the_name_are_not_cached():
+    cache = ResponseCache(max_entries=4)
+    cache.set("What is the fee?", "Hi Ann Lee. Ann, it is 10.", "Ann Lee", 100)
+    assert cache.get("What is the fee?", "Bob") is None
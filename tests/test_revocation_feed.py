@@ -0,0 +1,35 @@
+from src.auth.cache import token_cache
+from src.auth.models import User
+from src.auth.revocation import RevocationFeed
+
+
+def cache_token(jti: str, user_id: int):
+    token_cache.set(jti, User(id=user_id, email=f"user{user_id}@example.com", password="hash"))
+
+
+def test_user_invalidation_reaches_the_other_workers(tmp_path):
+    path = str(tmp_path / "revocations.feed")
+    worker_a, worker_b = RevocationFeed(path=path), RevocationFeed(path=path)
+    token_cache.clear()
+
+    worker_a.publish_user(1)
+    # Tokens still cached by worker B, which shares nothing with A but the feed
+    cache_token("jti-1", 1)
+    cache_token("jti-2", 2)
+    worker_b.read_feed()
+
+    assert token_cache.get("jti-1") is None
+    assert token_cache.get("jti-2") is not None
+
+
+def test_token_revocations_still_apply(tmp_path):
+    path = str(tmp_path / "revocations.feed")
+    worker_a, worker_b = RevocationFeed(path=path), RevocationFeed(path=path)
+    worker_b.ready = True
+
+    worker_a.publish("jti-3")
+    worker_a.publish_user(3)
+    worker_b.read_feed()
+
+    assert worker_b.is_revoked("jti-3")
+    assert len(worker_b.revoked) == 1
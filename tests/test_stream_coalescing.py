@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from src.ai_agent.utils import coalesce_chunks
+
+
+async def deltas(script):
+    """Yield strings, sleeping on the numbers in between."""
+    for item in script:
+        if isinstance(item, str):
+            yield item
+        else:
+            await asyncio.sleep(item)
+
+
+async def frames(script, **kwargs):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    return [(chunk, loop.time() - start) async for chunk in coalesce_chunks(deltas(script), **kwargs)]
+
+
+def test_text_is_merged_within_the_window():
+    result = asyncio.run(frames(["a", 0.05, "b", "c", 0.001, "d", 0.3, "e"], window_ms=20))
+    assert [chunk for chunk, _ in result] == ["a", "bcd", "e"]
+    # The first delta goes out at once; a pausing model does not hold back buffered text
+    assert result[0][1] < 0.02
+    assert result[1][1] < 0.2
+
+
+def test_size_cap_flushes_early():
+    result = asyncio.run(frames(["x" * 10] * 5, window_ms=1000, max_bytes=20))
+    assert "".join(chunk for chunk, _ in result) == "x" * 50
+    assert result[-1][1] < 0.5
+
+
+def test_disabled_window_passes_deltas_through():
+    result = asyncio.run(frames(["a", "b", "c"], window_ms=0))
+    assert [chunk for chunk, _ in result] == ["a", "b", "c"]
+
+
+def test_model_errors_reach_the_consumer():
+    async def failing():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model failed")
+
+    async def consume():
+        return [chunk async for chunk in coalesce_chunks(failing(), window_ms=5)]
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        asyncio.run(consume())